@@ -0,0 +1,259 @@
+"""
+Admission control for synthesis requests.
+At most a fixed number of syntheses run at a time per process; a few more
+requests may wait briefly for a free slot. Everything beyond that is refused
+at once with a Retry-After estimated from the observed synthesis time, so a
+slow upstream makes some requests fail fast instead of making every request
+wait until the worker times out. Work that was accepted as a whole (the items
+of a batch, background jobs) waits for its slots instead of being refused, so
+it never runs more syntheses than the same limit.
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+
+# Defaults (override with TTS_MAX_SYNTHESES / TTS_ADMISSION_QUEUE / TTS_ADMISSION_WAIT_MS / TTS_ADMISSION_STATUS)
+DEFAULT_MAX_SYNTHESES = 4
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_WAIT_MS = 2000.0
+DEFAULT_STATUS = 503
+
+# Defaults of the asyncio server, where a synthesis is an awaited upstream request
+# instead of a thread: as many as it keeps upstream connections (TTS_ASYNC_HTTP_CONNECTIONS)
+DEFAULT_ASYNC_MAX_SYNTHESES = 1000
+DEFAULT_ASYNC_QUEUE_SIZE = 1000
+
+# Weight of the latest synthesis in the moving average of the service time
+SERVICE_TIME_WEIGHT = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded synthesis concurrency with a short, bounded wait queue.
+    """
+
+    # Used by from_env() when the variables are not set
+    default_max_concurrent = DEFAULT_MAX_SYNTHESES
+    default_max_queue = DEFAULT_QUEUE_SIZE
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_SYNTHESES, max_queue=DEFAULT_QUEUE_SIZE,
+                 wait_ms=DEFAULT_WAIT_MS, status=DEFAULT_STATUS):
+        """
+        Args:
+            max_concurrent (int): Syntheses that may run at the same time (0 disables the limit).
+            max_queue (int): Requests that may wait for a free slot.
+            wait_ms (float): How long a request waits for a slot before it is refused.
+            status (int): HTTP status of refused requests (503 or 429).
+        """
+        self.max_concurrent = max(0, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.wait = max(0.0, float(wait_ms)) / 1000.0
+        self.status = int(status)
+
+        self._condition = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+        self._service_time = None
+        self._stats = {'admitted': 0, 'queued': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Create a controller configured from the TTS_MAX_SYNTHESES and TTS_ADMISSION_* variables."""
+        return cls(
+            max_concurrent=int(os.environ.get('TTS_MAX_SYNTHESES', cls.default_max_concurrent)),
+            max_queue=int(os.environ.get('TTS_ADMISSION_QUEUE', cls.default_max_queue)),
+            wait_ms=float(os.environ.get('TTS_ADMISSION_WAIT_MS', DEFAULT_WAIT_MS)),
+            status=int(os.environ.get('TTS_ADMISSION_STATUS', DEFAULT_STATUS))
+        )
+
+    def acquire(self, block=False):
+        """
+        Take a synthesis slot, waiting up to the configured time for one.
+
+        Args:
+            block (bool): Wait as long as it takes instead of being refused, for
+                work that was already accepted (batch items, background jobs).
+                Blocked callers still count as waiting, so new requests see the load.
+
+        Returns:
+            float: Admission time, to be passed to release().
+
+        Raises:
+            Overloaded: When the wait queue is full or no slot became free in time.
+        """
+        if self.max_concurrent == 0:
+            return time.perf_counter()
+
+        with self._condition:
+            if self._running >= self.max_concurrent:
+                if self._waiting >= self.max_queue and not block:
+                    self._stats['rejected_queue_full'] += 1
+                    raise Overloaded('Server is busy, please retry later', self.status, self._retry_after())
+
+                self._waiting += 1
+                self._stats['queued'] += 1
+                deadline = None if block else time.monotonic() + self.wait
+                try:
+                    while self._running >= self.max_concurrent:
+                        if deadline is None:
+                            self._condition.wait()
+                            continue
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats['rejected_timeout'] += 1
+                            raise Overloaded('Server is busy, please retry later', self.status,
+                                             self._retry_after())
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._running += 1
+            self._stats['admitted'] += 1
+        return time.perf_counter()
+
+    def check(self):
+        """
+        Refuse at once if a new request would be refused now (all slots busy and the queue full).
+
+        For work that is accepted as a whole and then takes its slots with
+        acquire(block=True), e.g. a batch request.
+
+        Raises:
+            Overloaded: When the server is overloaded.
+        """
+        if self.max_concurrent == 0:
+            return
+        with self._condition:
+            if self._running >= self.max_concurrent and self._waiting >= self.max_queue:
+                self._stats['rejected_queue_full'] += 1
+                raise Overloaded('Server is busy, please retry later', self.status, self._retry_after())
+
+    def release(self, admitted_at):
+        """Free the slot taken by acquire() and record how long it was held."""
+        if self.max_concurrent == 0:
+            return
+
+        service_time = time.perf_counter() - admitted_at
+        with self._condition:
+            self._running -= 1
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time += SERVICE_TIME_WEIGHT * (service_time - self._service_time)
+            self._condition.notify()
+
+    def hold(self, chunks, admitted_at):
+        """
+        Yield from chunks and release the slot once the stream is finished or closed.
+
+        The generator has to be started (e.g. by taking the first chunk) for a
+        close before the first chunk to release the slot.
+        """
+        try:
+            for chunk in chunks:
+                yield chunk
+        finally:
+            self.release(admitted_at)
+
+    def _retry_after(self):
+        # Caller holds the condition: time until the requests ahead of a retry have been served
+        if self._service_time is None:
+            return 1
+        backlog = self._waiting + 1
+        return max(1, math.ceil(self._service_time * backlog / self.max_concurrent))
+
+    def stats(self):
+        """Return the current load, queue depth, rejection counters and configuration."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['running'] = self._running
+            stats['queue_depth'] = self._waiting
+            stats['service_time_seconds'] = round(self._service_time or 0.0, 3)
+            stats['retry_after_seconds'] = self._retry_after() if self.max_concurrent else 0
+        stats['max_concurrent'] = self.max_concurrent
+        stats['max_queue'] = self.max_queue
+        stats['max_wait_ms'] = self.wait * 1000.0
+        return stats
+
+
+class AsyncAdmissionController(AdmissionController):
+    """
+    The same admission control for coroutines on one event loop (asgi_app.py):
+    a request waiting for a slot is suspended instead of blocking a thread.
+    """
+
+    default_max_concurrent = DEFAULT_ASYNC_MAX_SYNTHESES
+    default_max_queue = DEFAULT_ASYNC_QUEUE_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = asyncio.Semaphore(max(1, self.max_concurrent))
+
+    async def acquire(self):
+        """
+        Take a synthesis slot, waiting up to the configured time for one.
+
+        Returns:
+            float: Admission time, to be passed to release().
+
+        Raises:
+            Overloaded: When the wait queue is full or no slot became free in time.
+        """
+        if self.max_concurrent == 0:
+            return time.perf_counter()
+
+        if self._slots.locked():
+            with self._condition:
+                if self._waiting >= self.max_queue:
+                    self._stats['rejected_queue_full'] += 1
+                    raise Overloaded('Server is busy, please retry later', self.status, self._retry_after())
+                self._waiting += 1
+                self._stats['queued'] += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.wait)
+            except asyncio.TimeoutError:
+                with self._condition:
+                    self._stats['rejected_timeout'] += 1
+                    raise Overloaded('Server is busy, please retry later', self.status, self._retry_after())
+            finally:
+                with self._condition:
+                    self._waiting -= 1
+        else:
+            # A free slot is taken without suspending
+            await self._slots.acquire()
+
+        with self._condition:
+            self._running += 1
+            self._stats['admitted'] += 1
+        return time.perf_counter()
+
+    def release(self, admitted_at):
+        """Free the slot taken by acquire() and record how long it was held."""
+        super().release(admitted_at)
+        if self.max_concurrent:
+            self._slots.release()
+
+    async def hold(self, chunks, admitted_at):
+        """
+        Yield from the async iterator chunks and release the slot once the stream is finished or closed.
+
+        The generator has to be started (e.g. by taking the first chunk) for a
+        close before the first chunk to release the slot.
+        """
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            self.release(admitted_at)
@@ -0,0 +1,331 @@
+"""
+ASGI version of the gTTS streaming server, for uvicorn.
+Serves /api/stream-speech with the same parameters and responses as
+api/index.py (JSON body or query string, streaming, ETag/304, Range,
+Server-Timing and debug output) under the same admission control and
+per-client rate limits, but upstream requests are awaited on an event loop
+instead of holding a worker thread each, so one process can keep thousands
+of slow requests in flight.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+"""
+
+import re
+import base64
+import asyncio
+import functools
+import contextlib
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from audio_cache import AudioCache, make_cache_key
+from audio_segments import split_segments, join_mp3
+from text_enhancement import add_natural_pauses, apply_emotion
+from http_audio import HTTP_MAX_AGE, NO_CACHE_HEADERS, TRUE_VALUES
+from server_timing import SERVER_TIMING, RequestTimings
+from admission import AsyncAdmissionController, Overloaded
+from rate_limit import TokenBucketLimiter
+import gtts_async
+
+# Single byte range of a Range header: "bytes=start-end", "bytes=start-" or "bytes=-suffix"
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Cache of synthesized audio shared by all requests in this process.
+# Lookups and stores can read and write files on disk, so they run in a
+# worker thread (asyncio.to_thread) to keep them off the event loop.
+audio_cache = AudioCache.from_env()
+
+# Bounded synthesis concurrency; overflow requests are refused with Retry-After (TTS_MAX_SYNTHESES)
+admission = AsyncAdmissionController.from_env()
+
+# Per-client token buckets shared with the other servers on this machine (TTS_RATE_LIMIT_PER_MINUTE)
+rate_limiter = TokenBucketLimiter.from_env()
+
+# Syntheses in progress by cache key; identical concurrent requests await the same one
+_in_flight = {}
+_coalesced = 0
+
+
+async def coalesce(key, synthesize):
+    """
+    Run synthesize() once for all concurrent callers with the same key.
+
+    The synthesis is shielded, so a caller that disconnects does not cancel
+    it for the others (its audio still ends up in the cache).
+    """
+    global _coalesced
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(synthesize())
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    else:
+        _coalesced += 1
+    return await asyncio.shield(task)
+
+
+async def synthesize_segment(segment, language, slow):
+    """Return the audio of one sentence from the cache or gTTS."""
+    key = make_cache_key(segment, language, slow, None, backend='gtts')
+    audio = await asyncio.to_thread(audio_cache.get, key)
+    if audio is None:
+        async def synthesize():
+            audio = await gtts_async.synthesize_mp3(segment, language, slow)
+            await asyncio.to_thread(audio_cache.put, key, audio)
+            return audio
+        audio = await coalesce(key, synthesize)
+    return audio
+
+
+async def iter_segments(enhanced_text, language, slow, timings):
+    """Yield the audio of each sentence in order, like audio_segments.iter_segments()."""
+    # Text without any speakable segment is passed through so gTTS reports the error
+    for segment in split_segments(enhanced_text) or [enhanced_text]:
+        with timings.stage('synth'):
+            audio = await synthesize_segment(segment, language, slow)
+        yield audio
+
+
+async def request_params(request):
+    """
+    Return the synthesis parameters of a request, like http_audio.request_params().
+
+    Returns:
+        dict: The parameters, or None if there are none.
+    """
+    if request.method == 'GET':
+        data = dict(request.query_params)
+        for name in ('slow', 'stream', 'debug'):
+            if name in data:
+                data[name] = data[name].lower() in TRUE_VALUES
+        return data
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def rate_limited(view):
+    """
+    Apply the per-client rate limit to an endpoint, like TokenBucketLimiter.limit().
+
+    Each request takes one token; the tokens of a 304 response are given back.
+    """
+    @functools.wraps(view)
+    async def wrapper(request):
+        if not rate_limiter.enabled:
+            return await view(request)
+
+        # The bucket store is SQLite, so it is used from a worker thread
+        client = rate_limiter.client_key(request.headers, request.client.host if request.client else None)
+        decision = await asyncio.to_thread(rate_limiter.take, client)
+        if not decision['allowed']:
+            return JSONResponse({'error': 'Rate limit exceeded, please retry later'}, status_code=429,
+                                headers=rate_limiter.headers(decision))
+
+        response = await view(request)
+        if response.status_code == 304:
+            # Revalidations send no audio, so they do not count against the limit
+            decision = await asyncio.to_thread(rate_limiter.refund, client) or decision
+        response.headers.update(rate_limiter.headers(decision))
+        return response
+    return wrapper
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match or If-Range header value names etag."""
+    if header is None:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in header.split(',')]
+    return any(tag.removeprefix('W/').strip('"') == etag for tag in tags)
+
+
+def timing_headers(timings):
+    """Return the Server-Timing headers of a request."""
+    if not SERVER_TIMING:
+        return {}
+    return {'Server-Timing': timings.header(), 'Timing-Allow-Origin': '*'}
+
+
+def not_modified(request, etag, timings):
+    """Return a 304 response if the client already holds the audio for etag, else None."""
+    if not etag_matches(request.headers.get('if-none-match'), etag):
+        return None
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': f'public, max-age={HTTP_MAX_AGE}'}
+    headers.update(timing_headers(timings))
+    return Response(status_code=304, headers=headers)
+
+
+def audio_response(request, audio, etag, timings, debug=False):
+    """
+    Build the response for complete audio, like http_audio.audio_response().
+
+    Sends cacheable headers and answers a single byte range with 206 (416 if
+    it lies outside the audio). A Range whose If-Range does not match the
+    ETag gets the complete audio.
+    """
+    if debug and SERVER_TIMING:
+        return debug_response(audio, etag, timings)
+
+    headers = {
+        'Content-Disposition': 'inline',
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'public, max-age={HTTP_MAX_AGE}',
+        'Accept-Ranges': 'bytes',
+    }
+    headers.update(timing_headers(timings))
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header is None or (if_range is not None and not etag_matches(if_range, etag)):
+        return Response(audio, media_type='audio/mpeg', headers=headers)
+
+    match = RANGE_RE.match(range_header.strip())
+    if match is None or match.group(1) == match.group(2) == '':
+        # Several ranges or an unknown unit
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{len(audio)}'})
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), len(audio) - 1) if match.group(2) else len(audio) - 1
+    else:
+        start = max(0, len(audio) - int(match.group(2)))
+        end = len(audio) - 1
+    if start > end or start >= len(audio):
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{len(audio)}'})
+
+    headers['Content-Range'] = f'bytes {start}-{end}/{len(audio)}'
+    return Response(audio[start:end + 1], status_code=206, media_type='audio/mpeg', headers=headers)
+
+
+def debug_response(audio, etag, timings):
+    """Return the audio and the request's stage timings as one JSON document, like http_audio.debug_response()."""
+    return JSONResponse({
+        'mimetype': 'audio/mpeg',
+        'bytes': len(audio),
+        'etag': etag,
+        'server_timing': timings.durations_ms(),
+        'audio': base64.b64encode(audio).decode('ascii')
+    }, headers=dict(NO_CACHE_HEADERS, **timing_headers(timings)))
+
+
+async def index(request):
+    """Return API information."""
+    return JSONResponse({
+        'name': 'TTS API',
+        'version': '1.0',
+        'description': 'Text-to-Speech API with natural voice enhancements (ASGI)',
+        'endpoints': {
+            '/api/stream-speech': 'GET/POST - Convert text to speech audio',
+            '/api/cache-stats': 'GET - Audio cache statistics',
+            '/api/upstream-stats': 'GET - gTTS upstream request statistics',
+            '/api/admission-stats': 'GET - Running and queued syntheses and rejections'
+        }
+    })
+
+async def cache_stats(request):
+    """Return audio cache hit/miss/eviction counters and coalescing counters."""
+    return JSONResponse(dict(audio_cache.stats(), single_flight={'in_flight': len(_in_flight),
+                                                                 'coalesced': _coalesced}))
+
+async def upstream_stats(request):
+    """Return gTTS upstream request counters."""
+    return JSONResponse(gtts_async.stats())
+
+async def admission_stats(request):
+    """Return running and queued syntheses, queue limits and rejection counters."""
+    return JSONResponse(admission.stats())
+
+@rate_limited
+async def stream_speech(request):
+    """Generate speech from text and stream it directly without saving files."""
+    timings = RequestTimings()
+    data = await request_params(request)
+
+    if not data or 'text' not in data:
+        return JSONResponse({'error': 'No text provided'}, status_code=400)
+
+    text = data['text']
+    language = data.get('language', 'en')
+    slow = data.get('slow', False)
+    emotion = data.get('emotion', 'neutral')
+    stream = data.get('stream', False)
+    debug = data.get('debug', False)
+
+    try:
+        # Add natural pauses with punctuation and apply emotion
+        with timings.stage('enhance'):
+            enhanced_text = add_natural_pauses(text)
+            enhanced_text = apply_emotion(enhanced_text, emotion)
+
+        # Serve repeated requests from the audio cache
+        cache_key = make_cache_key(enhanced_text, language, slow, emotion, backend='gtts')
+        response = not_modified(request, cache_key, timings)
+        if response is not None:
+            return response
+        with timings.stage('cache'):
+            audio = await asyncio.to_thread(audio_cache.get, cache_key)
+
+        if audio is None:
+            # Refuse at once when too many syntheses are running or waiting
+            try:
+                with timings.stage('queue'):
+                    admitted_at = await admission.acquire()
+            except Overloaded as e:
+                return JSONResponse({'error': str(e)}, status_code=e.status,
+                                    headers={'Retry-After': str(e.retry_after)})
+
+        if audio is None and stream and not debug:
+            # Send each sentence as soon as it is synthesized; the slot is held until the stream ends
+            chunks = admission.hold(iter_segments(enhanced_text, language, slow, timings), admitted_at)
+            # Synthesize the first sentence before responding so errors still return JSON
+            first = await chunks.__anext__()
+
+            async def body():
+                parts = [first]
+                yield first
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
+                await asyncio.to_thread(audio_cache.put, cache_key, join_mp3(parts))
+
+            headers = dict(NO_CACHE_HEADERS, **timing_headers(timings))
+            headers['Content-Disposition'] = 'inline'
+            return StreamingResponse(body(), media_type='audio/mpeg', headers=headers)
+        elif audio is None:
+            # Synthesize only the sentences that are not cached yet
+            try:
+                audio = join_mp3([chunk async for chunk in iter_segments(enhanced_text, language, slow, timings)])
+            finally:
+                admission.release(admitted_at)
+            await asyncio.to_thread(audio_cache.put, cache_key, audio)
+
+        # Send the audio (cacheable and seekable once it is complete)
+        return audio_response(request, audio, cache_key, timings, debug)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await gtts_async.close_session()
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/cache-stats', cache_stats, methods=['GET']),
+        Route('/api/upstream-stats', upstream_stats, methods=['GET']),
+        Route('/api/admission-stats', admission_stats, methods=['GET']),
+        Route('/api/stream-speech', stream_speech, methods=['GET', 'POST']),
+    ],
+    # Enable CORS for all routes
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
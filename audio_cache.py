@@ -0,0 +1,243 @@
+"""
+Content-addressed audio cache for the TTS servers.
+Synthesized audio is stored under a hash of everything that influences the
+output, in a size-bounded in-process LRU tier backed by a persistent on-disk tier.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Default tier sizes (override with TTS_CACHE_MEMORY_MB / TTS_CACHE_DISK_MB)
+DEFAULT_MEMORY_MB = 64
+DEFAULT_DISK_MB = 1024
+
+# Default location of the on-disk tier (override with TTS_CACHE_DIR)
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "tts_audio_cache")
+
+
+def make_cache_key(text, language="en", slow=False, emotion="neutral",
+                   backend="gtts", model=None, vocoder=None, audio_format=None):
+    """
+    Build the cache key for a synthesis request.
+
+    Args:
+        text (str): The enhanced text that is sent to the backend.
+        language (str): The language code.
+        slow (bool): Whether to speak slowly.
+        emotion (str): The emotion that was applied to the text.
+        backend (str): The synthesis backend ("gtts" or "coqui").
+        model (str): The Coqui model name, if any.
+        vocoder (str): The Coqui vocoder name, if any.
+        audio_format (str): The encoding of the audio, if not the backend's default.
+
+    Returns:
+        str: A hex digest identifying the audio.
+    """
+    fields = [text, language, bool(slow), emotion, backend, model, vocoder]
+    if audio_format is not None:
+        # Only appended when set, so keys of default-format audio stay the same
+        fields.append(audio_format)
+    payload = json.dumps(
+        fields,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Two-tier (memory + disk) cache of synthesized audio keyed by make_cache_key().
+    """
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_MB * 1024 * 1024,
+                 disk_dir=DEFAULT_CACHE_DIR, disk_bytes=DEFAULT_DISK_MB * 1024 * 1024):
+        """
+        Args:
+            memory_bytes (int): Budget of the in-process LRU tier (0 disables it).
+            disk_dir (str): Directory of the on-disk tier.
+            disk_bytes (int): Budget of the on-disk tier (0 disables it).
+        """
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+        if self.disk_bytes > 0:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+            except OSError as e:
+                # Read-only filesystems (e.g. serverless) only get the memory tier
+                print(f"Audio cache disk tier disabled: {str(e)}")
+                self.disk_bytes = 0
+
+    @classmethod
+    def from_env(cls):
+        """Create a cache configured from the TTS_CACHE_* environment variables."""
+        return cls(
+            memory_bytes=int(float(os.environ.get("TTS_CACHE_MEMORY_MB", DEFAULT_MEMORY_MB)) * 1024 * 1024),
+            disk_dir=os.environ.get("TTS_CACHE_DIR", DEFAULT_CACHE_DIR),
+            disk_bytes=int(float(os.environ.get("TTS_CACHE_DISK_MB", DEFAULT_DISK_MB)) * 1024 * 1024)
+        )
+
+    def get(self, key):
+        """
+        Look up audio by key.
+
+        Returns:
+            bytes: The cached audio, or None on a miss.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return data
+
+        data = self._disk_get(key)
+
+        with self._lock:
+            if data is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._memory_put(key, data)
+            return data
+
+    def put(self, key, data):
+        """Store audio in both tiers."""
+        if not data:
+            return
+        with self._lock:
+            self._memory_put(key, data)
+        self._disk_put(key, data)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current tier sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_size
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["disk_enabled"] = self.disk_bytes > 0
+        return stats
+
+    def clear(self):
+        """Drop the memory tier (the disk tier is left in place)."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+
+    def _memory_put(self, key, data):
+        # Caller holds the lock
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self._stats["memory_evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key):
+        if self.disk_bytes <= 0:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Refresh the modification time so disk eviction is least-recently-used
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError:
+            with self._lock:
+                self._stats["disk_errors"] += 1
+            return None
+
+    def _disk_put(self, key, data):
+        if self.disk_bytes <= 0 or len(data) > self.disk_bytes:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see partial audio
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            with self._lock:
+                self._stats["disk_errors"] += 1
+            return
+
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_disk_size()
+            else:
+                self._disk_size += len(data)
+            if self._disk_size > self.disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk_size(self):
+        total = 0
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _evict_disk(self):
+        # Caller holds the lock. Other worker processes share the directory,
+        # so rescan it instead of trusting the running total.
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the budget to avoid rescanning on every write
+        target = self.disk_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._stats["disk_evictions"] += 1
+        self._disk_size = total
@@ -0,0 +1,152 @@
+"""
+Compressed encodings of synthesized WAV audio.
+Coqui TTS produces 16-bit PCM WAV; this module re-encodes it as Opus (in
+OGG), MP3 or FLAC using the optional soundfile package (libsndfile), on a
+bounded process-wide worker pool so the CPU work runs off the request thread.
+"""
+
+import io
+import os
+import wave
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+    import soundfile
+except ImportError:
+    # Only WAV is available without NumPy and soundfile (gTTS-only installs)
+    np = None
+    soundfile = None
+
+# Output formats: mimetype and libsndfile (format, subtype)
+FORMATS = {
+    'wav': {'mimetype': 'audio/wav', 'sndfile': None},
+    'ogg': {'mimetype': 'audio/ogg', 'sndfile': ('OGG', 'OPUS')},
+    'mp3': {'mimetype': 'audio/mpeg', 'sndfile': ('MP3', 'MPEG_LAYER_III')},
+    'flac': {'mimetype': 'audio/flac', 'sndfile': ('FLAC', 'PCM_16')},
+}
+
+# Other names accepted in the "format" field
+FORMAT_ALIASES = {'opus': 'ogg', 'mpeg': 'mp3', 'wave': 'wav'}
+
+# Opus only encodes these sample rates; other rates are resampled up to the next one
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Encoder threads per process (TTS_ENCODE_WORKERS); libsndfile runs without the GIL
+ENCODE_WORKERS = int(os.environ.get('TTS_ENCODE_WORKERS', os.cpu_count() or 2))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def available_formats():
+    """
+    Return the output formats that can be produced in this environment.
+
+    Returns:
+        list: Format names, "wav" first.
+    """
+    formats = ['wav']
+    if soundfile is not None:
+        for name, info in FORMATS.items():
+            if info['sndfile'] is None:
+                continue
+            major, subtype = info['sndfile']
+            if major in soundfile.available_formats() and subtype in soundfile.available_subtypes(major):
+                formats.append(name)
+    return formats
+
+
+def choose_format(requested=None, accept_mimetypes=None):
+    """
+    Pick the output format from a "format" field or the Accept header.
+
+    An explicit "format" wins. Otherwise the client's preferred available
+    mimetype is used; WAV is listed first, so "*/*" keeps returning WAV.
+
+    Args:
+        requested (str): Value of the "format" request field, if any.
+        accept_mimetypes (MIMEAccept): The request's parsed Accept header.
+
+    Returns:
+        str: A key of FORMATS.
+
+    Raises:
+        ValueError: If the requested format is unknown or not available.
+    """
+    formats = available_formats()
+
+    if requested:
+        name = FORMAT_ALIASES.get(requested.lower(), requested.lower())
+        if name not in formats:
+            raise ValueError(f"Unsupported format '{requested}'. Available formats: {', '.join(formats)}")
+        return name
+
+    if accept_mimetypes:
+        best = accept_mimetypes.best_match([FORMATS[name]['mimetype'] for name in formats])
+        for name in formats:
+            if FORMATS[name]['mimetype'] == best:
+                return name
+    return 'wav'
+
+
+def mimetype_for(audio_format):
+    """Return the Content-Type of an output format."""
+    return FORMATS[audio_format]['mimetype']
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, ENCODE_WORKERS), thread_name_prefix='encode')
+        return _executor
+
+
+def resample(samples, source_rate, target_rate):
+    """Linearly resample int16 samples (speech only needs a small rate change)."""
+    if source_rate == target_rate:
+        return samples
+    if samples.ndim > 1:
+        return np.stack([resample(channel, source_rate, target_rate) for channel in samples.T], axis=1)
+    count = int(round(len(samples) * target_rate / source_rate))
+    positions = np.arange(count) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype('<i2')
+
+
+def _encode(wav_bytes, audio_format):
+    with wave.open(io.BytesIO(wav_bytes)) as reader:
+        sample_rate = reader.getframerate()
+        channels = reader.getnchannels()
+        if reader.getsampwidth() != 2:
+            raise ValueError('Only 16-bit PCM WAV can be encoded')
+        samples = np.frombuffer(reader.readframes(reader.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+
+    major, subtype = FORMATS[audio_format]['sndfile']
+    if subtype == 'OPUS' and sample_rate not in OPUS_SAMPLE_RATES:
+        target_rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= sample_rate), OPUS_SAMPLE_RATES[-1])
+        samples = resample(samples, sample_rate, target_rate)
+        sample_rate = target_rate
+
+    output = io.BytesIO()
+    soundfile.write(output, samples, sample_rate, format=major, subtype=subtype)
+    return output.getvalue()
+
+
+def encode_audio(wav_bytes, audio_format):
+    """
+    Encode a 16-bit PCM WAV file into another format on the encoder pool.
+
+    Args:
+        wav_bytes (bytes): The WAV file.
+        audio_format (str): A format returned by choose_format().
+
+    Returns:
+        bytes: The encoded audio (the input itself for "wav").
+    """
+    if audio_format == 'wav':
+        return wav_bytes
+    return _get_executor().submit(_encode, wav_bytes, audio_format).result()
@@ -0,0 +1,216 @@
+"""
+Sentence-level segmentation and splicing of synthesized audio.
+Enhanced text is split into sentences so that each sentence's audio can be
+cached on its own and only the sentences that were never seen are synthesized.
+"""
+
+import re
+import struct
+
+# Sentence boundary: whitespace following sentence-final punctuation
+SEGMENT_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_segments(text):
+    """
+    Split enhanced text into sentence segments.
+
+    Args:
+        text (str): The enhanced text.
+
+    Returns:
+        list: The non-empty sentence segments, in order.
+    """
+    return [segment for segment in SEGMENT_BOUNDARY.split(text.strip()) if segment]
+
+
+def iter_segments(text, synthesize, cache=None, key_func=None, single_flight=None, progress=None):
+    """
+    Yield the audio of each sentence segment in order, reusing cached sentence audio.
+
+    Args:
+        text (str): The enhanced text.
+        synthesize (callable): Turns one segment into audio bytes.
+        cache (AudioCache): Cache for segment audio (optional).
+        key_func (callable): Maps a segment to its cache key (required with cache).
+        single_flight (SingleFlight): Coalesces identical segments that are
+            synthesized concurrently (optional, used with cache).
+        progress (callable): Called as progress(done, total) after each segment (optional).
+
+    Yields:
+        bytes: The audio of one segment.
+    """
+    # Text without any speakable segment is passed through so the backend reports the error
+    segments = split_segments(text) or [text]
+    for index, segment in enumerate(segments, 1):
+        if cache is None:
+            audio = synthesize(segment)
+        else:
+            audio = _cached_segment(segment, synthesize, cache, key_func, single_flight)
+
+        if progress is not None:
+            progress(index, len(segments))
+        yield audio
+
+
+def _cached_segment(segment, synthesize, cache, key_func, single_flight):
+    key = key_func(segment)
+    audio = cache.get(key)
+
+    if audio is None and single_flight is not None:
+        audio = single_flight.do(
+            key,
+            lambda: _synthesize_and_cache(synthesize, segment, cache, key),
+            recheck=lambda: cache.get(key)
+        )
+    elif audio is None:
+        audio = _synthesize_and_cache(synthesize, segment, cache, key)
+
+    return audio
+
+
+def _synthesize_and_cache(synthesize, segment, cache, key):
+    audio = synthesize(segment)
+    cache.put(key, audio)
+    return audio
+
+
+def synthesize_segments(text, synthesize, join, cache=None, key_func=None, single_flight=None, progress=None):
+    """
+    Synthesize text sentence by sentence, reusing cached sentence audio.
+
+    Args:
+        text (str): The enhanced text.
+        synthesize (callable): Turns one segment into audio bytes.
+        join (callable): Joins a list of audio byte strings into one.
+        cache (AudioCache): Cache for segment audio (optional).
+        key_func (callable): Maps a segment to its cache key (required with cache).
+        single_flight (SingleFlight): Coalesces concurrent identical segments (optional).
+        progress (callable): Called as progress(done, total) after each segment (optional).
+
+    Returns:
+        bytes: The joined audio.
+    """
+    return join(list(iter_segments(text, synthesize, cache, key_func, single_flight, progress)))
+
+
+def stream_segments(text, synthesize, join, cache=None, key_func=None, full_key=None, single_flight=None):
+    """
+    Like synthesize_segments(), but yield each segment as soon as it is ready.
+
+    Once the last segment has been produced, the joined audio is stored in
+    the cache under full_key so later requests for the whole text hit.
+
+    Yields:
+        bytes: The audio of one segment.
+    """
+    parts = []
+    for audio in iter_segments(text, synthesize, cache, key_func, single_flight):
+        parts.append(audio)
+        yield audio
+
+    if cache is not None and full_key is not None:
+        cache.put(full_key, join(parts))
+
+
+def join_mp3(parts):
+    """
+    Join MP3 segments.
+
+    MP3 is a sequence of self-contained frames, so segments can simply be
+    concatenated (this is also how gTTS joins its own chunks).
+    """
+    return b''.join(parts)
+
+
+def join_wav(parts):
+    """
+    Join WAV segments that share the same format into one WAV file.
+    """
+    fmt = None
+    data = []
+
+    for part in parts:
+        part_fmt, part_data = _read_wav(part)
+        if fmt is None:
+            fmt = part_fmt
+        elif part_fmt != fmt:
+            raise ValueError('Cannot join WAV segments with different formats')
+        data.append(part_data)
+
+    if fmt is None:
+        raise ValueError('No WAV segments to join')
+
+    return _write_wav(fmt, b''.join(data))
+
+
+def stream_wav(parts):
+    """
+    Turn WAV segments into one streamed WAV file.
+
+    A header with unknown (0xFFFFFFFF) sizes is yielded with the first
+    segment's samples, followed by the samples of every later segment.
+
+    Args:
+        parts (iterable): WAV segments that share the same format.
+
+    Yields:
+        bytes: The header, then sample data.
+    """
+    fmt = None
+    for part in parts:
+        part_fmt, part_data = _read_wav(part)
+        if fmt is None:
+            fmt = part_fmt
+            yield b''.join([
+                b'RIFF', struct.pack('<I', 0xFFFFFFFF), b'WAVE',
+                b'fmt ', struct.pack('<I', len(fmt)), fmt, b'\x00' * (len(fmt) & 1),
+                b'data', struct.pack('<I', 0xFFFFFFFF),
+            ])
+        elif part_fmt != fmt:
+            raise ValueError('Cannot join WAV segments with different formats')
+        yield part_data
+
+
+def _read_wav(wav_bytes):
+    """Return the raw 'fmt ' chunk and the sample data of a RIFF/WAVE file."""
+    if wav_bytes[:4] != b'RIFF' or wav_bytes[8:12] != b'WAVE':
+        raise ValueError('Not a WAV file')
+
+    fmt = None
+    data = None
+    pos = 12
+    while pos + 8 <= len(wav_bytes):
+        chunk_id = wav_bytes[pos:pos + 4]
+        chunk_size = struct.unpack('<I', wav_bytes[pos + 4:pos + 8])[0]
+        chunk = wav_bytes[pos + 8:pos + 8 + chunk_size]
+        if chunk_id == b'fmt ':
+            fmt = chunk
+        elif chunk_id == b'data':
+            data = chunk
+        # Chunks are padded to an even number of bytes
+        pos += 8 + chunk_size + (chunk_size & 1)
+
+    if fmt is None or data is None:
+        raise ValueError('WAV file is missing its fmt or data chunk')
+    return fmt, data
+
+
+def _write_wav(fmt, data):
+    """Build a RIFF/WAVE file from a raw 'fmt ' chunk and sample data."""
+    chunks = [b'fmt ', struct.pack('<I', len(fmt)), fmt]
+    if len(fmt) & 1:
+        chunks.append(b'\x00')
+
+    # Non-PCM formats (e.g. IEEE float) carry a 'fact' chunk with the sample count
+    format_tag = struct.unpack('<H', fmt[:2])[0]
+    block_align = struct.unpack('<H', fmt[12:14])[0]
+    if format_tag != 1:
+        chunks += [b'fact', struct.pack('<I', 4), struct.pack('<I', len(data) // block_align)]
+
+    chunks += [b'data', struct.pack('<I', len(data)), data]
+    if len(data) & 1:
+        chunks.append(b'\x00')
+
+    body = b''.join(chunks)
+    return b'RIFF' + struct.pack('<I', 4 + len(body)) + b'WAVE' + body
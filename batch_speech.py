@@ -0,0 +1,251 @@
+"""
+Bulk synthesis for /api/batch-speech.
+Items are synthesized concurrently on a bounded per-request thread pool and
+streamed back in completion order, either as multipart/mixed parts or as
+entries of a streaming ZIP archive. A failing item is reported in the output
+instead of failing the whole batch.
+"""
+
+import io
+import os
+import json
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import Response
+
+# Items synthesized at the same time per batch request (TTS_BATCH_CONCURRENCY)
+DEFAULT_CONCURRENCY = 4
+BATCH_CONCURRENCY = int(os.environ.get('TTS_BATCH_CONCURRENCY', DEFAULT_CONCURRENCY))
+
+# Largest number of items accepted in one request (TTS_BATCH_MAX_ITEMS)
+DEFAULT_MAX_ITEMS = 500
+BATCH_MAX_ITEMS = int(os.environ.get('TTS_BATCH_MAX_ITEMS', DEFAULT_MAX_ITEMS))
+
+# File extensions of the audio mimetypes
+EXTENSIONS = {
+    'audio/mpeg': 'mp3',
+    'audio/wav': 'wav',
+    'audio/ogg': 'ogg',
+    'audio/flac': 'flac',
+}
+
+OUTPUT_FORMATS = ('multipart', 'zip')
+
+
+def choose_output(requested=None, accept_mimetypes=None):
+    """
+    Pick the batch output format from a "output" field or the Accept header.
+
+    Returns:
+        str: "multipart" (default) or "zip".
+
+    Raises:
+        ValueError: If an unknown output format is requested.
+    """
+    if requested:
+        if requested not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output '{requested}'. Use one of: {', '.join(OUTPUT_FORMATS)}")
+        return requested
+    if accept_mimetypes and accept_mimetypes.best_match(['multipart/mixed', 'application/zip']) == 'application/zip':
+        return 'zip'
+    return 'multipart'
+
+
+def item_count(data):
+    """Return the number of items in a batch request body (0 if it has none), e.g. for rate limiting."""
+    items = data if isinstance(data, list) else data.get('items') if isinstance(data, dict) else None
+    return len(items) if isinstance(items, list) else 0
+
+
+def parse_batch_request(data, accept_mimetypes=None):
+    """
+    Validate a batch request body.
+
+    Args:
+        data (dict or list): {"items": [...], "output": ...} or a bare list of items.
+        accept_mimetypes (MIMEAccept): The request's parsed Accept header.
+
+    Returns:
+        tuple: (items, output)
+
+    Raises:
+        ValueError: If there are no items, too many items or an unknown output.
+    """
+    if isinstance(data, list):
+        items, requested = data, None
+    elif isinstance(data, dict):
+        items, requested = data.get('items'), data.get('output')
+    else:
+        items, requested = None, None
+
+    if not isinstance(items, list) or not items:
+        raise ValueError('No items provided')
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f'Too many items ({len(items)}); the limit is {BATCH_MAX_ITEMS}')
+    return items, choose_output(requested, accept_mimetypes)
+
+
+def iter_results(items, synthesize_item, concurrency=BATCH_CONCURRENCY):
+    """
+    Synthesize items concurrently and yield their results as they finish.
+
+    Args:
+        items (list): The request items.
+        synthesize_item (callable): Turns one item into (audio bytes, mimetype).
+        concurrency (int): Items synthesized at the same time.
+
+    Yields:
+        tuple: (index, audio, mimetype, error) where error is None on success.
+    """
+    if not items:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items))),
+                                  thread_name_prefix='batch-speech')
+    try:
+        futures = {executor.submit(_synthesize_checked, synthesize_item, item): index
+                   for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                audio, mimetype = future.result()
+                yield index, audio, mimetype, None
+            except Exception as e:
+                yield index, None, None, str(e)
+    finally:
+        # Stop queued items if the client goes away
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _synthesize_checked(synthesize_item, item):
+    if not isinstance(item, dict) or not item.get('text'):
+        raise ValueError('No text provided')
+    return synthesize_item(item)
+
+
+def _filename(index, mimetype):
+    return f"{index:04d}.{EXTENSIONS.get(mimetype, 'bin')}"
+
+
+def _summary(count, errors, started):
+    return {
+        'items': count,
+        'succeeded': count - len(errors),
+        'failed': len(errors),
+        'errors': sorted(errors, key=lambda error: error['index']),
+        'seconds': round(time.time() - started, 3),
+    }
+
+
+def stream_multipart(items, synthesize_item, boundary, concurrency=BATCH_CONCURRENCY):
+    """
+    Yield a multipart/mixed body with one part per item, in completion order.
+
+    Audio parts carry the item index in X-Item-Index; failed items are
+    application/json parts with X-Item-Status: error. A final JSON part
+    summarizes the batch.
+    """
+    started = time.time()
+    errors = []
+    delimiter = f'--{boundary}\r\n'.encode('ascii')
+
+    for index, audio, mimetype, error in iter_results(items, synthesize_item, concurrency):
+        if error is None:
+            headers = (
+                f'Content-Type: {mimetype}\r\n'
+                f'Content-Disposition: attachment; filename="{_filename(index, mimetype)}"\r\n'
+                f'X-Item-Index: {index}\r\n'
+                f'X-Item-Status: ok\r\n'
+            )
+            body = audio
+        else:
+            errors.append({'index': index, 'error': error})
+            headers = (
+                'Content-Type: application/json\r\n'
+                f'X-Item-Index: {index}\r\n'
+                'X-Item-Status: error\r\n'
+            )
+            body = json.dumps({'index': index, 'error': error}).encode('utf-8')
+
+        yield delimiter + f'{headers}Content-Length: {len(body)}\r\n\r\n'.encode('ascii') + body + b'\r\n'
+
+    summary = json.dumps(_summary(len(items), errors, started)).encode('utf-8')
+    yield (delimiter
+           + b'Content-Type: application/json\r\nX-Item-Status: summary\r\n'
+           + f'Content-Length: {len(summary)}\r\n\r\n'.encode('ascii')
+           + summary + f'\r\n--{boundary}--\r\n'.encode('ascii'))
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Unseekable file object that collects what ZipFile writes so it can be yielded."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(items, synthesize_item, concurrency=BATCH_CONCURRENCY):
+    """
+    Yield a ZIP archive with one entry per item, written as items finish.
+
+    Audio is stored uncompressed (it is already compressed or cheap to
+    transfer as is); a final summary.json lists the failed items.
+    """
+    started = time.time()
+    errors = []
+    buffer = _StreamBuffer()
+
+    # ZipFile writes data descriptors instead of seeking back on unseekable output
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for index, audio, mimetype, error in iter_results(items, synthesize_item, concurrency):
+            if error is None:
+                info = zipfile.ZipInfo(_filename(index, mimetype), date_time=time.localtime()[:6])
+                archive.writestr(info, audio)
+            else:
+                errors.append({'index': index, 'error': error})
+            data = buffer.drain()
+            if data:
+                yield data
+
+        info = zipfile.ZipInfo('summary.json', date_time=time.localtime()[:6])
+        archive.writestr(info, json.dumps(_summary(len(items), errors, started), indent=2))
+
+    yield buffer.drain()
+
+
+def batch_response(items, synthesize_item, output='multipart', concurrency=BATCH_CONCURRENCY):
+    """
+    Build the streaming response of a batch request.
+
+    Args:
+        items (list): The request items.
+        synthesize_item (callable): Turns one item into (audio bytes, mimetype).
+        output (str): "multipart" or "zip".
+        concurrency (int): Items synthesized at the same time.
+
+    Returns:
+        Response: The streaming response.
+    """
+    headers = {'Cache-Control': 'no-store', 'X-Batch-Items': str(len(items))}
+    if output == 'zip':
+        headers['Content-Disposition'] = 'attachment; filename="speech.zip"'
+        return Response(stream_zip(items, synthesize_item, concurrency),
+                        mimetype='application/zip', headers=headers)
+
+    boundary = uuid.uuid4().hex
+    return Response(stream_multipart(items, synthesize_item, boundary, concurrency),
+                    content_type=f'multipart/mixed; boundary={boundary}', headers=headers)
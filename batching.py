@@ -0,0 +1,128 @@
+"""
+Dynamic micro-batching for model inference.
+Items are run on a single inference thread per process. Items that queued up
+while the previous batch was running (or that arrive within an optional
+window) are handed to a batch function together; each caller receives its
+own slice of the results.
+"""
+
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Defaults (override with TTS_BATCH_MAX_SIZE / TTS_BATCH_WAIT_MS)
+DEFAULT_MAX_BATCH_SIZE = 4
+DEFAULT_MAX_WAIT_MS = 0.0
+
+
+class BatchScheduler:
+    """
+    Collects submitted items into batches and runs them on a single worker thread.
+    """
+
+    def __init__(self, run_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        """
+        Args:
+            run_batch (callable): run_batch(key, items) returning one result per item.
+                Items in a batch always share the same key (e.g. the model).
+            max_batch_size (int): Largest number of items run together.
+            max_wait_ms (float): How long the first item of a batch waits for company.
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+        self._stats = {'batches': 0, 'items': 0, 'largest_batch': 0, 'failed_batches': 0}
+
+    @classmethod
+    def from_env(cls, run_batch):
+        """Create a scheduler configured from TTS_BATCH_MAX_SIZE and TTS_BATCH_WAIT_MS."""
+        return cls(
+            run_batch,
+            max_batch_size=int(os.environ.get('TTS_BATCH_MAX_SIZE', DEFAULT_MAX_BATCH_SIZE)),
+            max_wait_ms=float(os.environ.get('TTS_BATCH_WAIT_MS', DEFAULT_MAX_WAIT_MS))
+        )
+
+    def submit(self, key, item):
+        """
+        Run an item as part of the next batch for its key and wait for its result.
+
+        Raises:
+            Exception: Whatever the batch function raised for the batch.
+        """
+        future = Future()
+        self._ensure_worker().put((key, item, future))
+        return future.result()
+
+    def stats(self):
+        """Return batch counters and the current configuration."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = self._queue.qsize() if self._queue is not None else 0
+        stats['average_batch_size'] = stats['items'] / stats['batches'] if stats['batches'] else 0.0
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_wait_ms'] = self.max_wait * 1000.0
+        return stats
+
+    def _ensure_worker(self):
+        # Threads do not survive fork (e.g. gunicorn --preload), so start one per process
+        with self._lock:
+            if self._worker is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run_forever, args=(self._queue,),
+                                                name='batch-scheduler', daemon=True)
+                self._worker.start()
+            return self._queue
+
+    def _run_forever(self, pending):
+        while True:
+            batch = [pending.get()]
+
+            # Collect more items until the batch is full or the window closes;
+            # items already queued are always taken, even with a zero window
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(pending.get(timeout=remaining))
+                    else:
+                        batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            groups = OrderedDict()
+            for key, item, future in batch:
+                groups.setdefault(key, []).append((item, future))
+
+            for key, entries in groups.items():
+                self._run_group(key, entries)
+
+    def _run_group(self, key, entries):
+        items = [item for item, _ in entries]
+        try:
+            results = self.run_batch(key, items)
+            if len(results) != len(items):
+                raise RuntimeError(f'Batch function returned {len(results)} results for {len(items)} items')
+        except Exception as e:
+            with self._lock:
+                self._stats['failed_batches'] += 1
+            for _, future in entries:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['items'] += len(items)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(items))
+
+        for (_, future), result in zip(entries, results):
+            future.set_result(result)
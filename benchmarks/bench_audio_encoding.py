@@ -0,0 +1,62 @@
+"""
+Benchmark of the compressed output formats for Coqui TTS audio.
+A speech-like test signal (a voiced harmonic series with syllable-rate
+amplitude modulation and a little noise) is encoded to every available
+format. For each format the script reports encode time per second of audio,
+output size, bitrate and compression relative to 16-bit PCM WAV.
+
+Usage:
+    python benchmarks/bench_audio_encoding.py --seconds 5 30 --sample-rate 22050
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wav_writer import encode_wav
+from audio_encoding import available_formats, encode_audio
+
+
+def speech_like(seconds, sample_rate, seed=0):
+    """Return a float waveform in [-1, 1] with a rough speech spectrum and rhythm."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 20))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    wave = voiced * envelope + 0.02 * rng.standard_normal(len(t))
+    return 0.8 * wave / np.max(np.abs(wave))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, nargs='+', default=[5, 30], help='Audio durations to encode')
+    parser.add_argument('--sample-rate', type=int, default=22050, help='Sample rate of the synthesized audio')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    formats = available_formats()
+    if formats == ['wav']:
+        print("soundfile is not installed; only WAV is available (pip install soundfile)")
+
+    print(f"{'seconds':>8} {'format':>7} {'ms/s audio':>11} {'bytes':>10} {'kbit/s':>8} {'vs wav':>7}")
+    for seconds in args.seconds:
+        wav = encode_wav(speech_like(seconds, args.sample_rate), args.sample_rate)
+        for audio_format in formats:
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                encoded = encode_audio(wav, audio_format)
+                best = min(best, time.perf_counter() - start)
+            print(f"{seconds:>8.1f} {audio_format:>7} {best * 1000 / seconds:>11.2f} {len(encoded):>10} "
+                  f"{len(encoded) * 8 / seconds / 1000:>8.1f} {len(wav) / len(encoded):>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
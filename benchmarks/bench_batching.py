@@ -0,0 +1,163 @@
+"""
+Throughput and latency of Coqui inference batching.
+Concurrent clients submit sentences to coqui_tts_fallback's inference path
+and the script reports requests per second and p50/p99 latency for each
+combination of maximum batch size and batching window. "unbatched" runs every
+request on its own thread with the model's inference lock held around
+synthesizer.tts(), so requests take turns one sentence at a time.
+
+By default the models are an untrained Tacotron2-DDC and a HiFiGAN generator
+of the size of Coqui's released ones, created in a temporary directory
+(no download needed). Their weights are random, so every sentence decodes
+--decoder-steps steps, about the length of a spoken sentence; the cost of
+each model call is that of the real architectures. --model (and --vocoder)
+loads a released Coqui model through coqui_tts_fallback instead. Batching
+only applies with a vocoder.
+
+Usage:
+    python benchmarks/bench_batching.py --clients 8 --batch-sizes 1 4 8 --wait-ms 0 20
+    python benchmarks/bench_batching.py --model tts_models/en/ljspeech/tacotron2-DDC --vocoder vocoder_models/en/ljspeech/hifigan_v2
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Please call me back when you get this message.",
+    "It is going to rain this afternoon, so take an umbrella.",
+    "Thank you.",
+    "The meeting has been moved to Thursday at three o'clock in the large conference room.",
+]
+
+
+def make_untrained_models(directory, decoder_steps):
+    """Write an untrained Tacotron2-DDC and HiFiGAN with their configs and return a Synthesizer for them."""
+    import torch
+    from TTS.tts.configs.shared_configs import BaseAudioConfig
+    from TTS.tts.configs.tacotron2_config import Tacotron2Config
+    from TTS.tts.models.tacotron2 import Tacotron2
+    from TTS.utils.synthesizer import Synthesizer
+    from TTS.vocoder.configs.hifigan_config import HifiganConfig
+    from TTS.vocoder.models import setup_model as setup_vocoder_model
+
+    # The audio settings of Coqui's LJSpeech models
+    audio = BaseAudioConfig(sample_rate=22050, hop_length=256, win_length=1024, fft_size=1024, num_mels=80,
+                            mel_fmin=0, mel_fmax=8000, signal_norm=True, do_trim_silence=True)
+    config = Tacotron2Config(audio=audio, use_phonemes=False, text_cleaner='english_cleaners', r=2,
+                             double_decoder_consistency=True, ddc_r=6, gradual_training=None,
+                             max_decoder_steps=decoder_steps)
+    model = Tacotron2.init_from_config(config)
+    # A random stop token would end sentences at random; always decode max_decoder_steps instead
+    model.decoder.stopnet[-1].linear_layer.bias.data.fill_(-100.0)
+    model_path = os.path.join(directory, 'model.pth')
+    config_path = os.path.join(directory, 'config.json')
+    torch.save({'model': model.state_dict(), 'config': config.to_dict()}, model_path)
+    config.save_json(config_path)
+
+    # hifigan_v2: the smaller generator Coqui ships for its LJSpeech models
+    vocoder_config = HifiganConfig(audio=audio.to_dict())
+    vocoder_config.generator_model_params = {
+        'upsample_factors': [8, 8, 2, 2], 'upsample_kernel_sizes': [16, 16, 4, 4], 'upsample_initial_channel': 128,
+        'resblock_kernel_sizes': [3, 7, 11], 'resblock_dilation_sizes': [[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+        'resblock_type': '1',
+    }
+    vocoder_path = os.path.join(directory, 'vocoder.pth')
+    vocoder_config_path = os.path.join(directory, 'vocoder_config.json')
+    torch.save({'model': setup_vocoder_model(vocoder_config).state_dict()}, vocoder_path)
+    vocoder_config.save_json(vocoder_config_path)
+
+    return Synthesizer(tts_checkpoint=model_path, tts_config_path=config_path,
+                       vocoder_checkpoint=vocoder_path, vocoder_config=vocoder_config_path)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_load(call, clients, requests_per_client):
+    """Run clients that each send requests back to back; return (seconds, latencies)."""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(index):
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            call(SENTENCES[(index + i) % len(SENTENCES)])
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label, seconds, latencies):
+    print(f"{label:>22} {len(latencies) / seconds:>10.2f} "
+          f"{percentile(latencies, 0.50) * 1000:>9.0f} {percentile(latencies, 0.99) * 1000:>9.0f}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--requests', type=int, default=3, help='Requests per client')
+    parser.add_argument('--wait-ms', type=float, nargs='+', default=[0, 20])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--model', help='Coqui model name (default: untrained Tacotron2-DDC)')
+    parser.add_argument('--vocoder', help='Coqui vocoder name for --model')
+    parser.add_argument('--decoder-steps', type=int, default=200, help='Decoder steps per sentence of the untrained model')
+    parser.add_argument('--torch-threads', type=int, default=0, help='torch threads (default: torch chooses)')
+    args = parser.parse_args()
+
+    os.environ['TTS_BACKEND'] = 'coqui'
+    import coqui_tts_fallback as tts
+    from batching import BatchScheduler
+    if not tts.import_coqui():
+        sys.exit('Coqui TTS is not installed')
+    if args.torch_threads:
+        tts.torch.set_num_threads(args.torch_threads)
+
+    if args.model:
+        synthesizer = tts.load_tts_model(args.model, args.vocoder)
+        if synthesizer is None:
+            sys.exit(f'Could not load {args.model}')
+    else:
+        synthesizer = make_untrained_models(tempfile.mkdtemp(prefix='bench_batching_'), args.decoder_steps)
+
+    from vocoder_batch import can_batch
+    print(f"{args.clients} clients x {args.requests} requests, {args.model or 'untrained Tacotron2-DDC'}, "
+          f"batched vocoder: {'yes' if can_batch(synthesizer) else 'no'}, {tts.torch.get_num_threads()} torch threads")
+
+    # torch builds CPU kernels for every new input shape; do it for every batch size before measuring
+    for size in range(1, max(args.batch_sizes) + 1):
+        tts.synthesize_batch(synthesizer, [SENTENCES[0]] * size)
+
+    print(f"{'configuration':>22} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+
+    def unbatched(text):
+        with tts.model_registry.inference_lock(synthesizer), tts.torch.no_grad():
+            return synthesizer.tts(text)
+
+    report('unbatched', *run_load(unbatched, args.clients, args.requests))
+
+    for batch_size in args.batch_sizes:
+        for wait_ms in args.wait_ms:
+            scheduler = BatchScheduler(tts.synthesize_batch, max_batch_size=batch_size, max_wait_ms=wait_ms)
+            seconds, latencies = run_load(lambda text: scheduler.submit(synthesizer, text), args.clients, args.requests)
+            stats = scheduler.stats()
+            report(f"batch {batch_size:>2} wait {wait_ms:>4.0f}ms", seconds, latencies)
+            print(f"{'':>22} average batch {stats['average_batch_size']:.1f}, largest {stats['largest_batch']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of parallel gTTS sub-request fetching against a local mock upstream.
+Synthesizes texts of increasing length with different concurrency settings and
+reports wall time per text, plus how many upstream requests reused a pooled
+keep-alive connection. Concurrency 1 is the sequential behaviour of
+gTTS.write_to_fp().
+
+Usage:
+    python benchmarks/bench_gtts_parallel.py --latency 0.2 --concurrency 1 4 8 16
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_gtts_upstream import start_mock_upstream
+
+SENTENCE = "Tell me about a project where you had to learn something new quickly. "
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.2, help='Mock upstream latency in seconds')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000], help='Text sizes in characters')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    server, url = start_mock_upstream(latency=args.latency)
+    os.environ['TTS_GTTS_UPSTREAM'] = url
+
+    # Import after the upstream override is set
+    import gtts_backend
+
+    print(f"Mock upstream latency: {args.latency * 1000:.0f} ms")
+    print(f"{'chars':>6} {'parts':>6} {'concurrency':>12} {'seconds':>9} {'speedup':>8}")
+
+    for size in args.sizes:
+        text = (SENTENCE * (size // len(SENTENCE) + 1))[:size]
+        baseline = None
+        for concurrency in args.concurrency:
+            gtts_backend.set_concurrency(concurrency)
+
+            best = float('inf')
+            for _ in range(args.repeat):
+                before = server.requests
+                start = time.perf_counter()
+                audio = gtts_backend.synthesize_mp3(text)
+                best = min(best, time.perf_counter() - start)
+                parts = server.requests - before
+
+            assert audio.startswith(b'[Tell me about'), 'MP3 parts were reassembled out of order'
+            baseline = baseline or best
+            print(f"{size:>6} {parts:>6} {concurrency:>12} {best:>9.3f} {baseline / best:>7.2f}x")
+
+    stats = gtts_backend.connection_stats()
+    print()
+    print(f"Upstream requests: {stats['requests']}, connections opened: {stats['connections_opened']}, "
+          f"reuse ratio: {stats['reuse_ratio']:.1%}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of the startup cost of each server entry point.
+Every entry point is imported in a fresh interpreter (as gunicorn or Vercel
+would on a cold start) and the import time is reported, along with the
+slowest top-level modules from `python -X importtime`.
+
+Usage:
+    python benchmarks/bench_import_time.py --repeat 5
+    TTS_BACKEND=gtts python benchmarks/bench_import_time.py
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (entry point, module name, directory added to sys.path)
+ENTRY_POINTS = [
+    ('app.py', 'app', ROOT),
+    ('api/index.py', 'index', os.path.join(ROOT, 'api')),
+    ('tts_web_interface.py', 'tts_web_interface', ROOT),
+]
+
+TIMER = (
+    "import sys, time; sys.path.insert(0, {path!r}); "
+    "start = time.perf_counter(); import {module}; "
+    "sys.stderr.write('IMPORT_SECONDS %f\\n' % (time.perf_counter() - start))"
+)
+
+
+def import_once(module, path, importtime=False):
+    """Import a module in a new interpreter; return (seconds, stderr)."""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', TIMER.format(path=path, module=module)]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    for line in result.stderr.splitlines():
+        if line.startswith('IMPORT_SECONDS'):
+            return float(line.split()[1]), result.stderr
+    raise RuntimeError(f'Importing {module} failed:\n{result.stderr}')
+
+
+def slowest_modules(stderr, count):
+    """Return the top-level imports with the largest cumulative time (seconds)."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below their parent, which is the entry point itself
+        if name.startswith('   ') and not name.startswith('    '):
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per entry point')
+    parser.add_argument('--top', type=int, default=5, help='Slowest top-level imports to list')
+    args = parser.parse_args()
+
+    print(f"TTS_BACKEND={os.environ.get('TTS_BACKEND', 'auto')}")
+    print(f"{'entry point':>22} {'median s':>9} {'min s':>7} {'max s':>7}")
+
+    details = []
+    for name, module, path in ENTRY_POINTS:
+        timings = [import_once(module, path)[0] for _ in range(args.repeat)]
+        print(f"{name:>22} {statistics.median(timings):>9.3f} {min(timings):>7.3f} {max(timings):>7.3f}")
+        details.append((name, slowest_modules(import_once(module, path, importtime=True)[1], args.top)))
+
+    for name, modules in details:
+        print()
+        print(f"Slowest imports for {name}:")
+        for seconds, module in modules:
+            print(f"  {seconds:>7.3f} s  {module}")
+
+
+if __name__ == '__main__':
+    main()
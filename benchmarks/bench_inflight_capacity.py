@@ -0,0 +1,204 @@
+"""
+Concurrent in-flight capacity of the Flask and ASGI servers per GB of RAM.
+Starts the mock gTTS upstream with a long latency, then for every server and
+concurrency level starts the server afresh and opens that many requests at
+once, each for a different text so nothing is cached or coalesced. It
+measures how many requests the server kept waiting on the upstream at the
+same time (the peak seen by the mock) and the peak resident memory of the
+server and all its processes. Capacity per GB is the first divided by the
+second. Requests the server cannot hold wait in its queue and show up as
+multiples of the upstream latency.
+
+Servers:
+    flask    gunicorn app:app with gthread workers (the Render deployment)
+    vercel   api/index.py under gunicorn with gthread workers
+    asgi     uvicorn asgi_app:app
+
+Usage:
+    python benchmarks/bench_inflight_capacity.py --servers flask asgi --concurrency 100 500 1000 2000 \\
+        --latency 5 --workers 4 --threads 8
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gtts_upstream import start_mock_upstream
+from load_test import ROOT, free_port, percentile, start_gunicorn
+
+SERVERS = ['flask', 'vercel', 'asgi']
+
+
+def start_uvicorn(workers, port, env):
+    command = [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', '127.0.0.1', '--port', str(port),
+               '--workers', str(workers), '--log-level', 'warning', '--backlog', '4096']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'uvicorn exited with status {process.returncode}')
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/cache-stats', timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('uvicorn did not become ready within 60 seconds')
+
+
+def process_tree(pid):
+    """Return pid and the pids of all its descendants (Linux /proc)."""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def tree_rss(pid):
+    """Return the resident memory of a process and its descendants in bytes."""
+    total = 0
+    for current in process_tree(pid):
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return total
+
+
+class PeakRSS:
+    """Samples the resident memory of a process tree in the background and keeps the peak."""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = tree_rss(pid)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, tree_rss(self.pid))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def fetch(port, text, timeout):
+    """
+    Send one GET /api/stream-speech over a new connection.
+
+    A plain HTTP/1.1 client on asyncio streams, so thousands of requests can
+    be open at once from one thread.
+
+    Returns:
+        tuple: (seconds, ok)
+    """
+    start = time.perf_counter()
+    path = '/api/stream-speech?text=' + requests.utils.quote(text)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode('ascii'))
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        ok = response.startswith(b'HTTP/1.1 200') and b'\r\n\r\n[' in response
+    except (OSError, asyncio.TimeoutError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+async def wave(port, concurrency, run, timeout):
+    texts = [f'Capacity run {run} request {index}.' for index in range(concurrency)]
+    return await asyncio.gather(*(fetch(port, text, timeout) for text in texts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', choices=SERVERS, default=['flask', 'asgi'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 500, 1000, 2000],
+                        help='Requests opened at the same time')
+    parser.add_argument('--latency', type=float, default=5.0, help='Mock upstream latency in seconds')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers of the Flask servers')
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class of the Flask servers')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+    parser.add_argument('--asgi-workers', type=int, default=1, help='uvicorn worker processes')
+    args = parser.parse_args()
+    # Queued requests may take many multiples of the latency
+    timeout = args.latency * 20 + 30
+
+    # Every open request needs a socket in this process, the server and the upstream
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server, upstream_url = start_mock_upstream(latency=args.latency)
+
+    print(f"Mock upstream latency: {args.latency:.1f} s, gunicorn {args.workers} {args.worker_class} workers x "
+          f"{args.threads} threads, uvicorn {args.asgi_workers} workers")
+    print(f"{'server':<8} {'opened':>7} {'ok':>7} {'failed':>7} {'p50 s':>7} {'p99 s':>7} {'in flight':>9} "
+          f"{'idle MB':>8} {'peak MB':>8} {'per GB':>8}")
+
+    for name in args.servers:
+        for run, concurrency in enumerate(args.concurrency):
+            # A fresh server for every level, so requests still queued from the last one do not interfere
+            state_dir = tempfile.mkdtemp(prefix='tts_capacity_')
+            env = dict(os.environ, TTS_GTTS_UPSTREAM=upstream_url, TTS_BACKEND='gtts',
+                       TTS_CACHE_DIR=os.path.join(state_dir, 'cache'),
+                       TTS_JOBS_DIR=os.path.join(state_dir, 'jobs'),
+                       TTS_METRICS_DIR=os.path.join(state_dir, 'metrics'),
+                       TTS_RATE_LIMIT_PER_MINUTE='0',
+                       # Let every thread synthesize; the Flask servers are bounded by their threads
+                       TTS_MAX_SYNTHESES='0',
+                       TTS_ASYNC_HTTP_CONNECTIONS=str(concurrency))
+            port = free_port()
+            if name == 'asgi':
+                process = start_uvicorn(args.asgi_workers, port, env)
+            else:
+                process = start_gunicorn('app' if name == 'flask' else name, args.workers, args.worker_class,
+                                         args.threads, port, env)
+            try:
+                idle = tree_rss(process.pid)
+                # Upstream requests of the previous server may still be sleeping in the mock
+                while server.active:
+                    time.sleep(0.1)
+                server.peak_active = 0
+                with PeakRSS(process.pid) as rss:
+                    results = asyncio.run(wave(port, concurrency, run, timeout))
+            finally:
+                process.terminate()
+                process.wait()
+
+            latencies = sorted(seconds for seconds, ok in results if ok)
+            in_flight = server.peak_active
+            print(f"{name:<8} {concurrency:>7} {len(latencies):>7} {len(results) - len(latencies):>7} "
+                  f"{percentile(latencies, 0.50):>7.2f} {percentile(latencies, 0.99):>7.2f} {in_flight:>9} "
+                  f"{idle / 2 ** 20:>8.0f} {rss.peak / 2 ** 20:>8.0f} {in_flight / (rss.peak / 2 ** 30):>8.0f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
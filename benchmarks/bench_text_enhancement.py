@@ -0,0 +1,338 @@
+"""
+Microbenchmark for the text enhancement engine.
+Runs text_enhancement.enhance_text for every emotion over a corpus of input
+shapes (ordinary prose, punctuation-dense, comma-free, CJK and
+whitespace-heavy text) from 50 characters to 1 MB, and reports ns per
+character, peak extra memory and allocation count (tracemalloc) and the speedup over the original
+per-request add_natural_pauses/apply_emotion implementation. It also checks
+that both implementations produce identical output.
+
+Results can be saved as JSON and compared with an earlier run:
+    python benchmarks/bench_text_enhancement.py --json before.json
+    python benchmarks/bench_text_enhancement.py --json after.json --compare before.json
+
+Usage:
+    python benchmarks/bench_text_enhancement.py
+    python benchmarks/bench_text_enhancement.py --sizes 50 5000 500000 --corpora prose cjk --repeat 5
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_enhancement import enhance_text
+
+EMOTIONS = ['neutral', 'friendly', 'professional', 'enthusiastic']
+DEFAULT_SIZES = [50, 500, 5000, 50000, 500000, 1000000]
+
+SAMPLE_WORDS = (
+    "hello tell me about a time you had to find out why a project was late and "
+    "how you would start to use what you learned because it is important to get "
+    "good results but kind of hard to look at a lot of data however we like to "
+    "talk about interesting and great work therefore the end"
+).split()
+
+
+def legacy_add_natural_pauses(text):
+    """The original add_natural_pauses, kept as the reference implementation."""
+    text = re.sub(r'([.!?])', r'\1 ', text)
+    if text.count(',') < len(text) / 50:
+        text = re.sub(r'([^\s,])(\s+)(and|but|or|because|however|therefore)(\s+)', r'\1,\2\3\4', text)
+    sentences = re.split(r'([.!?])', text)
+    enhanced_sentences = []
+    for i in range(0, len(sentences), 2):
+        if i+1 < len(sentences):
+            sentence = sentences[i] + sentences[i+1]
+            if len(sentence) > 100:
+                words = sentence.split()
+                mid = len(words) // 2
+                first_half = ' '.join(words[:mid])
+                second_half = ' '.join(words[mid:])
+                enhanced_sentences.append(f"{first_half}, {second_half}")
+            else:
+                enhanced_sentences.append(sentence)
+        elif sentences[i].strip():
+            enhanced_sentences.append(sentences[i])
+    return ' '.join(enhanced_sentences)
+
+
+def legacy_apply_emotion(text, emotion):
+    """The original apply_emotion, kept as the reference implementation."""
+    if emotion == 'neutral':
+        return text
+    elif emotion == 'friendly':
+        greetings = ["Hi there! ", "Hello! ", "Great to meet you! "]
+        endings = [" That's all for now!", " Thanks for listening!", " Hope that helps!"]
+        if not re.match(r'^(hi|hello|hey|greetings)', text.lower()):
+            text = greetings[len(text) % len(greetings)] + text
+        if not re.search(r'(thanks|thank you|cheers|goodbye|bye)[\s.!?]*$', text.lower()):
+            text = text + endings[len(text) % len(endings)]
+        text = re.sub(r'\b(great|good|excellent|amazing|wonderful|fantastic)\b', r'really \1', text, flags=re.IGNORECASE)
+        return text
+    elif emotion == 'professional':
+        replacements = [
+            (r'\bkind of\b', 'somewhat'),
+            (r'\ba lot\b', 'significantly'),
+            (r'\bget\b', 'obtain'),
+            (r'\buse\b', 'utilize'),
+            (r'\bstart\b', 'commence'),
+            (r'\bend\b', 'conclude'),
+            (r'\bfind out\b', 'determine'),
+            (r'\blook at\b', 'examine'),
+            (r'\btalk about\b', 'discuss')
+        ]
+        for pattern, replacement in replacements:
+            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+        return text
+    elif emotion == 'enthusiastic':
+        text = re.sub(r'([.]) ', r'! ', text)
+        emphasis = [
+            (r'\b(good|great)\b', r'fantastic'),
+            (r'\b(like|enjoy)\b', r'love'),
+            (r'\b(interesting)\b', r'fascinating'),
+            (r'\b(important)\b', r'crucial')
+        ]
+        for pattern, replacement in emphasis:
+            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+        if len(text) > 100 and '!' not in text[:50]:
+            interjections = ["Wow! ", "Amazing! ", "Incredible! ", "Excellent! "]
+            text = interjections[len(text) % len(interjections)] + text
+        return text
+    return text
+
+
+def legacy_enhance_text(text, emotion):
+    return legacy_apply_emotion(legacy_add_natural_pauses(text), emotion)
+
+
+def make_text(size, rng):
+    """Build prose of roughly `size` characters with mixed punctuation."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(SAMPLE_WORDS)
+        if rng.random() < 0.1:
+            word = word.capitalize()
+        if rng.random() < 0.08:
+            word += rng.choice('.,!?')
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+def make_punctuation_text(size, rng):
+    """Short clauses with punctuation after nearly every word (many tiny sentences)."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(SAMPLE_WORDS) + rng.choice(['.', ',', '!', '?', '...', '?!', ';', ':'])
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+def make_comma_free_text(size, rng):
+    """Long run-on sentences full of conjunctions and no commas (the comma insertion path)."""
+    conjunctions = ['and', 'but', 'or', 'because', 'however', 'therefore']
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(conjunctions) if rng.random() < 0.25 else rng.choice(SAMPLE_WORDS)
+        if rng.random() < 0.005:
+            word += '.'
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+def make_cjk_text(size, rng):
+    """Chinese and Japanese text without spaces; its full stops are not ASCII punctuation."""
+    sentences = ['你好，我想谈谈我的项目经验。', '这是一个非常重要的问题！', '我们为什么需要学习新技术？',
+                 'この仕事はとても面白いです。', '明日の会議について話しましょう！', 'Great 工作 and 学习.']
+    text = ''
+    while len(text) < size:
+        text += rng.choice(sentences)
+    return text[:size]
+
+
+def make_whitespace_text(size, rng):
+    """Prose with long runs of spaces, tabs and newlines between words."""
+    parts = []
+    length = 0
+    while length < size:
+        word = rng.choice(SAMPLE_WORDS)
+        if rng.random() < 0.05:
+            word += rng.choice('.!?')
+        gap = ''.join(rng.choice(' \t\n') for _ in range(rng.randint(1, 12)))
+        parts.append(word + gap)
+        length += len(word) + len(gap)
+    return ''.join(parts)[:size]
+
+
+CORPORA = {
+    'prose': make_text,
+    'punctuation': make_punctuation_text,
+    'comma_free': make_comma_free_text,
+    'cjk': make_cjk_text,
+    'whitespace': make_whitespace_text,
+}
+
+
+def time_call(func, text, emotion, repeat):
+    """Return the best wall time of `repeat` runs, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text, emotion)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func, text, emotion):
+    """Return the peak memory allocated during one call, in bytes (the input itself excluded)."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func(text, emotion)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def allocation_count(func, text, emotion):
+    """
+    Return the number of memory blocks one call allocated and still holds when it returns.
+
+    Counted from a tracemalloc snapshot diff around the call, with the result
+    kept alive. Temporaries freed before the call returns are not included.
+    """
+    # Allocations of tracemalloc itself (e.g. the first snapshot) are not the call's
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        result = func(text, emotion)
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        tracemalloc.stop()
+    del result
+    return sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+
+
+def check_equivalence(samples, rng):
+    """Compare both implementations on random and edge-case inputs."""
+    alphabet = 'aAbegiknorstuyl .,!?\n\t İſKΣ'
+    cases = ['', ' ', '.', '...', 'Hi', 'thanks!!  ', 'Thank you.\n', 'a lot of kind of ends',
+             'GREAT. good. Good. LIKE.', 'x' * 150 + '. ' + 'y ' * 80]
+    cases += [make(rng.randint(1, 400), rng) for make in CORPORA.values() for _ in range(samples // len(CORPORA))]
+    cases += [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 60))) for _ in range(samples)]
+
+    for text in cases:
+        for emotion in EMOTIONS + ['unknown']:
+            expected = legacy_enhance_text(text, emotion)
+            actual = enhance_text(text, emotion)
+            if expected != actual:
+                raise AssertionError(f'Mismatch for {text!r} ({emotion}): {expected!r} != {actual!r}')
+    return len(cases)
+
+
+def compare(results, previous_path):
+    """Print the change in ns/char and allocation count against the results of an earlier run."""
+    with open(previous_path) as f:
+        previous = {(r['corpus'], r['size'], r['emotion']): r for r in json.load(f)['results']}
+
+    print()
+    print(f"Compared with {previous_path}:")
+    print(f"{'corpus':<12} {'size':>8}  {'emotion':<13} {'before ns':>10} {'after ns':>10} {'change':>8} "
+          f"{'before allocs':>13} {'after allocs':>12}")
+    for result in results:
+        before = previous.get((result['corpus'], result['size'], result['emotion']))
+        if before is None:
+            continue
+        change = result['ns_per_char'] / before['ns_per_char'] - 1.0
+        # Results saved before allocation counts were recorded have none
+        before_allocations = before.get('allocations')
+        print(f"{result['corpus']:<12} {result['size']:>8}  {result['emotion']:<13} "
+              f"{before['ns_per_char']:>10.1f} {result['ns_per_char']:>10.1f} {change:>+8.1%} "
+              f"{'-' if before_allocations is None else before_allocations:>13} {result['allocations']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Text sizes in characters')
+    parser.add_argument('--corpora', nargs='+', choices=list(CORPORA), default=list(CORPORA))
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+    parser.add_argument('--no-legacy', action='store_true', help='Skip timing the original implementation')
+    parser.add_argument('--check-samples', type=int, default=500, help='Random inputs for the equivalence check')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--json', metavar='PATH', help='Write the results to a JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='Compare with the JSON results of an earlier run')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    checked = check_equivalence(args.check_samples, rng)
+    print(f"Equivalence check passed on {checked} inputs x {len(EMOTIONS) + 1} emotions")
+    print()
+    print(f"{'corpus':<12} {'size':>8}  {'emotion':<13} {'engine us':>11} {'ns/char':>9} "
+          f"{'peak KB':>9} {'peak/in':>8} {'allocs':>7} {'legacy us':>11} {'speedup':>8}")
+
+    results = []
+    for corpus in args.corpora:
+        for size in args.sizes:
+            # Same text for every run with the same seed
+            text = CORPORA[corpus](size, random.Random(f'{args.seed}-{corpus}-{size}'))
+            input_bytes = len(text.encode('utf-8'))
+            for emotion in EMOTIONS:
+                engine = time_call(enhance_text, text, emotion, args.repeat)
+                peak = peak_memory(enhance_text, text, emotion)
+                allocations = allocation_count(enhance_text, text, emotion)
+                legacy = None if args.no_legacy else time_call(legacy_enhance_text, text, emotion, args.repeat)
+
+                result = {
+                    'corpus': corpus,
+                    'size': len(text),
+                    'bytes': input_bytes,
+                    'emotion': emotion,
+                    'seconds': engine,
+                    'ns_per_char': engine * 1e9 / max(1, len(text)),
+                    'peak_bytes': peak,
+                    'peak_per_input_byte': peak / max(1, input_bytes),
+                    'allocations': allocations,
+                    'legacy_seconds': legacy,
+                }
+                results.append(result)
+
+                legacy_columns = (f"{legacy * 1e6:>11.1f} {legacy / engine:>7.2f}x" if legacy is not None
+                                  else f"{'-':>11} {'-':>8}")
+                print(f"{corpus:<12} {len(text):>8}  {emotion:<13} {engine * 1e6:>11.1f} "
+                      f"{result['ns_per_char']:>9.1f} {peak / 1024:>9.1f} {result['peak_per_input_byte']:>7.1f}x {allocations:>7} "
+                      f"{legacy_columns}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=2)
+        print()
+        print(f"Results written to {args.json}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
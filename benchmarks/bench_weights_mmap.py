@@ -0,0 +1,161 @@
+"""
+Per-worker memory with private and memory-mapped model weights.
+Starts several worker processes that each load the same model independently,
+as gunicorn workers or inference processes without preloading do, and run
+one forward pass. In "private" mode every worker reads the checkpoint into
+its own memory, as Coqui does. In "mmap" mode the checkpoint is loaded
+memory-mapped from a converted file (weights_mmap.py, TTS_WEIGHTS_MMAP=1);
+the first worker converts it. For every worker it reports the resident
+memory (RSS), the proportional share (PSS, shared pages divided among the
+processes mapping them), the private memory and the peak RSS while loading,
+and the sum of PSS over all workers, which is what the host actually spends.
+
+RSS counts mapped pages in full in every process, so it barely changes; PSS
+and private memory show the pages that are shared.
+
+By default the model is a synthetic stack of linear layers of --size-mb;
+--model loads a Coqui model through coqui_tts_fallback instead.
+
+Usage:
+    python benchmarks/bench_weights_mmap.py --workers 4 --size-mb 400
+    python benchmarks/bench_weights_mmap.py --workers 2 --model tts_models/en/ljspeech/tacotron2-DDC
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ['private', 'mmap']
+LAYER_WIDTH = 1024
+
+
+def make_model(size_mb):
+    """Return a float32 model of about size_mb made of square linear layers."""
+    import torch
+    layers = max(1, size_mb * 2 ** 20 // (LAYER_WIDTH * LAYER_WIDTH * 4))
+    return torch.nn.Sequential(*(torch.nn.Linear(LAYER_WIDTH, LAYER_WIDTH) for _ in range(layers)))
+
+
+def worker(args):
+    """Load the model, run it once, report ready and wait to be measured."""
+    if args.model:
+        os.environ['TTS_BACKEND'] = 'coqui'
+        os.environ['TTS_WEIGHTS_MMAP'] = '1' if args.mode == 'mmap' else '0'
+        import coqui_tts_fallback as tts
+        synthesizer = tts.load_tts_model(args.model, args.vocoder)
+        if synthesizer is None:
+            sys.exit(1)
+        synthesizer.tts('Hello, this is a memory test.')
+    else:
+        import torch
+        import weights_mmap
+        torch.set_num_threads(1)
+
+        def build():
+            model = make_model(args.size_mb)
+            # Read the whole checkpoint, as Coqui's load_checkpoint does
+            model.load_state_dict(torch.load(args.checkpoint, map_location='cpu', weights_only=True))
+            return model
+
+        if args.mode == 'mmap':
+            with weights_mmap.mapped_checkpoints([args.checkpoint], args.mmap_dir):
+                model = build()
+        else:
+            model = build()
+        weights_mmap.release_freed_memory()
+        with torch.no_grad():
+            model(torch.ones(1, LAYER_WIDTH))
+
+    print('ready', flush=True)
+    sys.stdin.read()
+
+
+def memory(pid):
+    """Return (rss, pss, private, peak rss) of a process in bytes from /proc/<pid>/smaps_rollup and status."""
+    values = {}
+    for name in ('smaps_rollup', 'status'):
+        with open(f'/proc/{pid}/{name}') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    values[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty'], values['VmHWM']
+
+
+def run_mode(args, mode, checkpoint, mmap_dir):
+    """Start the workers one after another, measure them together and stop them."""
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--mode', mode,
+               '--checkpoint', checkpoint, '--mmap-dir', mmap_dir, '--size-mb', str(args.size_mb)]
+    if args.model:
+        command += ['--model', args.model] + (['--vocoder', args.vocoder] if args.vocoder else [])
+
+    processes = []
+    try:
+        start = time.perf_counter()
+        for _ in range(args.workers):
+            process = subprocess.Popen(command, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            processes.append(process)
+            # The first mmap worker converts the weights; later ones find the file
+            if process.stdout.readline().strip() != 'ready':
+                raise RuntimeError(f'{mode} worker failed to load the model')
+        load_seconds = time.perf_counter() - start
+        return [memory(process.pid) for process in processes], load_seconds
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes loading the model')
+    parser.add_argument('--size-mb', type=int, default=400, help='Size of the synthetic model')
+    parser.add_argument('--model', help='Coqui model to load instead of the synthetic one')
+    parser.add_argument('--vocoder', help='Coqui vocoder of --model')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--checkpoint', help=argparse.SUPPRESS)
+    parser.add_argument('--mmap-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='tts_weights_mmap_')
+    checkpoint = os.path.join(work_dir, 'model.pth')
+    mmap_dir = os.path.join(work_dir, 'mmap')
+    if args.model:
+        print(f"Model: {args.model} {args.vocoder or ''}, {args.workers} workers")
+    else:
+        import torch
+        torch.save(make_model(args.size_mb).state_dict(), checkpoint)
+        print(f"Synthetic model: {os.path.getsize(checkpoint) / 2 ** 20:.0f} MB, {args.workers} workers")
+
+    # Keep the conversions of a real model out of its download directory
+    os.environ.setdefault('TTS_WEIGHTS_MMAP_DIR', mmap_dir)
+
+    print(f"{'mode':<8} {'load s':>7} {'RSS MB':>8} {'PSS MB':>8} {'private MB':>10} {'peak MB':>8} "
+          f"{'first peak MB':>13} {'total PSS MB':>12}")
+    try:
+        for mode in args.modes:
+            results, load_seconds = run_mode(args, mode, checkpoint, mmap_dir)
+            count = len(results)
+            rss, pss, private, peak = (sum(values) / count / 2 ** 20 for values in zip(*results))
+            # The first mmap worker also converts the checkpoint
+            print(f"{mode:<8} {load_seconds:>7.1f} {rss:>8.0f} {pss:>8.0f} {private:>10.0f} {peak:>8.0f} "
+                  f"{results[0][3] / 2 ** 20:>13.0f} {sum(result[1] for result in results) / 2 ** 20:>12.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
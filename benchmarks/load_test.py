@@ -0,0 +1,206 @@
+"""
+End-to-end load test of the servers under gunicorn against a local mock upstream.
+Starts the mock gTTS upstream (with latency, jitter and errors), then for
+every combination of app, worker count and worker class starts gunicorn,
+drives a mixed workload of text lengths, languages and emotions from
+concurrent clients for a fixed time, and reports requests per second,
+p50/p95/p99 latency and the error rate. No request leaves the machine.
+
+Apps:
+    app      gunicorn app:app (the Render deployment, gTTS backend)
+    vercel   api/index.py (the Vercel function, run under gunicorn here)
+
+Usage:
+    python benchmarks/load_test.py --apps app vercel --workers 1 2 4 --worker-classes sync gthread \\
+        --clients 16 --duration 20 --latency 0.2 --jitter 0.05 --error-rate 0.01
+"""
+
+import os
+import sys
+import time
+import random
+import itertools
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gtts_upstream import start_mock_upstream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# gunicorn arguments that load each app
+APPS = {
+    'app': ['app:app'],
+    'vercel': ['--pythonpath', 'api', 'index:app'],
+}
+
+SENTENCES = [
+    "Tell me about yourself.",
+    "What is your greatest strength, and how have you used it at work?",
+    "Describe a situation where you had to meet a tight deadline. What did you do, and what was the result?",
+    "Why do you want to work here? What do you know about our products and the team you would join?",
+]
+
+# (name, number of sentences, share of requests)
+TEXT_LENGTHS = [('short', 1, 0.5), ('medium', 4, 0.35), ('long', 16, 0.15)]
+LANGUAGES = ['en', 'en', 'en', 'es', 'fr', 'de']
+EMOTIONS = ['neutral', 'friendly', 'professional', 'enthusiastic']
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_request(rng, repeat_ratio, counter):
+    """Return (length name, JSON body) of one request of the mixed workload."""
+    length_name, sentences, _ = rng.choices(TEXT_LENGTHS, weights=[share for _, _, share in TEXT_LENGTHS])[0]
+    chosen = [rng.choice(SENTENCES) for _ in range(sentences)]
+    if rng.random() >= repeat_ratio:
+        # Unique sentences, so neither the text nor its sentences are in the audio cache
+        number = next(counter)
+        chosen = [f"Question {number}-{index}: {sentence}" for index, sentence in enumerate(chosen)]
+    text = ' '.join(chosen)
+    return length_name, {'text': text, 'language': rng.choice(LANGUAGES), 'emotion': rng.choice(EMOTIONS)}
+
+
+def start_gunicorn(app, workers, worker_class, threads, port, env):
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+               '--worker-class', worker_class, '--threads', str(threads), '--timeout', '120',
+               '--log-level', 'warning'] + APPS[app]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/cache-stats', timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become ready within 60 seconds')
+
+
+def run_load(url, clients, duration, repeat_ratio, seed):
+    """
+    Send requests from concurrent clients for duration seconds.
+
+    Returns:
+        list: (length name, seconds, ok) for every request.
+    """
+    results = []
+    results_lock = threading.Lock()
+    # Numbers unique texts; next() on a count is atomic in CPython
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        local = []
+        while time.perf_counter() < deadline:
+            length_name, body = make_request(rng, repeat_ratio, counter)
+            start = time.perf_counter()
+            try:
+                response = session.post(url, json=body, timeout=120)
+                ok = response.status_code == 200 and len(response.content) > 0
+            except requests.RequestException:
+                ok = False
+            local.append((length_name, time.perf_counter() - start, ok))
+        with results_lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def report(label, results, duration, upstream_requests, upstream_errors):
+    latencies = sorted(seconds for _, seconds, ok in results if ok)
+    errors = sum(1 for _, _, ok in results if not ok)
+    total = len(results)
+    print(f"{label:<28} {total:>7} {len(latencies) / duration:>8.1f} "
+          f"{percentile(latencies, 0.50) * 1000:>8.0f} {percentile(latencies, 0.95) * 1000:>8.0f} "
+          f"{percentile(latencies, 0.99) * 1000:>8.0f} {errors / total if total else 0.0:>7.1%} "
+          f"{upstream_requests:>9} {upstream_errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', nargs='+', choices=sorted(APPS), default=['app', 'vercel'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--worker-classes', nargs='+', default=['sync', 'gthread'],
+                        help='gunicorn worker classes (gevent and eventlet need their packages)')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of load per configuration')
+    parser.add_argument('--repeat-ratio', type=float, default=0.2,
+                        help='Share of requests that repeat a text seen before (cacheable)')
+    parser.add_argument('--latency', type=float, default=0.2, help='Mock upstream latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Mock upstream latency variation in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of failing upstream requests')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    server, upstream_url = start_mock_upstream(latency=args.latency, jitter=args.jitter,
+                                               error_rate=args.error_rate)
+
+    print(f"Mock upstream latency: {args.latency * 1000:.0f} ms +/- {args.jitter * 1000:.0f} ms, "
+          f"error rate: {args.error_rate:.1%}, clients: {args.clients}, {args.duration:.0f} s per run")
+    print(f"{'app/workers/class':<28} {'requests':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'errors':>7} {'upstream':>9} {'failed':>7}")
+
+    for app in args.apps:
+        for workers in args.workers:
+            for worker_class in args.worker_classes:
+                # Fresh caches and state for every run, gTTS only
+                state_dir = tempfile.mkdtemp(prefix='tts_load_')
+                env = dict(os.environ, TTS_GTTS_UPSTREAM=upstream_url, TTS_BACKEND='gtts',
+                           TTS_CACHE_DIR=os.path.join(state_dir, 'cache'),
+                           TTS_JOBS_DIR=os.path.join(state_dir, 'jobs'),
+                           TTS_METRICS_DIR=os.path.join(state_dir, 'metrics'),
+                           TTS_RATE_LIMIT_PER_MINUTE='0')
+                port = free_port()
+                process = start_gunicorn(app, workers, worker_class, args.threads, port, env)
+                try:
+                    requests_before, errors_before = server.requests, server.errors
+                    results = run_load(f'http://127.0.0.1:{port}/api/stream-speech', args.clients,
+                                       args.duration, args.repeat_ratio, args.seed)
+                    report(f'{app}/{workers}/{worker_class}', results, args.duration,
+                           server.requests - requests_before, server.errors - errors_before)
+                finally:
+                    process.terminate()
+                    process.wait()
+
+                by_length = {}
+                for length_name, seconds, ok in results:
+                    if ok:
+                        by_length.setdefault(length_name, []).append(seconds)
+                print('    ' + ', '.join(
+                    f"{length_name} p50 {percentile(sorted(by_length.get(length_name, [])), 0.5) * 1000:.0f} ms"
+                    for length_name, _, _ in TEXT_LENGTHS))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Local mock of the Google Translate TTS endpoint used by gTTS.
+It answers batchexecute requests with a fake audio payload in the same
+response format as the real upstream, after a configurable delay with
+optional random jitter. A configurable share of requests fails with a 500 or
+a response without audio, like the real upstream under throttling.
+
+Point the servers at it with:
+    TTS_GTTS_UPSTREAM=http://127.0.0.1:8765/_/TranslateWebserverUi/data/batchexecute
+
+Usage:
+    python benchmarks/mock_gtts_upstream.py --port 8765 --latency 0.2 --jitter 0.05 --error-rate 0.01
+"""
+
+import json
+import time
+import random
+import base64
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPSTREAM_PATH = '/_/TranslateWebserverUi/data/batchexecute'
+
+
+def fake_audio(text, bytes_per_char):
+    """Return deterministic fake MP3 bytes for a text part (starts with the text for ordering checks)."""
+    marker = f'[{text}]'.encode('utf-8')
+    return marker + b'\x00' * max(0, len(text) * bytes_per_char - len(marker))
+
+
+class MockUpstreamHandler(BaseHTTPRequestHandler):
+    """Request handler; configuration lives on the server object."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; avoid Nagle/delayed-ACK stalls on keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+
+        try:
+            rpc = json.loads(parse_qs(body)['f.req'][0])
+            text = json.loads(rpc[0][0][1])[0]
+        except (KeyError, IndexError, ValueError):
+            self._reply(400, b'bad request')
+            return
+
+        with self.server.stats_lock:
+            self.server.active += 1
+            self.server.peak_active = max(self.server.peak_active, self.server.active)
+        try:
+            time.sleep(max(0.0, self.server.latency + random.uniform(-self.server.jitter, self.server.jitter)))
+        finally:
+            with self.server.stats_lock:
+                self.server.active -= 1
+
+        if random.random() < self.server.error_rate:
+            with self.server.stats_lock:
+                self.server.errors += 1
+            if random.random() < 0.5:
+                self._reply(500, b'upstream error')
+            else:
+                # Successful response without an audio stream
+                self._reply(200, b')]}\'\n\n[["wrb.fr","jQ1olc",null,null,null,null,"generic"]]\n')
+            return
+
+        audio = base64.b64encode(fake_audio(text, self.server.bytes_per_char)).decode('ascii')
+        payload = (
+            ")]}'\n\n"
+            + '[["wrb.fr","jQ1olc","[\\"' + audio + '\\"]",null,null,null,"generic"]]\n'
+        ).encode('utf-8')
+        self._reply(200, payload)
+
+    def _reply(self, status, payload):
+        with self.server.stats_lock:
+            self.server.requests += 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+
+class MockUpstreamServer(ThreadingHTTPServer):
+    """Threaded server with a listen backlog large enough for load tests."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_mock_upstream(host='127.0.0.1', port=0, latency=0.1, bytes_per_char=250, jitter=0.0, error_rate=0.0):
+    """
+    Start the mock upstream in a background thread.
+
+    Args:
+        latency (float): Mean seconds before each response.
+        jitter (float): Latency varies uniformly by up to this many seconds either way.
+        error_rate (float): Share of requests that fail (0 to 1).
+
+    Returns:
+        tuple: (server, url) where url is the value for TTS_GTTS_UPSTREAM.
+    """
+    server = MockUpstreamServer((host, port), MockUpstreamHandler)
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.bytes_per_char = bytes_per_char
+    server.requests = 0
+    server.errors = 0
+    # Requests being answered right now, and the most at any one time
+    server.active = 0
+    server.peak_active = 0
+    server.stats_lock = threading.Lock()
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    url = f'http://{server.server_address[0]}:{server.server_address[1]}{UPSTREAM_PATH}'
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random latency variation in seconds (either way)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests that fail (0 to 1)')
+    parser.add_argument('--bytes-per-char', type=int, default=250, help='Size of the fake audio per character')
+    args = parser.parse_args()
+
+    server, url = start_mock_upstream(args.host, args.port, args.latency, args.bytes_per_char,
+                                      args.jitter, args.error_rate)
+    print(f"Mock gTTS upstream listening at {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
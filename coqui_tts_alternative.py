@@ -5,7 +5,6 @@ This script demonstrates how to use Coqui TTS with pre-trained models.
 
 import os
 import sys
-import io
 import torch
 import numpy as np
 from flask import Flask, request, jsonify, Response
@@ -13,7 +12,9 @@ from flask_cors import CORS
 import webbrowser
 import threading
 import time
-import re
+from text_enhancement import add_natural_pauses, apply_emotion
+from wav_writer import iter_wav
+import server_timing
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -65,110 +66,6 @@ def load_tts_model(model_name="tts_models/en/ljspeech/tacotron2-DDC", vocoder_na
 # Global synthesizer instance
 synthesizer = None
 
-def add_natural_pauses(text):
-    """
-    Enhance text with natural pauses to make speech sound more human-like.
-    """
-    # Add slight pauses after punctuation
-    text = re.sub(r'([.!?])', r'\1 ', text)
-    
-    # Add commas for natural phrasing if there aren't enough already
-    if text.count(',') < len(text) / 50:  # Roughly one comma per 50 chars
-        # Add commas before conjunctions if not already present
-        text = re.sub(r'([^\s,])(\s+)(and|but|or|because|however|therefore)(\s+)', r'\1,\2\3\4', text)
-    
-    # Add pauses for long sentences
-    sentences = re.split(r'([.!?])', text)
-    enhanced_sentences = []
-    
-    for i in range(0, len(sentences), 2):
-        if i+1 < len(sentences):
-            sentence = sentences[i] + sentences[i+1]
-            # If sentence is long, add a pause in the middle
-            if len(sentence) > 100:
-                words = sentence.split()
-                mid = len(words) // 2
-                first_half = ' '.join(words[:mid])
-                second_half = ' '.join(words[mid:])
-                enhanced_sentences.append(f"{first_half}, {second_half}")
-            else:
-                enhanced_sentences.append(sentence)
-        elif sentences[i].strip():
-            enhanced_sentences.append(sentences[i])
-    
-    return ' '.join(enhanced_sentences)
-
-def apply_emotion(text, emotion):
-    """
-    Modify text to convey different emotions through speech patterns.
-    """
-    if emotion == 'neutral':
-        return text
-        
-    elif emotion == 'friendly':
-        # Add friendly phrases and more casual tone
-        greetings = ["Hi there! ", "Hello! ", "Great to meet you! "]
-        endings = [" That's all for now!", " Thanks for listening!", " Hope that helps!"]
-        
-        # Add a greeting if the text doesn't already have one
-        if not re.match(r'^(hi|hello|hey|greetings)', text.lower()):
-            text = greetings[len(text) % len(greetings)] + text
-            
-        # Add an ending if the text doesn't already have one
-        if not re.search(r'(thanks|thank you|cheers|goodbye|bye)[\s.!?]*$', text.lower()):
-            text = text + endings[len(text) % len(endings)]
-            
-        # Add emphasis on positive words
-        text = re.sub(r'\b(great|good|excellent|amazing|wonderful|fantastic)\b', r'really \1', text, flags=re.IGNORECASE)
-        
-        return text
-        
-    elif emotion == 'professional':
-        # Make language more formal and structured
-        # Replace casual phrases with more formal ones
-        replacements = [
-            (r'\bkind of\b', 'somewhat'),
-            (r'\ba lot\b', 'significantly'),
-            (r'\bget\b', 'obtain'),
-            (r'\buse\b', 'utilize'),
-            (r'\bstart\b', 'commence'),
-            (r'\bend\b', 'conclude'),
-            (r'\bfind out\b', 'determine'),
-            (r'\blook at\b', 'examine'),
-            (r'\btalk about\b', 'discuss')
-        ]
-        
-        for pattern, replacement in replacements:
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-            
-        return text
-        
-    elif emotion == 'enthusiastic':
-        # Add emphasis and excitement
-        # Add exclamation points to sentences that don't have them
-        text = re.sub(r'([.]) ', r'! ', text)
-        
-        # Add emphasis words
-        emphasis = [
-            (r'\b(good|great)\b', r'fantastic'),
-            (r'\b(like|enjoy)\b', r'love'),
-            (r'\b(interesting)\b', r'fascinating'),
-            (r'\b(important)\b', r'crucial')
-        ]
-        
-        for pattern, replacement in emphasis:
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-            
-        # Add enthusiastic interjections
-        if len(text) > 100 and '!' not in text[:50]:
-            interjections = ["Wow! ", "Amazing! ", "Incredible! ", "Excellent! "]
-            text = interjections[len(text) % len(interjections)] + text
-            
-        return text
-        
-    # Default case
-    return text
-
 @app.route('/')
 def index():
     """Return API information."""
@@ -197,6 +94,7 @@ def list_models():
 def stream_speech():
     """Generate speech from text using Coqui TTS and stream it directly."""
     global synthesizer
+    server_timing.start()
     
     data = request.json
     
@@ -209,28 +107,25 @@ def stream_speech():
     emotion = data.get('emotion', 'neutral')
     
     try:
-        # Load model if not loaded or if a different model is requested
+        # Load model if not loaded or if a different model is requested (part of the first request's synthesis)
         if synthesizer is None:
-            synthesizer = load_tts_model(model_name, vocoder_name)
+            with server_timing.stage('synth'):
+                synthesizer = load_tts_model(model_name, vocoder_name)
             if synthesizer is None:
                 return jsonify({'error': 'Failed to load TTS model'}), 500
         
         # Add natural pauses with punctuation and apply emotion
-        enhanced_text = add_natural_pauses(text)
-        enhanced_text = apply_emotion(enhanced_text, emotion)
+        with server_timing.stage('enhance'):
+            enhanced_text = add_natural_pauses(text)
+            enhanced_text = apply_emotion(enhanced_text, emotion)
         
         # Generate speech
-        wav = synthesizer.tts(enhanced_text)
-        
-        # Convert to WAV format
-        import scipy.io.wavfile as wav_io
-        wav_buffer = io.BytesIO()
-        wav_io.write(wav_buffer, synthesizer.output_sample_rate, wav)
-        wav_buffer.seek(0)
+        with server_timing.stage('synth'):
+            wav = synthesizer.tts(enhanced_text)
         
-        # Stream the audio data
-        return Response(
-            wav_buffer, 
+        # Stream the audio as 16-bit PCM WAV in fixed-size chunks (encoded while sending, so not timed)
+        return server_timing.add_header(Response(
+            iter_wav(wav, synthesizer.output_sample_rate), 
             mimetype='audio/wav',
             headers={
                 'Content-Disposition': 'inline',
@@ -238,7 +133,7 @@ def stream_speech():
                 'Pragma': 'no-cache',
                 'Expires': '0'
             }
-        )
+        ))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -4,146 +4,505 @@ This script demonstrates how to use gTTS as a fallback when Coqui TTS is not ava
 """
 
 import os
-import sys
-import io
 import re
-from flask import Flask, request, jsonify, Response
+import sys
+import gc
+import itertools
+import contextlib
+import importlib.util
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import webbrowser
 import threading
 import time
-from gtts import gTTS
+from audio_cache import AudioCache, make_cache_key
+from gtts_backend import synthesize_mp3, connection_stats
+from audio_segments import synthesize_segments, stream_segments, stream_wav, join_mp3, join_wav
+from text_enhancement import add_natural_pauses, apply_emotion
+from model_registry import ModelRegistry
+from batching import BatchScheduler
+from audio_encoding import choose_format, encode_audio, mimetype_for
+from http_audio import request_params, not_modified, audio_response
+from singleflight import SingleFlight
+from jobs import JobQueue, JobQueueFull
+from batch_speech import parse_batch_request, batch_response, item_count
+from metrics import Registry
+import server_timing
+from admission import AdmissionController, Overloaded
+from rate_limit import TokenBucketLimiter
+from inference_server import InferenceClient
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Check if we're in the virtual environment
-try:
-    import TTS
-    import torch
+# Cache of synthesized audio shared by all requests in this process
+audio_cache = AudioCache.from_env()
+
+# Concurrent identical syntheses share one execution (TTS_SINGLEFLIGHT_DIR extends this across workers)
+single_flight = SingleFlight.from_env()
+
+# Bounded synthesis concurrency; overflow requests are refused with Retry-After (TTS_MAX_SYNTHESES)
+admission = AdmissionController.from_env()
+
+# Per-client token buckets shared by all workers (TTS_RATE_LIMIT_PER_MINUTE / TTS_RATE_LIMIT_BURST)
+rate_limiter = TokenBucketLimiter.from_env()
+
+# Prometheus metrics, summed over all workers sharing TTS_METRICS_DIR
+metrics_registry = Registry.from_env()
+request_seconds = metrics_registry.histogram(
+    'tts_request_duration_seconds', 'Time from receiving a speech request until its audio was sent.',
+    ('backend', 'language', 'emotion'))
+stage_seconds = metrics_registry.histogram(
+    'tts_stage_duration_seconds', 'Time spent in text enhancement, synthesis (per sentence) and encoding.',
+    ('stage', 'backend', 'language', 'emotion'))
+requests_in_flight = metrics_registry.gauge(
+    'tts_requests_in_flight', 'Requests currently being handled.', ('endpoint',))
+upstream_errors = metrics_registry.counter(
+    'tts_upstream_errors_total', 'Failed gTTS requests and Coqui inferences.', ('backend', 'kind'))
+response_bytes = metrics_registry.counter(
+    'tts_response_bytes_total', 'Audio bytes sent to clients.', ('backend',))
+cache_hits = metrics_registry.counter(
+    'tts_audio_cache_hits_total', 'Audio cache lookups that found the audio.', ('tier',))
+cache_misses = metrics_registry.counter(
+    'tts_audio_cache_misses_total', 'Audio cache lookups that did not find the audio.')
+admission_waiting = metrics_registry.gauge(
+    'tts_admission_queue_depth', 'Requests waiting for a synthesis slot.')
+admission_running = metrics_registry.gauge(
+    'tts_admission_running', 'Syntheses currently running.')
+admission_rejections = metrics_registry.counter(
+    'tts_admission_rejections_total', 'Requests refused because the server was busy.', ('reason',))
+rate_limit_decisions = metrics_registry.counter(
+    'tts_rate_limit_requests_total', 'Rate-limited requests by outcome.', ('result',))
+metrics_registry.add_ratio('tts_audio_cache_hit_ratio', 'Share of audio cache lookups that were hits.',
+                           'tts_audio_cache_hits_total', 'tts_audio_cache_misses_total')
+
+def collect_counters():
+    """Mirror the counters kept by the audio cache, the gTTS backend, admission control and the rate limiter."""
+    stats = audio_cache.stats()
+    cache_hits.set_total(stats['memory_hits'], tier='memory')
+    cache_hits.set_total(stats['disk_hits'], tier='disk')
+    cache_misses.set_total(stats['misses'])
+    for kind, count in connection_stats()['errors'].items():
+        upstream_errors.set_total(count, backend='gtts', kind=kind)
+    stats = admission.stats()
+    admission_waiting.set(stats['queue_depth'])
+    admission_running.set(stats['running'])
+    admission_rejections.set_total(stats['rejected_queue_full'], reason='queue_full')
+    admission_rejections.set_total(stats['rejected_timeout'], reason='timeout')
+    stats = rate_limiter.stats()
+    rate_limit_decisions.set_total(stats['allowed'], result='allowed')
+    rate_limit_decisions.set_total(stats['limited'], result='limited')
+
+metrics_registry.add_collector(collect_counters)
+
+# Label values are taken from requests, so anything unexpected is reported as "other"
+METRIC_EMOTIONS = ('neutral', 'friendly', 'professional', 'enthusiastic')
+METRIC_LANGUAGE_RE = re.compile(r'^[a-z]{2,3}(-[A-Za-z]{2,4})?$')
+
+def metric_labels(params, backend):
+    """Return the backend, language and emotion labels of a request."""
+    language = params.get('language', 'en')
+    emotion = params.get('emotion', 'neutral')
+    return {
+        'backend': backend,
+        'language': language if isinstance(language, str) and METRIC_LANGUAGE_RE.match(language) else 'other',
+        'emotion': emotion if emotion in METRIC_EMOTIONS else 'other',
+    }
+
+# Server-Timing names of the metric stages
+SERVER_TIMING_STAGES = {'enhance': 'enhance', 'synthesize': 'synth', 'encode': 'encode'}
+
+@contextlib.contextmanager
+def timed_stage(stage, labels):
+    """Time a stage for the stage histogram and the request's Server-Timing header."""
+    with stage_seconds.time(stage=stage, **labels), server_timing.stage(SERVER_TIMING_STAGES[stage]):
+        yield
+
+def timed_synthesis(synthesize, labels):
+    """Wrap a per-sentence synthesize function so that every call is timed as the "synthesize" stage."""
+    def wrapper(segment):
+        with timed_stage('synthesize', labels):
+            return synthesize(segment)
+    return wrapper
+
+def acquire_synthesis_slot():
+    """Take a synthesis slot, timed as the "queue" stage (raises Overloaded)."""
+    with server_timing.stage('queue'):
+        return admission.acquire()
+
+def enhance_text(text, emotion, labels):
+    """Add natural pauses and apply the emotion, timed as the "enhance" stage."""
+    with timed_stage('enhance', labels):
+        enhanced_text = add_natural_pauses(text)
+        return apply_emotion(enhanced_text, emotion)
+
+# Backend selection (TTS_BACKEND): "auto" uses Coqui TTS when it is installed,
+# "coqui" requires it and imports it at startup, "gtts" never touches it
+TTS_BACKEND = os.environ.get('TTS_BACKEND', 'auto').lower()
+
+# Coqui inference can run in a separate pool of processes (see inference_server.py);
+# the HTTP workers then reach it over TTS_INFERENCE_SOCKET and never import torch
+inference_client = InferenceClient.from_env() if TTS_BACKEND != 'gtts' else None
+
+# torch and TTS take seconds to import, so in "auto" mode they are only looked
+# up here and imported on first use (see import_coqui)
+if TTS_BACKEND == 'gtts':
+    print("TTS_BACKEND=gtts. Using gTTS.")
+    USE_COQUI = False
+elif inference_client is not None:
+    print(f"Using the Coqui inference server at {inference_client.path}.")
+    USE_COQUI = False
+elif importlib.util.find_spec('TTS') is not None and importlib.util.find_spec('torch') is not None:
     print("TTS is installed. Using Coqui TTS.")
     USE_COQUI = True
-    # Import TTS modules
-    from TTS.utils.synthesizer import Synthesizer
-    from TTS.utils.manage import ModelManager
-except ImportError:
+else:
     print("TTS is not installed. Falling back to gTTS.")
     print("If you want to use Coqui TTS, please install it with 'pip install TTS'.")
     print("If you encounter build errors, you can try using a pre-built wheel or Docker.")
     USE_COQUI = False
 
 # Path to store models if using Coqui TTS
-if USE_COQUI:
-    MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_models")
-    os.makedirs(MODELS_DIR, exist_ok=True)
-    # Initialize model manager
-    model_manager = ModelManager(models_file=None)
-    # Global synthesizer instance
-    synthesizer = None
-
-def add_natural_pauses(text):
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_models")
+
+# Map model weights read-only from converted files shared by all processes (TTS_WEIGHTS_MMAP=1)
+WEIGHTS_MMAP = os.environ.get('TTS_WEIGHTS_MMAP', '0') == '1'
+
+# Set by import_coqui()
+torch = None
+Synthesizer = None
+model_manager = None
+_coqui_lock = threading.Lock()
+# torch threads of a forked worker (init_worker), applied when torch is imported
+_worker_torch_threads = None
+
+def import_coqui():
     """
-    Enhance text with natural pauses to make speech sound more human-like.
+    Import torch and Coqui TTS and create the model manager, once per process.
+
+    Returns:
+        bool: Whether Coqui TTS can be used. If the import fails the server
+        falls back to gTTS.
     """
-    # Add slight pauses after punctuation
-    text = re.sub(r'([.!?])', r'\1 ', text)
-
-    # Add commas for natural phrasing if there aren't enough already
-    if text.count(',') < len(text) / 50:  # Roughly one comma per 50 chars
-        # Add commas before conjunctions if not already present
-        text = re.sub(r'([^\s,])(\s+)(and|but|or|because|however|therefore)(\s+)', r'\1,\2\3\4', text)
-
-    # Add pauses for long sentences
-    sentences = re.split(r'([.!?])', text)
-    enhanced_sentences = []
-
-    for i in range(0, len(sentences), 2):
-        if i+1 < len(sentences):
-            sentence = sentences[i] + sentences[i+1]
-            # If sentence is long, add a pause in the middle
-            if len(sentence) > 100:
-                words = sentence.split()
-                mid = len(words) // 2
-                first_half = ' '.join(words[:mid])
-                second_half = ' '.join(words[mid:])
-                enhanced_sentences.append(f"{first_half}, {second_half}")
-            else:
-                enhanced_sentences.append(sentence)
-        elif sentences[i].strip():
-            enhanced_sentences.append(sentences[i])
+    global USE_COQUI, torch, Synthesizer, model_manager
+    if not USE_COQUI:
+        return False
+    if model_manager is not None:
+        return True
+
+    with _coqui_lock:
+        if model_manager is None and USE_COQUI:
+            try:
+                import torch as torch_module
+                from TTS.utils.synthesizer import Synthesizer as synthesizer_class
+                from TTS.utils.manage import ModelManager
+            except ImportError as e:
+                print(f"Failed to import Coqui TTS ({str(e)}). Falling back to gTTS.")
+                USE_COQUI = False
+                return False
+
+            torch = torch_module
+            Synthesizer = synthesizer_class
+            if _worker_torch_threads is not None:
+                # Set by init_worker before torch was imported
+                torch.set_num_threads(_worker_torch_threads)
+            os.makedirs(MODELS_DIR, exist_ok=True)
+            # Initialize model manager
+            model_manager = ModelManager(models_file=None)
+    return USE_COQUI
+
+def use_coqui():
+    """Whether speech is synthesized with Coqui TTS, in this process or on the inference server."""
+    return inference_client is not None or import_coqui()
+
+if TTS_BACKEND == 'coqui' and not use_coqui():
+    raise RuntimeError("TTS_BACKEND=coqui but Coqui TTS could not be imported")
+
+# Function to download and load a model
+def load_tts_model(model_name="tts_models/en/ljspeech/tacotron2-DDC", vocoder_name=None):
+    """
+    Download and load a TTS model and vocoder.
+    """
+    if not import_coqui():
+        return None
+
+    try:
+        # Get model info
+        model_path, config_path, model_item = model_manager.download_model(model_name)
+        vocoder_path, vocoder_config_path, _ = model_manager.download_model(vocoder_name) if vocoder_name else (None, None, None)
+
+        def create_synthesizer():
+            return Synthesizer(
+                tts_checkpoint=model_path,
+                tts_config_path=config_path,
+                vocoder_checkpoint=vocoder_path,
+                vocoder_config=vocoder_config_path,
+                use_cuda=torch.cuda.is_available()
+            )
+
+        # Models on a GPU keep their own memory, so there is nothing to share
+        if WEIGHTS_MMAP and not torch.cuda.is_available():
+            try:
+                from weights_mmap import mapped_checkpoints
+                with mapped_checkpoints([model_path, vocoder_path]) as mapped:
+                    synthesizer = create_synthesizer()
+                print(f"Mapped {mapped['bytes'] / 2 ** 20:.0f} MB of {model_name} weights from shared files")
+                return synthesizer
+            except Exception as e:
+                # Coqui's own loading still works
+                print(f"Could not map {model_name} weights, loading a private copy: {str(e)}")
+
+        # Initialize synthesizer
+        return create_synthesizer()
+    except Exception as e:
+        print(f"Error loading TTS model: {str(e)}")
+        return None
 
-    return ' '.join(enhanced_sentences)
+# Loaded synthesizers keyed by (model, vocoder), kept within TTS_MODEL_MEMORY_MB
+model_registry = ModelRegistry.from_env(load_tts_model)
 
-def apply_emotion(text, emotion):
+def synthesize_batch(synthesizer, texts):
     """
-    Modify text to convey different emotions through speech patterns.
+    Synthesize a batch of texts with the synthesizer they were submitted for.
+
+    Runs on the scheduler's inference thread, holding the synthesizer's
+    inference lock. The sentences of all texts share one vocoder pass when
+    the model allows it (see vocoder_batch.py).
+    """
+    from vocoder_batch import synthesize_texts
+    with model_registry.inference_lock(synthesizer), torch.no_grad():
+        return synthesize_texts(synthesizer, texts)
+
+# All Coqui inference of a process runs on one thread, in batches of the
+# requests that queued up meanwhile (TTS_BATCH_MAX_SIZE / TTS_BATCH_WAIT_MS)
+inference_batcher = BatchScheduler.from_env(synthesize_batch)
+
+# Opt-in boot-time preload (TTS_PRELOAD=1), models given as "model[|vocoder]" separated by commas
+DEFAULT_MODEL = "tts_models/en/ljspeech/tacotron2-DDC"
+PRELOAD = os.environ.get('TTS_PRELOAD', '0') == '1'
+PRELOAD_MODELS = [
+    tuple(entry.split('|', 1)) if '|' in entry else (entry, None)
+    for entry in (item.strip() for item in os.environ.get('TTS_PRELOAD_MODELS', DEFAULT_MODEL).split(','))
+    if entry
+]
+WARMUP_TEXT = "Hello, this is a warm up."
+
+# Set once preloading and warmup have finished (immediately when preload is off)
+models_ready = threading.Event()
+preload_state = {'preloaded': [], 'failed': [], 'warmup_seconds': 0.0}
+
+def preload_models(models=None):
+    """
+    Load and warm up models before the server takes traffic.
+
+    Run in the gunicorn master with preload_app, the loaded weights are shared
+    copy-on-write by all forked workers instead of being loaded once per worker.
+
+    Args:
+        models (list): (model_name, vocoder_name) pairs, defaults to TTS_PRELOAD_MODELS.
     """
-    if emotion == 'neutral':
-        return text
-
-    elif emotion == 'friendly':
-        # Add friendly phrases and more casual tone
-        greetings = ["Hi there! ", "Hello! ", "Great to meet you! "]
-        endings = [" That's all for now!", " Thanks for listening!", " Hope that helps!"]
-
-        # Add a greeting if the text doesn't already have one
-        if not re.match(r'^(hi|hello|hey|greetings)', text.lower()):
-            text = greetings[len(text) % len(greetings)] + text
-
-        # Add an ending if the text doesn't already have one
-        if not re.search(r'(thanks|thank you|cheers|goodbye|bye)[\s.!?]*$', text.lower()):
-            text = text + endings[len(text) % len(endings)]
-
-        # Add emphasis on positive words
-        text = re.sub(r'\b(great|good|excellent|amazing|wonderful|fantastic)\b', r'really \1', text, flags=re.IGNORECASE)
-
-        return text
-
-    elif emotion == 'professional':
-        # Make language more formal and structured
-        # Replace casual phrases with more formal ones
-        replacements = [
-            (r'\bkind of\b', 'somewhat'),
-            (r'\ba lot\b', 'significantly'),
-            (r'\bget\b', 'obtain'),
-            (r'\buse\b', 'utilize'),
-            (r'\bstart\b', 'commence'),
-            (r'\bend\b', 'conclude'),
-            (r'\bfind out\b', 'determine'),
-            (r'\blook at\b', 'examine'),
-            (r'\btalk about\b', 'discuss')
-        ]
-
-        for pattern, replacement in replacements:
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-
-        return text
-
-    elif emotion == 'enthusiastic':
-        # Add emphasis and excitement
-        # Add exclamation points to sentences that don't have them
-        text = re.sub(r'([.]) ', r'! ', text)
-
-        # Add emphasis words
-        emphasis = [
-            (r'\b(good|great)\b', r'fantastic'),
-            (r'\b(like|enjoy)\b', r'love'),
-            (r'\b(interesting)\b', r'fascinating'),
-            (r'\b(important)\b', r'crucial')
-        ]
-
-        for pattern, replacement in emphasis:
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-
-        # Add enthusiastic interjections
-        if len(text) > 100 and '!' not in text[:50]:
-            interjections = ["Wow! ", "Amazing! ", "Incredible! ", "Excellent! "]
-            text = interjections[len(text) % len(interjections)] + text
-
-        return text
-
-    # Default case
-    return text
+    global _worker_torch_threads
+    if not import_coqui():
+        models_ready.set()
+        return
+
+    started = time.time()
+    # Warm up single-threaded so no OpenMP thread pool exists when gunicorn forks
+    _worker_torch_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        for model_name, vocoder_name in models or PRELOAD_MODELS:
+            synthesizer = model_registry.get(model_name, vocoder_name)
+            if synthesizer is None:
+                preload_state['failed'].append({'model': model_name, 'vocoder': vocoder_name})
+                continue
+            # Dummy inference initializes lazily allocated buffers and kernels
+            with model_registry.inference_lock(synthesizer), torch.no_grad():
+                synthesizer.tts(WARMUP_TEXT)
+            preload_state['preloaded'].append({'model': model_name, 'vocoder': vocoder_name})
+    finally:
+        torch.set_num_threads(_worker_torch_threads)
+
+    # Move everything allocated so far out of the collector's reach, so garbage
+    # collection in the workers does not write to (and copy) the shared pages
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    preload_state['warmup_seconds'] = round(time.time() - started, 3)
+    models_ready.set()
+
+def init_worker(torch_threads=None):
+    """
+    Set up torch in a worker after fork (called from gunicorn's post_fork).
+
+    Args:
+        torch_threads (int): torch threads for this worker's inference, applied
+            now or when torch is imported. Defaults to the master's setting
+            from before warming up.
+    """
+    global _worker_torch_threads
+    if torch_threads:
+        _worker_torch_threads = torch_threads
+    if torch is not None and _worker_torch_threads is not None:
+        torch.set_num_threads(_worker_torch_threads)
+
+if PRELOAD:
+    # With gunicorn's preload_app this runs once in the master, before the
+    # listening socket is opened and before workers are forked
+    preload_models()
+else:
+    # Models are loaded lazily on first use, as before
+    models_ready.set()
+
+def synthesize_sentence(model_name, vocoder_name, segment, labels=None):
+    """
+    Synthesize one sentence with the models of this process as 16-bit PCM WAV.
+
+    Runs in the HTTP worker, or in an inference server process when the
+    workers use one (stages are then timed by the worker, not here).
+    """
+    # NumPy is only installed together with Coqui TTS
+    from wav_writer import encode_wav
+
+    def stage(name):
+        return timed_stage(name, labels) if labels is not None else contextlib.nullcontext()
+
+    # Get the requested model, loading it if it is not resident
+    synthesizer = model_registry.get(model_name, vocoder_name)
+    if synthesizer is None:
+        raise RuntimeError('Failed to load TTS model')
+
+    # Generate speech as part of the next inference batch
+    with stage('synthesize'):
+        wav = inference_batcher.submit(synthesizer, segment)
+
+    # Convert to 16-bit PCM WAV
+    with stage('encode'):
+        return encode_wav(wav, synthesizer.output_sample_rate)
+
+def synthesize_coqui(enhanced_text, language, model_name, vocoder_name, cache_key, stream=False, progress=None,
+                     labels=None):
+    """
+    Synthesize enhanced text with Coqui TTS as 16-bit PCM WAV.
+
+    Sentences are synthesized (or taken from the audio cache) one by one and
+    the joined WAV is stored under cache_key.
+
+    Args:
+        enhanced_text (str): The enhanced text.
+        language (str): The language code (part of the cache keys).
+        model_name (str): The Coqui model.
+        vocoder_name (str): The Coqui vocoder, if any.
+        cache_key (str): Cache key of the whole WAV.
+        stream (bool): Return an iterator of WAV chunks instead of bytes.
+        progress (callable): Called as progress(done, total) after each sentence.
+        labels (dict): Metric labels of the request (see metric_labels).
+
+    Returns:
+        bytes or iterator: The WAV audio.
+    """
+    labels = labels or metric_labels({'language': language}, 'coqui')
+
+    def synthesize_wav(segment):
+        try:
+            if inference_client is not None:
+                # The inference server returns the sentence as WAV; the round trip is the "synthesize" stage
+                with timed_stage('synthesize', labels):
+                    return inference_client.synthesize(model_name, vocoder_name, segment)
+            return synthesize_sentence(model_name, vocoder_name, segment, labels)
+        except Exception:
+            upstream_errors.inc(backend='coqui', kind='inference')
+            raise
+
+    def segment_key(segment):
+        return make_cache_key(segment, language, False, None, backend='coqui',
+                              model=model_name, vocoder=vocoder_name, audio_format='pcm16')
+
+    if stream:
+        # Send each sentence's samples as soon as they are synthesized
+        chunks = stream_wav(stream_segments(
+            enhanced_text,
+            synthesize_wav,
+            join_wav,
+            audio_cache,
+            segment_key,
+            full_key=cache_key,
+            single_flight=single_flight
+        ))
+        # Synthesize the first sentence before responding so errors still return JSON
+        return itertools.chain([next(chunks)], chunks)
+
+    # Synthesize only the sentences that are not cached yet
+    audio = synthesize_segments(
+        enhanced_text,
+        synthesize_wav,
+        join_wav,
+        audio_cache,
+        segment_key,
+        single_flight=single_flight,
+        progress=progress
+    )
+    audio_cache.put(cache_key, audio)
+    return audio
+
+def run_speech_job(params, report_progress):
+    """
+    Synthesize the text of a job the same way /api/stream-speech does.
+
+    Jobs and batch items were accepted as a whole, so a synthesis waits for an
+    admission slot instead of being refused.
+
+    Args:
+        params (dict): The job's request fields.
+        report_progress (callable): Called as report_progress(done, total) after each sentence.
+
+    Returns:
+        tuple: (audio bytes, mimetype)
+    """
+    language = params.get('language', 'en')
+    emotion = params.get('emotion', 'neutral')
+    labels = metric_labels(params, 'coqui' if use_coqui() else 'gtts')
+
+    # Add natural pauses with punctuation and apply emotion
+    enhanced_text = enhance_text(params['text'], emotion, labels)
+
+    if use_coqui():
+        model_name = params.get('model', DEFAULT_MODEL)
+        vocoder_name = params.get('vocoder', None)
+        cache_key = make_cache_key(enhanced_text, language, False, emotion, backend='coqui',
+                                   model=model_name, vocoder=vocoder_name, audio_format='pcm16')
+        audio = audio_cache.get(cache_key)
+        if audio is None:
+            admitted_at = admission.acquire(block=True)
+            try:
+                audio = synthesize_coqui(enhanced_text, language, model_name, vocoder_name, cache_key,
+                                         progress=report_progress, labels=labels)
+            finally:
+                admission.release(admitted_at)
+        return audio, 'audio/wav'
+
+    slow = params.get('slow', False)
+    cache_key = make_cache_key(enhanced_text, language, slow, emotion, backend='gtts')
+    audio = audio_cache.get(cache_key)
+    if audio is None:
+        admitted_at = admission.acquire(block=True)
+        try:
+            audio = synthesize_segments(
+                enhanced_text,
+                timed_synthesis(lambda segment: synthesize_mp3(segment, language, slow), labels),
+                join_mp3,
+                audio_cache,
+                lambda segment: make_cache_key(segment, language, slow, None, backend='gtts'),
+                single_flight=single_flight,
+                progress=report_progress
+            )
+        finally:
+            admission.release(admitted_at)
+        audio_cache.put(cache_key, audio)
+    return audio, 'audio/mpeg'
+
+# Long texts can be synthesized in the background (TTS_JOBS_DIR / TTS_JOB_WORKERS / TTS_JOB_QUEUE_MAX)
+job_queue = JobQueue.from_env(run_speech_job)
 
 @app.route('/')
 def index():
@@ -153,17 +512,93 @@ def index():
         'version': '1.0',
         'description': 'Text-to-Speech API with fallback options',
         'endpoints': {
-            '/api/stream-speech': 'POST - Convert text to speech audio',
-            '/api/models': 'GET - List available models (Coqui TTS only)'
+            '/api/stream-speech': 'GET/POST - Convert text to speech audio',
+            '/api/batch-speech': 'POST - Convert many texts at once (multipart or ZIP)',
+            '/api/jobs': 'POST - Queue a long text for background synthesis',
+            '/api/jobs/<id>': 'GET - Status and progress of a job',
+            '/api/jobs/<id>/audio': 'GET - Audio of a finished job',
+            '/api/models': 'GET - List available models (Coqui TTS only)',
+            '/api/models/resident': 'GET - Loaded models and memory use (Coqui TTS only)',
+            '/api/ready': 'GET - Readiness (503 until preloaded models are warmed up)',
+            '/metrics': 'GET - Prometheus metrics of all workers',
+            '/api/cache-stats': 'GET - Audio cache statistics',
+            '/api/upstream-stats': 'GET - gTTS connection pool statistics',
+            '/api/admission-stats': 'GET - Running and queued syntheses and rejections'
         }
     })
 
+@app.before_request
+def start_request_metrics():
+    """Count the request as in flight and note when it started."""
+    g.metrics_started = time.perf_counter()
+    requests_in_flight.inc(endpoint=request.endpoint or 'unknown')
+
+@app.after_request
+def finish_request_metrics(response):
+    """Record duration and bytes once the (possibly streamed) response has been sent."""
+    endpoint = request.endpoint or 'unknown'
+    started = g.metrics_started
+    labels = g.get('metric_labels')
+    sent = [0]
+
+    if labels is not None and response.is_streamed:
+        chunks = response.response
+
+        def count_chunks():
+            for chunk in chunks:
+                sent[0] += len(chunk)
+                yield chunk
+        response.response = count_chunks()
+    elif labels is not None:
+        sent[0] = response.calculate_content_length() or 0
+
+    def record():
+        requests_in_flight.dec(endpoint=endpoint)
+        if labels is not None:
+            request_seconds.observe(time.perf_counter() - started, **labels)
+            response_bytes.inc(sent[0], backend=labels['backend'])
+
+    response.call_on_close(record)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Return request, stage, error and cache metrics of all workers in the Prometheus text format."""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Return audio cache hit/miss/eviction counters and single-flight coalescing counters."""
+    return jsonify(dict(audio_cache.stats(), single_flight=single_flight.stats()))
+
+@app.route('/api/upstream-stats', methods=['GET'])
+def upstream_stats():
+    """Return request and connection reuse counters of the pooled gTTS session."""
+    return jsonify(connection_stats())
+
+@app.route('/api/admission-stats', methods=['GET'])
+def admission_stats():
+    """Return running and queued syntheses, queue limits and rejection counters."""
+    return jsonify(admission.stats())
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Report readiness; 503 until preloaded models have finished warming up."""
+    if not models_ready.is_set():
+        return jsonify({'ready': False}), 503
+    if inference_client is not None:
+        try:
+            inference_client.stats()
+        except OSError:
+            return jsonify({'ready': False, 'inference_server': 'unavailable'}), 503
+    return jsonify(dict(preload_state, ready=True, preload=PRELOAD))
+
 @app.route('/api/models', methods=['GET'])
 def list_models():
     """List available TTS models."""
-    if USE_COQUI:
+    if use_coqui():
         try:
-            models = model_manager.list_models()
+            models = inference_client.list_models() if inference_client else model_manager.list_models()
             return jsonify({
                 'models': models
             })
@@ -174,12 +609,43 @@ def list_models():
             'models': ['gTTS (fallback)']
         })
 
-@app.route('/api/stream-speech', methods=['POST'])
+@app.route('/api/models/resident', methods=['GET'])
+def resident_models():
+    """List loaded models, their memory use and the registry's memory budget."""
+    if inference_client is not None:
+        # Models live in the inference processes; one of them answers
+        try:
+            return jsonify(inference_client.stats())
+        except OSError as e:
+            return jsonify({'error': f'Inference server unavailable: {e}'}), 503
+    residency = model_registry.residency()
+    residency['batching'] = inference_batcher.stats()
+    return jsonify(residency)
+
+@app.route('/api/batch-speech', methods=['POST'])
+@rate_limiter.limit(cost=lambda: item_count(request.json))
+def batch_speech():
+    """Synthesize many texts concurrently and stream each result as soon as it is ready."""
+    try:
+        items, output = parse_batch_request(request.json, request.accept_mimetypes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Refuse the whole batch at once when the server is overloaded; accepted items wait for slots
+    try:
+        admission.check()
+    except Overloaded as e:
+        return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+
+    # Items are synthesized exactly like jobs, without progress reports
+    return batch_response(items, lambda params: run_speech_job(params, lambda done, total: None), output)
+
+@app.route('/api/stream-speech', methods=['GET', 'POST'])
+@rate_limiter.limit()
 def stream_speech():
     """Generate speech from text and stream it directly."""
-    global synthesizer
-
-    data = request.json
+    server_timing.start()
+    data = request_params()
 
     if not data or 'text' not in data:
         return jsonify({'error': 'No text provided'}), 400
@@ -187,90 +653,176 @@ def stream_speech():
     text = data['text']
     language = data.get('language', 'en')
     emotion = data.get('emotion', 'neutral')
+    labels = g.metric_labels = metric_labels(data, 'coqui' if use_coqui() else 'gtts')
 
     try:
         # Add natural pauses with punctuation and apply emotion
-        enhanced_text = add_natural_pauses(text)
-        enhanced_text = apply_emotion(enhanced_text, emotion)
+        enhanced_text = enhance_text(text, emotion, labels)
 
-        if USE_COQUI:
-            model_name = data.get('model', 'tts_models/en/ljspeech/tacotron2-DDC')
+        if use_coqui():
+            model_name = data.get('model', DEFAULT_MODEL)
             vocoder_name = data.get('vocoder', None)
 
-            # Load model if not loaded or if a different model is requested
-            if synthesizer is None:
-                # Function to download and load a model
-                def load_tts_model(model_name="tts_models/en/ljspeech/tacotron2-DDC", vocoder_name=None):
-                    """
-                    Download and load a TTS model and vocoder.
-                    """
+            try:
+                audio_format = choose_format(data.get('format'), request.accept_mimetypes)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            # Compressed formats are sent as one file; only WAV is streamed sentence by sentence
+            stream = data.get('stream', False) and audio_format == 'wav'
+
+            # Serve repeated requests from the audio cache
+            cache_key = make_cache_key(enhanced_text, language, False, emotion, backend='coqui',
+                                       model=model_name, vocoder=vocoder_name, audio_format='pcm16')
+            if audio_format == 'wav':
+                response = not_modified(cache_key)
+                if response is not None:
+                    return response
+                with server_timing.stage('cache'):
+                    audio = audio_cache.get(cache_key)
+                if audio is None:
+                    admitted_at = acquire_synthesis_slot()
                     try:
-                        # Get model info
-                        model_path, config_path, model_item = model_manager.download_model(model_name)
-                        vocoder_path, vocoder_config_path, _ = model_manager.download_model(vocoder_name) if vocoder_name else (None, None, None)
-
-                        # Initialize synthesizer
-                        synthesizer = Synthesizer(
-                            tts_checkpoint=model_path,
-                            tts_config_path=config_path,
-                            vocoder_checkpoint=vocoder_path,
-                            vocoder_config=vocoder_config_path,
-                            use_cuda=torch.cuda.is_available()
-                        )
-
-                        return synthesizer
-                    except Exception as e:
-                        print(f"Error loading TTS model: {str(e)}")
-                        return None
-
-                synthesizer = load_tts_model(model_name, vocoder_name)
-                if synthesizer is None:
-                    return jsonify({'error': 'Failed to load TTS model'}), 500
-
-            # Generate speech
-            wav = synthesizer.tts(enhanced_text)
-
-            # Convert to WAV format
-            import scipy.io.wavfile as wav_io
-            wav_buffer = io.BytesIO()
-            wav_io.write(wav_buffer, synthesizer.output_sample_rate, wav)
-            wav_buffer.seek(0)
-
-            # Stream the audio data
-            return Response(
-                wav_buffer,
-                mimetype='audio/wav',
-                headers={
-                    'Content-Disposition': 'inline',
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
-            )
+                        audio = synthesize_coqui(enhanced_text, language, model_name, vocoder_name, cache_key,
+                                                 stream, labels=labels)
+                    except Exception:
+                        admission.release(admitted_at)
+                        raise
+                    if stream:
+                        # The slot is held until the last chunk has been sent
+                        chunks = admission.hold(audio, admitted_at)
+                        audio = itertools.chain([next(chunks)], chunks)
+                    else:
+                        admission.release(admitted_at)
+            else:
+                encoded_key = make_cache_key(enhanced_text, language, False, emotion, backend='coqui',
+                                             model=model_name, vocoder=vocoder_name, audio_format=audio_format)
+                response = not_modified(encoded_key)
+                if response is not None:
+                    return response
+                with server_timing.stage('cache'):
+                    audio = audio_cache.get(encoded_key)
+                if audio is None:
+                    # Encode the (possibly cached) WAV on the encoder pool
+                    admitted_at = acquire_synthesis_slot()
+                    try:
+                        with server_timing.stage('cache'):
+                            wav_audio = audio_cache.get(cache_key)
+                        if wav_audio is None:
+                            wav_audio = synthesize_coqui(enhanced_text, language, model_name, vocoder_name,
+                                                         cache_key, labels=labels)
+                        with timed_stage('encode', labels):
+                            audio = encode_audio(wav_audio, audio_format)
+                    finally:
+                        admission.release(admitted_at)
+                    audio_cache.put(encoded_key, audio)
+
+            # Send the audio (cacheable and seekable once it is complete)
+            return audio_response(audio, mimetype_for(audio_format),
+                                  cache_key if audio_format == 'wav' else encoded_key,
+                                  headers={'Vary': 'Accept'})
         else:
             # Fallback to gTTS
             slow = data.get('slow', False)
-
-            # Create an in-memory bytes buffer
-            mp3_fp = io.BytesIO()
-
-            # Generate speech to the buffer
-            tts = gTTS(text=enhanced_text, lang=language, slow=slow)
-            tts.write_to_fp(mp3_fp)
-
-            # Reset buffer position to the beginning
-            mp3_fp.seek(0)
-
-            # Stream the audio data
-            return Response(
-                mp3_fp,
-                mimetype='audio/mpeg',
-                headers={
-                    'Content-Disposition': 'inline',
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
-            )
+            stream = data.get('stream', False)
+
+            # Serve repeated requests from the audio cache
+            cache_key = make_cache_key(enhanced_text, language, slow, emotion, backend='gtts')
+            response = not_modified(cache_key)
+            if response is not None:
+                return response
+            with server_timing.stage('cache'):
+                audio = audio_cache.get(cache_key)
+
+            if audio is None:
+                # Refuse at once when too many syntheses are running or waiting
+                admitted_at = acquire_synthesis_slot()
+
+            if audio is None and stream:
+                # Send each sentence as soon as it is synthesized; the slot is held until the stream ends
+                chunks = admission.hold(stream_segments(
+                    enhanced_text,
+                    timed_synthesis(lambda segment: synthesize_mp3(segment, language, slow), labels),
+                    join_mp3,
+                    audio_cache,
+                    lambda segment: make_cache_key(segment, language, slow, None, backend='gtts'),
+                    full_key=cache_key,
+                    single_flight=single_flight
+                ), admitted_at)
+                # Synthesize the first sentence before responding so errors still return JSON
+                audio = itertools.chain([next(chunks)], chunks)
+            elif audio is None:
+                # Synthesize only the sentences that are not cached yet
+                try:
+                    audio = synthesize_segments(
+                        enhanced_text,
+                        timed_synthesis(lambda segment: synthesize_mp3(segment, language, slow), labels),
+                        join_mp3,
+                        audio_cache,
+                        lambda segment: make_cache_key(segment, language, slow, None, backend='gtts'),
+                        single_flight=single_flight
+                    )
+                finally:
+                    admission.release(admitted_at)
+                audio_cache.put(cache_key, audio)
+
+            # Send the audio (cacheable and seekable once it is complete)
+            return audio_response(audio, 'audio/mpeg', cache_key)
+    except Overloaded as e:
+        return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@app.before_first_request
+def start_job_workers():
+    """Resume queued and interrupted jobs once this worker serves its first request."""
+    job_queue.start()
+
+@app.route('/api/jobs', methods=['POST'])
+@rate_limiter.limit()
+def create_job():
+    """Queue a text for background synthesis and return the job id."""
+    data = request.json
+
+    if not data or 'text' not in data:
+        return jsonify({'error': 'No text provided'}), 400
+
+    params = {name: data[name] for name in ('text', 'language', 'slow', 'emotion', 'model', 'vocoder') if name in data}
+    try:
+        job_id = job_queue.submit(params)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+
+    return jsonify({
+        'id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}',
+        'audio_url': f'/api/jobs/{job_id}/audio'
+    }), 202, {'Location': f'/api/jobs/{job_id}'}
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Return the status and progress of a job."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == 'done':
+        job['audio_url'] = f'/api/jobs/{job_id}/audio'
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/audio', methods=['GET'])
+def job_audio(job_id):
+    """Return the audio of a finished job."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+
+    # A job's audio never changes, so its id serves as the ETag
+    response = not_modified(job_id)
+    if response is not None:
+        return response
+    with open(job_queue.store.audio_path(job_id), 'rb') as f:
+        audio = f.read()
+    return audio_response(audio, job['mimetype'], job_id)
@@ -0,0 +1,130 @@
+"""
+Asynchronous gTTS synthesis backend for the ASGI server.
+Builds the same upstream requests as gtts_backend and parses the responses the
+same way, but sends them with an aiohttp session: a request waiting on the
+upstream costs a coroutine instead of a worker thread. The pieces of a text
+are fetched concurrently and reassembled in order.
+"""
+
+import os
+import base64
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+from gtts import gTTS
+from gtts.tts import gTTSError
+
+from gtts_backend import AUDIO_RE, GTTS_UPSTREAM_URL
+
+# Upstream connections per process (TTS_ASYNC_HTTP_CONNECTIONS); further requests wait for a free one
+DEFAULT_MAX_CONNECTIONS = 1000
+MAX_CONNECTIONS = int(os.environ.get('TTS_ASYNC_HTTP_CONNECTIONS', DEFAULT_MAX_CONNECTIONS))
+
+# Seconds to connect to and wait for the upstream (TTS_ASYNC_HTTP_TIMEOUT)
+DEFAULT_TIMEOUT = 30.0
+HTTP_TIMEOUT = float(os.environ.get('TTS_ASYNC_HTTP_TIMEOUT', DEFAULT_TIMEOUT))
+
+_session = None
+_requests_sent = 0
+# Failed upstream requests by kind, as in gtts_backend
+_errors = {'http': 0, 'connection': 0, 'no_audio': 0}
+
+
+def get_session():
+    """
+    Return the process-wide pooled HTTP session used for all gTTS requests.
+
+    Must be called from the event loop that uses the session.
+    """
+    global _session
+    if _session is None:
+        _session = aiohttp.ClientSession(
+            # gTTS disables verification for proxies and firewalls
+            connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ssl=False),
+            # Waiting for a pooled connection is not an error, only the upstream itself may time out
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=HTTP_TIMEOUT, sock_read=HTTP_TIMEOUT),
+            # Proxies come from the environment, like urllib.request.getproxies() in gtts_backend
+            trust_env=True
+        )
+    return _session
+
+
+async def close_session():
+    """Close the pooled session (on server shutdown)."""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+def stats():
+    """Return the upstream request and error counters and the connection limit."""
+    return {
+        'max_connections': MAX_CONNECTIONS,
+        'requests': _requests_sent,
+        'errors': dict(_errors),
+    }
+
+
+async def _fetch_part(tts, prepared_request):
+    """
+    Send one prepared gTTS request and return the decoded MP3 bytes.
+    """
+    global _requests_sent
+    # Counters are only touched from the event loop thread
+    _requests_sent += 1
+
+    try:
+        async with get_session().post(prepared_request.url, data=prepared_request.body,
+                                      headers=dict(prepared_request.headers)) as response:
+            body = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # Request failed
+        _errors['connection'] += 1
+        raise gTTSError(tts=tts)
+
+    # gTTSError reads the status and reason the way a requests response has them
+    summary = SimpleNamespace(status_code=response.status, reason=response.reason)
+    if response.status >= 400:
+        # Request successful, bad response
+        _errors['http'] += 1
+        raise gTTSError(tts=tts, response=summary)
+
+    audio = []
+    for line in body.splitlines():
+        if 'jQ1olc' in line:
+            audio_search = AUDIO_RE.search(line)
+            if not audio_search:
+                # Request successful, good response, no audio stream in response
+                _errors['no_audio'] += 1
+                raise gTTSError(tts=tts, response=summary)
+            audio.append(base64.b64decode(audio_search.group(1).encode('ascii')))
+    return b''.join(audio)
+
+
+async def synthesize_mp3(text, language='en', slow=False):
+    """
+    Synthesize text with gTTS and return the MP3 bytes.
+
+    Args:
+        text (str): The text to convert to speech.
+        language (str): The language code.
+        slow (bool): Whether to speak slowly.
+
+    Returns:
+        bytes: The MP3 audio.
+
+    Raises:
+        gTTSError: When an upstream request fails.
+    """
+    tts = gTTS(text=text, lang=language, slow=slow)
+    prepared_requests = tts._prepare_requests()
+
+    if GTTS_UPSTREAM_URL:
+        for prepared_request in prepared_requests:
+            prepared_request.url = GTTS_UPSTREAM_URL
+
+    # gather() returns results in argument order, so the MP3 parts stay in sequence
+    parts = await asyncio.gather(*(_fetch_part(tts, prepared_request) for prepared_request in prepared_requests))
+    return b''.join(parts)
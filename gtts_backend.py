@@ -0,0 +1,205 @@
+"""
+gTTS synthesis backend.
+gTTS splits text into ~100-character pieces and fetches them one after another
+inside write_to_fp(), opening a new session (and connection) for each piece.
+This backend sends those sub-requests concurrently through a bounded,
+process-wide thread pool over one pooled keep-alive HTTP session, and
+reassembles the MP3 parts in order.
+"""
+
+import os
+import re
+import base64
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from gtts import gTTS
+from gtts.tts import gTTSError
+
+# Maximum number of concurrent upstream requests per process (TTS_GTTS_CONCURRENCY)
+DEFAULT_CONCURRENCY = 8
+GTTS_CONCURRENCY = int(os.environ.get('TTS_GTTS_CONCURRENCY', DEFAULT_CONCURRENCY))
+
+# Keep-alive connections kept per upstream host (TTS_HTTP_POOL_SIZE)
+HTTP_POOL_SIZE = int(os.environ.get('TTS_HTTP_POOL_SIZE', max(GTTS_CONCURRENCY, 10)))
+
+# Optional replacement for the Google endpoint, e.g. a local mock for benchmarks
+GTTS_UPSTREAM_URL = os.environ.get('TTS_GTTS_UPSTREAM')
+
+# Audio payload inside the batchexecute response (same expression gTTS uses)
+AUDIO_RE = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_session = None
+_adapter = None
+_session_lock = threading.Lock()
+_requests_sent = 0
+# Failed upstream requests by kind: HTTP error status, no connection, no audio in the response
+_errors = {'http': 0, 'connection': 0, 'no_audio': 0}
+
+# gTTS disables verification for proxies and firewalls; silence the matching warning once
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def set_concurrency(concurrency):
+    """
+    Change the number of concurrent upstream requests (1 disables the pool).
+    """
+    global GTTS_CONCURRENCY, _executor
+    with _executor_lock:
+        GTTS_CONCURRENCY = max(1, int(concurrency))
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=GTTS_CONCURRENCY, thread_name_prefix='gtts')
+        return _executor
+
+
+def set_pool_size(pool_size):
+    """
+    Change the number of keep-alive connections per host (drops the current pool).
+    """
+    global HTTP_POOL_SIZE, _session, _adapter, _requests_sent
+    with _session_lock:
+        HTTP_POOL_SIZE = max(1, int(pool_size))
+        if _session is not None:
+            _session.close()
+        _session = None
+        _adapter = None
+        _requests_sent = 0
+
+
+def get_session():
+    """
+    Return the process-wide pooled HTTP session used for all gTTS requests.
+    """
+    global _session, _adapter
+    with _session_lock:
+        if _session is None:
+            _adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            _session = requests.Session()
+            _session.mount('https://', _adapter)
+            _session.mount('http://', _adapter)
+        return _session
+
+
+def connection_stats():
+    """
+    Return request and connection counters of the pooled session.
+
+    Requests that did not need a new connection reused a pooled keep-alive one.
+    """
+    with _session_lock:
+        adapter = _adapter
+        requests_sent = _requests_sent
+        errors = dict(_errors)
+
+    connections_opened = 0
+    idle_connections = 0
+    if adapter is not None:
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                # Pool was evicted concurrently
+                continue
+            connections_opened += pool.num_connections
+            if pool.pool is not None:
+                # The queue is pre-filled with None placeholders for connections not yet opened
+                idle_connections += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+    reused = max(0, requests_sent - connections_opened)
+    return {
+        'pool_size': HTTP_POOL_SIZE,
+        'requests': requests_sent,
+        'connections_opened': connections_opened,
+        'connections_reused': reused,
+        'reuse_ratio': reused / requests_sent if requests_sent else 0.0,
+        'idle_connections': idle_connections,
+        'errors': errors,
+    }
+
+
+def _count_error(kind):
+    with _session_lock:
+        _errors[kind] += 1
+
+
+def _fetch_part(tts, prepared_request):
+    """
+    Send one prepared gTTS request and return the decoded MP3 bytes.
+    """
+    global _requests_sent
+    session = get_session()
+    with _session_lock:
+        _requests_sent += 1
+
+    try:
+        response = session.send(request=prepared_request,
+                                proxies=urllib.request.getproxies(),
+                                verify=False)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        # Request successful, bad response
+        _count_error('http')
+        raise gTTSError(tts=tts, response=response)
+    except requests.exceptions.RequestException:
+        # Request failed
+        _count_error('connection')
+        raise gTTSError(tts=tts)
+
+    audio = []
+    for line in response.iter_lines(chunk_size=1024):
+        decoded_line = line.decode('utf-8')
+        if 'jQ1olc' in decoded_line:
+            audio_search = AUDIO_RE.search(decoded_line)
+            if not audio_search:
+                # Request successful, good response, no audio stream in response
+                _count_error('no_audio')
+                raise gTTSError(tts=tts, response=response)
+            audio.append(base64.b64decode(audio_search.group(1).encode('ascii')))
+    return b''.join(audio)
+
+
+def synthesize_mp3(text, language='en', slow=False):
+    """
+    Synthesize text with gTTS and return the MP3 bytes.
+
+    Args:
+        text (str): The text to convert to speech.
+        language (str): The language code.
+        slow (bool): Whether to speak slowly.
+
+    Returns:
+        bytes: The MP3 audio.
+
+    Raises:
+        gTTSError: When an upstream request fails.
+    """
+    tts = gTTS(text=text, lang=language, slow=slow)
+    prepared_requests = tts._prepare_requests()
+
+    if GTTS_UPSTREAM_URL:
+        for prepared_request in prepared_requests:
+            prepared_request.url = GTTS_UPSTREAM_URL
+
+    if len(prepared_requests) == 1 or GTTS_CONCURRENCY <= 1:
+        parts = [_fetch_part(tts, prepared_request) for prepared_request in prepared_requests]
+    else:
+        # map() yields results in submission order, so the MP3 parts stay in sequence
+        parts = list(_get_executor().map(lambda pr: _fetch_part(tts, pr), prepared_requests))
+
+    return b''.join(parts)
@@ -0,0 +1,162 @@
+"""
+The gTTS speech pipeline shared by the gTTS servers (api/index.py and
+tts_web_interface.py): text enhancement, the audio cache, admission control
+and synthesis of the sentences that are not cached yet, either as complete
+audio or streamed sentence by sentence.
+"""
+
+import itertools
+
+from flask import request, jsonify
+
+from audio_cache import make_cache_key
+from gtts_backend import synthesize_mp3
+from audio_segments import synthesize_segments, stream_segments, join_mp3
+from text_enhancement import add_natural_pauses, apply_emotion
+from http_audio import request_params, not_modified, audio_response
+import server_timing
+from admission import Overloaded
+from batch_speech import parse_batch_request, batch_response
+
+
+def segment_key(language, slow):
+    """Return the function that maps a sentence to its cache key."""
+    return lambda segment: make_cache_key(segment, language, slow, None, backend='gtts')
+
+
+class GttsSpeech:
+    """
+    Synthesizes requests with gTTS using a server's cache, single-flight and admission controller.
+    """
+
+    def __init__(self, audio_cache, single_flight, admission):
+        """
+        Args:
+            audio_cache (AudioCache): Cache of complete texts and single sentences.
+            single_flight (SingleFlight): Shares concurrent identical syntheses.
+            admission (AdmissionController): Bounds the syntheses running at a time.
+        """
+        self.audio_cache = audio_cache
+        self.single_flight = single_flight
+        self.admission = admission
+
+    def synthesize_text(self, params):
+        """
+        Synthesize one text with the same fields and defaults as /api/stream-speech.
+
+        Used for the items of an admitted batch: a synthesis waits for an
+        admission slot instead of being refused.
+
+        Returns:
+            tuple: (audio bytes, mimetype)
+        """
+        language = params.get('language', 'en')
+        slow = params.get('slow', False)
+        emotion = params.get('emotion', 'neutral')
+
+        # Add natural pauses with punctuation and apply emotion
+        enhanced_text = add_natural_pauses(params['text'])
+        enhanced_text = apply_emotion(enhanced_text, emotion)
+
+        cache_key = make_cache_key(enhanced_text, language, slow, emotion, backend='gtts')
+        audio = self.audio_cache.get(cache_key)
+        if audio is None:
+            admitted_at = self.admission.acquire(block=True)
+            try:
+                audio = synthesize_segments(
+                    enhanced_text,
+                    lambda segment: synthesize_mp3(segment, language, slow),
+                    join_mp3,
+                    self.audio_cache,
+                    segment_key(language, slow),
+                    single_flight=self.single_flight
+                )
+            finally:
+                self.admission.release(admitted_at)
+            self.audio_cache.put(cache_key, audio)
+        return audio, 'audio/mpeg'
+
+    def batch_speech(self):
+        """Answer the current /api/batch-speech request."""
+        try:
+            items, output = parse_batch_request(request.json, request.accept_mimetypes)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Refuse the whole batch at once when the server is overloaded; accepted items wait for slots
+        try:
+            self.admission.check()
+        except Overloaded as e:
+            return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+
+        return batch_response(items, self.synthesize_text, output)
+
+    def stream_speech(self):
+        """Answer the current /api/stream-speech request."""
+        server_timing.start()
+        data = request_params()
+
+        if not data or 'text' not in data:
+            return jsonify({'error': 'No text provided'}), 400
+
+        text = data['text']
+        language = data.get('language', 'en')
+        slow = data.get('slow', False)
+        emotion = data.get('emotion', 'neutral')
+        stream = data.get('stream', False)
+
+        try:
+            # Add natural pauses with punctuation and apply emotion
+            with server_timing.stage('enhance'):
+                enhanced_text = add_natural_pauses(text)
+                enhanced_text = apply_emotion(enhanced_text, emotion)
+
+            # Serve repeated requests from the audio cache
+            cache_key = make_cache_key(enhanced_text, language, slow, emotion, backend='gtts')
+            response = not_modified(cache_key)
+            if response is not None:
+                return response
+            with server_timing.stage('cache'):
+                audio = self.audio_cache.get(cache_key)
+
+            if audio is None:
+                # Refuse at once when too many syntheses are running or waiting
+                try:
+                    with server_timing.stage('queue'):
+                        admitted_at = self.admission.acquire()
+                except Overloaded as e:
+                    return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+
+            synthesize = server_timing.timed(lambda segment: synthesize_mp3(segment, language, slow), 'synth')
+            if audio is None and stream:
+                # Send each sentence as soon as it is synthesized; the slot is held until the stream ends
+                chunks = self.admission.hold(stream_segments(
+                    enhanced_text,
+                    synthesize,
+                    join_mp3,
+                    self.audio_cache,
+                    segment_key(language, slow),
+                    full_key=cache_key,
+                    single_flight=self.single_flight
+                ), admitted_at)
+                # Synthesize the first sentence before responding so errors still return JSON
+                audio = itertools.chain([next(chunks)], chunks)
+            elif audio is None:
+                # Synthesize only the sentences that are not cached yet
+                try:
+                    audio = synthesize_segments(
+                        enhanced_text,
+                        synthesize,
+                        join_mp3,
+                        self.audio_cache,
+                        segment_key(language, slow),
+                        single_flight=self.single_flight
+                    )
+                finally:
+                    self.admission.release(admitted_at)
+                self.audio_cache.put(cache_key, audio)
+
+            # Send the audio (cacheable and seekable once it is complete)
+            return audio_response(audio, 'audio/mpeg', cache_key)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the Render deployment (`gunicorn app:app` picks this file up).
+
+Set TTS_PRELOAD=1 to load and warm up the Coqui models listed in
+TTS_PRELOAD_MODELS in the master process before the workers are forked. The
+workers then share the model weights copy-on-write instead of each loading its
+own copy on its first request.
+
+Every worker writes its metrics to TTS_METRICS_DIR, so /metrics on any worker
+reports the totals of all of them. When the variable is not set a directory
+named after the master's pid is used.
+
+Each worker serves TTS_GUNICORN_THREADS requests at a time (gthread workers),
+so a worker whose synthesis slots are taken can still answer cache hits and
+refuse overflow requests at once instead of leaving them in the listen queue.
+The threads do not run the Coqui models themselves: each worker runs its
+inference one batch at a time on a single inference thread (see
+TTS_BATCH_MAX_SIZE), and its torch uses an equal share of the CPUs, so more
+threads neither use a model concurrently nor oversubscribe the CPU.
+"""
+
+import os
+import tempfile
+
+preload_app = os.environ.get('TTS_PRELOAD', '0') == '1'
+
+# More than one thread selects gunicorn's gthread worker
+threads = int(os.environ.get('TTS_GUNICORN_THREADS', '8'))
+
+
+def on_starting(server):
+    """Give all workers one metrics directory and drop the files of a previous run."""
+    from metrics import reset_directory
+    directory = os.environ.setdefault('TTS_METRICS_DIR',
+                                      os.path.join(tempfile.gettempdir(), f'tts_metrics_{os.getpid()}'))
+    reset_directory(directory)
+
+
+def post_fork(server, worker):
+    """Give each worker's inference its share of the CPUs' torch threads."""
+    from coqui_tts_fallback import init_worker
+    init_worker(max(1, (os.cpu_count() or 1) // server.cfg.workers))
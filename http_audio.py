@@ -0,0 +1,134 @@
+"""
+HTTP caching and range support for synthesized audio responses.
+The cache key of a request doubles as its ETag: it is derived from every
+parameter that influences the audio, so the same request always has the same
+tag. Complete audio is sent with cacheable headers, answers If-None-Match with
+304 and serves byte ranges (206) for seeking in <audio> elements.
+Every response carries the request's Server-Timing header; with debug=true
+the audio and its timings are returned together as JSON instead.
+"""
+
+import os
+import base64
+
+from flask import request, Response, jsonify
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+import server_timing
+
+# How long clients may reuse audio without revalidating (TTS_HTTP_MAX_AGE, seconds)
+DEFAULT_MAX_AGE = 86400
+HTTP_MAX_AGE = int(os.environ.get('TTS_HTTP_MAX_AGE', DEFAULT_MAX_AGE))
+
+# Headers of responses that must not be cached (audio still being streamed)
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
+
+# Query string values that mean true for boolean parameters of GET requests
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def request_params():
+    """
+    Return the synthesis parameters of the current request.
+
+    POST requests send them as a JSON body, GET requests (e.g. an <audio src>)
+    as the query string.
+
+    Returns:
+        dict: The parameters, or None if there are none.
+    """
+    if request.method == 'GET':
+        data = request.args.to_dict()
+        for name in ('slow', 'stream', 'debug'):
+            if name in data:
+                data[name] = data[name].lower() in TRUE_VALUES
+        return data
+    return request.json
+
+
+def not_modified(etag):
+    """
+    Return a 304 response if the client already holds the audio for etag.
+
+    Checked before any synthesis or cache lookup, so a revalidation costs nothing.
+
+    Returns:
+        Response: The 304 response, or None if the audio has to be sent.
+    """
+    if not request.if_none_match.contains(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={HTTP_MAX_AGE}'
+    return server_timing.add_header(response)
+
+
+def debug_response(audio, mimetype, etag=None):
+    """
+    Return the audio and the request's stage timings as one JSON document.
+
+    For clients that cannot read response headers, e.g. command line tools.
+    Streamed audio is collected first, so the timings cover the whole synthesis.
+
+    Returns:
+        Response: JSON with mimetype, bytes, etag, server_timing (ms per stage)
+        and the base64 encoded audio.
+    """
+    if not isinstance(audio, bytes):
+        audio = b''.join(audio)
+    response = jsonify({
+        'mimetype': mimetype,
+        'bytes': len(audio),
+        'etag': etag,
+        'server_timing': server_timing.durations_ms(),
+        'audio': base64.b64encode(audio).decode('ascii')
+    })
+    response.headers.update(NO_CACHE_HEADERS)
+    return server_timing.add_header(response)
+
+
+def audio_response(audio, mimetype, etag=None, headers=None):
+    """
+    Build the response for synthesized audio.
+
+    Complete audio (bytes) with an etag is cacheable and supports Range and
+    conditional requests. Audio that is still being streamed (an iterator) has
+    no known length and is sent uncached, as before.
+
+    With debug=true in the request parameters the debug JSON is returned
+    instead (see debug_response).
+
+    Args:
+        audio (bytes or iterator): The audio data.
+        mimetype (str): The audio Content-Type.
+        etag (str): The request's cache key.
+        headers (dict): Extra response headers.
+
+    Returns:
+        Response: The audio response.
+    """
+    if server_timing.SERVER_TIMING and (request_params() or {}).get('debug'):
+        return debug_response(audio, mimetype, etag)
+
+    response = Response(audio, mimetype=mimetype, headers={'Content-Disposition': 'inline'})
+    if headers:
+        response.headers.update(headers)
+    server_timing.add_header(response)
+
+    if etag is None or not isinstance(audio, bytes):
+        response.headers.update(NO_CACHE_HEADERS)
+        return response
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={HTTP_MAX_AGE}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    try:
+        # Handles If-None-Match / If-Range and turns Range requests into 206 responses
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(audio))
+    except RequestedRangeNotSatisfiable as e:
+        # 416 with the complete length in Content-Range
+        return e.get_response()
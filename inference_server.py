@@ -0,0 +1,319 @@
+"""
+Coqui TTS inference server.
+Runs the models in a pool of processes of its own, separate from the HTTP
+workers, which reach it over a local Unix socket (TTS_INFERENCE_SOCKET). The
+number of inference processes is set independently of the gunicorn workers:
+HTTP workers only handle requests and the audio cache, and a long inference
+no longer ties up a worker that could answer other requests. Each inference
+process serves the requests of all HTTP workers on its models, running one
+inference batch at a time.
+
+Run it next to gunicorn with the same TTS_INFERENCE_SOCKET:
+    TTS_INFERENCE_SOCKET=/tmp/tts_inference.sock python inference_server.py --processes 2
+
+With TTS_PRELOAD=1 the models are loaded and warmed up once before the
+processes are forked, so they share the weights copy-on-write.
+
+Protocol: a request is a header packed as !BHHI (op, model, vocoder and text
+lengths) followed by the three UTF-8 strings. A response is a header packed
+as !BI (status, payload length) followed by the payload: the sentence as
+16-bit PCM WAV, JSON for stats and model lists, or the error message.
+Connections stay open for any number of requests.
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+
+# Request header: op, model length, vocoder length, text length
+REQUEST = struct.Struct('!BHHI')
+# Response header: status, payload length
+RESPONSE = struct.Struct('!BI')
+
+OP_SYNTHESIZE = 1
+OP_STATS = 2
+OP_MODELS = 3
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Longest text accepted in one request (the HTTP workers send one sentence at a time)
+MAX_TEXT_BYTES = 1024 * 1024
+
+# Defaults (override with TTS_INFERENCE_PROCESSES / TTS_INFERENCE_TIMEOUT)
+DEFAULT_PROCESSES = 1
+DEFAULT_TIMEOUT = 120.0
+
+
+class InferenceError(Exception):
+    """Raised when the inference server could not synthesize a request."""
+
+
+def _recv_exact(sock, size):
+    """Read exactly size bytes; raises ConnectionError if the peer closes first."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError('Connection closed by the peer')
+        received += count
+    return bytes(buffer)
+
+
+class InferenceClient:
+    """
+    Client of the inference server used by the HTTP workers.
+
+    Every thread keeps one connection open, so concurrent requests of a
+    worker reach the server without waiting for each other. The server
+    queues them for its single inference thread.
+    """
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            path (str): Path of the server's Unix socket.
+            timeout (float): Seconds to wait for a response before giving up.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a client for TTS_INFERENCE_SOCKET.
+
+        Returns:
+            InferenceClient: The client, or None if no socket is configured.
+        """
+        path = os.environ.get('TTS_INFERENCE_SOCKET')
+        if not path:
+            return None
+        return cls(path, timeout=float(os.environ.get('TTS_INFERENCE_TIMEOUT', DEFAULT_TIMEOUT)))
+
+    def _connection(self):
+        # One connection per thread (and per process, after fork)
+        sock = getattr(self._local, 'sock', None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+            self._local.pid = os.getpid()
+            self._local.fresh = True
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _call(self, op, model='', vocoder='', text=''):
+        fields = [value.encode('utf-8') for value in (model, vocoder or '', text)]
+        request = REQUEST.pack(op, *(len(field) for field in fields)) + b''.join(fields)
+
+        while True:
+            sock = self._connection()
+            fresh, self._local.fresh = self._local.fresh, False
+            try:
+                sock.sendall(request)
+                status, length = RESPONSE.unpack(_recv_exact(sock, RESPONSE.size))
+                payload = _recv_exact(sock, length)
+                break
+            except socket.timeout:
+                # The response may still arrive; the connection cannot be reused
+                self._close()
+                raise
+            except OSError:
+                self._close()
+                # An idle connection may have been closed by a restarted server; retry once on a new one
+                if fresh:
+                    raise
+
+        if status != STATUS_OK:
+            raise InferenceError(payload.decode('utf-8', 'replace'))
+        return payload
+
+    def synthesize(self, model_name, vocoder_name, text):
+        """
+        Synthesize one sentence.
+
+        Returns:
+            bytes: The audio as 16-bit PCM WAV.
+
+        Raises:
+            InferenceError: If the server failed to synthesize the text.
+            OSError: If the server cannot be reached.
+        """
+        return self._call(OP_SYNTHESIZE, model_name, vocoder_name, text)
+
+    def stats(self):
+        """Return the loaded models and batching counters of the inference process that answers."""
+        return json.loads(self._call(OP_STATS))
+
+    def list_models(self):
+        """Return the models known to Coqui's model manager."""
+        return json.loads(self._call(OP_MODELS))
+
+
+class InferenceHandler(socketserver.BaseRequestHandler):
+    """Serves the requests of one client connection until it is closed."""
+
+    def handle(self):
+        while True:
+            try:
+                op, model_length, vocoder_length, text_length = REQUEST.unpack(
+                    _recv_exact(self.request, REQUEST.size))
+            except ConnectionError:
+                return
+
+            if text_length > MAX_TEXT_BYTES:
+                # The rest of the request is not read, so the connection cannot continue
+                self._reply(STATUS_ERROR, f'Text longer than {MAX_TEXT_BYTES} bytes'.encode('utf-8'))
+                return
+
+            fields = _recv_exact(self.request, model_length + vocoder_length + text_length)
+            model_name = fields[:model_length].decode('utf-8') or None
+            vocoder_name = fields[model_length:model_length + vocoder_length].decode('utf-8') or None
+            text = fields[model_length + vocoder_length:].decode('utf-8')
+
+            try:
+                payload = self.server.dispatch(op, model_name, vocoder_name, text)
+                status = STATUS_OK
+            except Exception as e:
+                payload = str(e).encode('utf-8')
+                status = STATUS_ERROR
+            self._reply(status, payload)
+
+    def _reply(self, status, payload):
+        self.request.sendall(RESPONSE.pack(status, len(payload)) + payload)
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server with one thread per connection.
+
+    Connection threads only read requests and wait for their results: all
+    inference of the process runs on its one inference thread.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, path, tts):
+        """
+        Args:
+            path (str): Path of the Unix socket.
+            tts (module): coqui_tts_fallback, imported with local inference.
+        """
+        self.tts = tts
+        super().__init__(path, InferenceHandler)
+
+    def dispatch(self, op, model_name, vocoder_name, text):
+        if op == OP_SYNTHESIZE:
+            # Queued for the process's inference thread (tts.inference_batcher), which runs one batch at a
+            # time, so however many workers are connected the models never run concurrently
+            return self.tts.synthesize_sentence(model_name or self.tts.DEFAULT_MODEL, vocoder_name, text)
+        if op == OP_STATS:
+            residency = self.tts.model_registry.residency()
+            residency['batching'] = self.tts.inference_batcher.stats()
+            residency['pid'] = os.getpid()
+            return json.dumps(residency).encode('utf-8')
+        if op == OP_MODELS:
+            return json.dumps(self.tts.model_manager.list_models()).encode('utf-8')
+        raise ValueError(f'Unknown operation {op}')
+
+
+def serve(server, torch_threads):
+    """Run one inference process until it is terminated."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: os._exit(0))
+    signal.signal(signal.SIGINT, lambda signum, frame: os._exit(0))
+    server.tts.init_worker(torch_threads)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--socket', default=os.environ.get('TTS_INFERENCE_SOCKET'),
+                        help='Path of the Unix socket (TTS_INFERENCE_SOCKET)')
+    parser.add_argument('--processes', type=int,
+                        default=int(os.environ.get('TTS_INFERENCE_PROCESSES', DEFAULT_PROCESSES)),
+                        help='Inference processes, each with its own models (TTS_INFERENCE_PROCESSES)')
+    parser.add_argument('--torch-threads', type=int,
+                        default=int(os.environ.get('TTS_INFERENCE_TORCH_THREADS', '0')),
+                        help='torch threads per process (TTS_INFERENCE_TORCH_THREADS, '
+                             'default: CPU cores divided by processes)')
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error('--socket or TTS_INFERENCE_SOCKET is required')
+    processes = max(1, args.processes)
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // processes)
+
+    # The models run in this server, not behind another socket
+    os.environ.pop('TTS_INFERENCE_SOCKET', None)
+    os.environ['TTS_BACKEND'] = 'coqui'
+    # Loads and warms up the preload models here (TTS_PRELOAD=1), before forking
+    import coqui_tts_fallback as tts
+
+    try:
+        os.unlink(args.socket)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    server = InferenceServer(args.socket, tts)
+
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve(server, torch_threads)
+            finally:
+                os._exit(1)
+        children.add(pid)
+
+    def shutdown(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        try:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(processes):
+        spawn()
+    print(f"Inference server listening on {args.socket} with {processes} processes "
+          f"x {torch_threads} torch threads", flush=True)
+
+    # Replace processes that die (e.g. killed for running out of memory)
+    while True:
+        pid, status = os.wait()
+        children.discard(pid)
+        print(f"Inference process {pid} exited with status {status}, starting a new one", flush=True)
+        # Avoid a tight loop when processes fail at startup
+        time.sleep(1)
+        spawn()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+Asynchronous synthesis jobs for long texts.
+Jobs are recorded in a local SQLite database and run by a bounded pool of
+background threads, so long syntheses do not hold an HTTP worker and survive
+server restarts. Every process that serves the jobs API runs its own pool;
+jobs are claimed atomically, so workers sharing the database never run the
+same job twice. Every process records a heartbeat for the jobs it runs; a
+running job whose heartbeat stops (its process exited, e.g. in a restart) is
+queued again.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+
+# Defaults (override with TTS_JOBS_DIR / TTS_JOB_WORKERS / TTS_JOB_QUEUE_MAX / TTS_JOB_TTL_HOURS /
+# TTS_JOB_HEARTBEAT_SECONDS)
+DEFAULT_JOBS_DIR = os.path.join(tempfile.gettempdir(), "tts_jobs")
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_MAX = 100
+DEFAULT_TTL_HOURS = 24
+DEFAULT_HEARTBEAT_SECONDS = 10.0
+
+# A running job is orphaned once this many heartbeats in a row are missing
+STALE_HEARTBEATS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    segments_done INTEGER NOT NULL DEFAULT 0,
+    segments_total INTEGER NOT NULL DEFAULT 0,
+    mimetype TEXT,
+    audio_bytes INTEGER,
+    error TEXT,
+    owner INTEGER,
+    instance TEXT,
+    heartbeat REAL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated);
+"""
+
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = [('instance', 'TEXT'), ('heartbeat', 'REAL')]
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are waiting to run."""
+
+
+class JobStore:
+    """
+    SQLite record of jobs, with the finished audio stored next to it as files.
+    """
+
+    def __init__(self, directory=DEFAULT_JOBS_DIR):
+        """
+        Args:
+            directory (str): Directory of the database and the audio files.
+        """
+        self.directory = directory
+        self.audio_dir = os.path.join(directory, "audio")
+        os.makedirs(self.audio_dir, exist_ok=True)
+        self.path = os.path.join(directory, "jobs.sqlite3")
+        self._local = threading.local()
+
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = {row['name'] for row in db.execute("PRAGMA table_info(jobs)")}
+            for name, kind in MIGRATIONS:
+                if name not in columns:
+                    try:
+                        db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+                    except sqlite3.OperationalError:
+                        # Another worker added it first
+                        pass
+
+    def _connect(self):
+        # One connection per thread (and per process, after fork)
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def create(self, params):
+        """Record a new queued job and return its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, params, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(params), now, now)
+            )
+        return job_id
+
+    def claim(self, instance):
+        """
+        Mark the oldest queued job as running in this process.
+
+        Args:
+            instance (str): Id of the claiming process, unique across restarts
+                (process ids are reused, e.g. when a container restarts).
+
+        Returns:
+            tuple: (job_id, params), or None if no job is queued.
+        """
+        db = self._connect()
+        # BEGIN IMMEDIATE takes the write lock, so two workers cannot claim the same job
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT id, params FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                db.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, instance = ?, heartbeat = ?, updated = ? "
+                    "WHERE id = ?",
+                    (os.getpid(), instance, now, now, row['id'])
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return (row['id'], json.loads(row['params'])) if row is not None else None
+
+    def progress(self, job_id, done, total):
+        """Record how many of the job's segments are synthesized."""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET segments_done = ?, segments_total = ?, updated = ? WHERE id = ?",
+                (done, total, time.time(), job_id)
+            )
+
+    def finish(self, job_id, audio, mimetype):
+        """Store the job's audio and mark it done."""
+        path = self.audio_path(job_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(audio)
+        os.replace(temp_path, path)
+
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'done', mimetype = ?, audio_bytes = ?, updated = ? WHERE id = ?",
+                (mimetype, len(audio), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        """Mark the job as failed with an error message."""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                (error, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        row = self._connect().execute(
+            "SELECT id, status, segments_done, segments_total, mimetype, audio_bytes, error, created, updated "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if job['status'] == 'done':
+            job['progress'] = 1.0
+        else:
+            job['progress'] = job['segments_done'] / job['segments_total'] if job['segments_total'] else 0.0
+        return job
+
+    def audio_path(self, job_id):
+        """Return the path of the job's audio file."""
+        return os.path.join(self.audio_dir, job_id)
+
+    def count_pending(self):
+        """Return the number of queued jobs."""
+        return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def heartbeat(self, instance):
+        """Record that the jobs running in the given process are still being worked on."""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND instance = ?",
+                (time.time(), instance)
+            )
+
+    def requeue_orphans(self, stale_after):
+        """
+        Queue running jobs again whose heartbeat is older than stale_after seconds.
+
+        Their process has exited (e.g. in a restart) or stopped making progress.
+
+        Returns:
+            int: The number of jobs queued again.
+        """
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, instance = NULL, heartbeat = NULL, updated = ? "
+                "WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)",
+                (now, now - stale_after)
+            )
+        return cursor.rowcount
+
+    def purge(self, max_age_seconds):
+        """Delete finished and failed jobs (and their audio) older than max_age_seconds."""
+        cutoff = time.time() - max_age_seconds
+        db = self._connect()
+        rows = db.execute(
+            "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (cutoff,)
+        ).fetchall()
+        with db:
+            for row in rows:
+                db.execute("DELETE FROM jobs WHERE id = ?", (row['id'],))
+        for row in rows:
+            try:
+                os.remove(self.audio_path(row['id']))
+            except FileNotFoundError:
+                pass
+
+
+class JobQueue:
+    """
+    Runs stored jobs on a bounded pool of background threads.
+    """
+
+    def __init__(self, store, run_job, workers=DEFAULT_WORKERS, max_pending=DEFAULT_QUEUE_MAX,
+                 ttl_hours=DEFAULT_TTL_HOURS, poll_interval=1.0, heartbeat_seconds=DEFAULT_HEARTBEAT_SECONDS):
+        """
+        Args:
+            store (JobStore): Where jobs are recorded.
+            run_job (callable): run_job(params, report_progress) returning
+                (audio bytes, mimetype); report_progress(done, total) records progress.
+            workers (int): Jobs run concurrently by this process.
+            max_pending (int): Queued jobs accepted before submit() refuses more.
+            ttl_hours (float): How long finished jobs and their audio are kept.
+            poll_interval (float): Seconds between checks for jobs queued by other processes.
+            heartbeat_seconds (float): Seconds between heartbeats of running jobs; jobs
+                without one for STALE_HEARTBEATS intervals are queued again.
+        """
+        self.store = store
+        self.run_job = run_job
+        self.workers = max(1, int(workers))
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_hours * 3600
+        self.poll_interval = poll_interval
+        self.heartbeat_seconds = max(0.1, float(heartbeat_seconds))
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._pid = None
+        self._instance = None
+
+    @classmethod
+    def from_env(cls, run_job):
+        """Create a queue configured from the TTS_JOBS_DIR / TTS_JOB_* environment variables."""
+        return cls(
+            JobStore(os.environ.get('TTS_JOBS_DIR', DEFAULT_JOBS_DIR)),
+            run_job,
+            workers=int(os.environ.get('TTS_JOB_WORKERS', DEFAULT_WORKERS)),
+            max_pending=int(os.environ.get('TTS_JOB_QUEUE_MAX', DEFAULT_QUEUE_MAX)),
+            ttl_hours=float(os.environ.get('TTS_JOB_TTL_HOURS', DEFAULT_TTL_HOURS)),
+            heartbeat_seconds=float(os.environ.get('TTS_JOB_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS))
+        )
+
+    def submit(self, params):
+        """
+        Queue a job and return its id.
+
+        Raises:
+            JobQueueFull: If max_pending jobs are already waiting.
+        """
+        self.start()
+        self.store.purge(self.ttl_seconds)
+        if self.store.count_pending() >= self.max_pending:
+            raise JobQueueFull(f'{self.max_pending} jobs are already queued')
+
+        job_id = self.store.create(params)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def start(self):
+        """Start this process's worker threads (again after a fork) and resume interrupted jobs."""
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._instance = uuid.uuid4().hex
+            self.store.requeue_orphans(self.stale_after)
+            self._threads = [
+                threading.Thread(target=self._run_forever, name=f'job-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._heartbeat_forever, name='job-heartbeat', daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    @property
+    def stale_after(self):
+        return self.heartbeat_seconds * STALE_HEARTBEATS
+
+    def _heartbeat_forever(self):
+        instance = self._instance
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            try:
+                self.store.heartbeat(instance)
+                # Jobs of processes that died while this one runs are resumed here
+                if self.store.requeue_orphans(self.stale_after):
+                    with self._wakeup:
+                        self._wakeup.notify_all()
+            except sqlite3.Error:
+                # A busy database is retried on the next heartbeat
+                pass
+
+    def _run_forever(self):
+        instance = self._instance
+        while True:
+            try:
+                claimed = self.store.claim(instance)
+            except sqlite3.Error:
+                # A busy database is retried on the next poll; the thread must not die with it
+                claimed = None
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            job_id, params = claimed
+            try:
+                audio, mimetype = self.run_job(params, lambda done, total: self._progress(job_id, done, total))
+            except Exception as e:
+                self._record(job_id, self.store.fail, str(e))
+            else:
+                self._record(job_id, self.store.finish, audio, mimetype)
+
+    def _progress(self, job_id, done, total):
+        # Progress is informational; a busy database must not fail the job
+        try:
+            self.store.progress(job_id, done, total)
+        except sqlite3.Error:
+            pass
+
+    def _record(self, job_id, write, *args):
+        # Store a job's outcome, retrying a busy database on every poll until it is written
+        while True:
+            try:
+                write(job_id, *args)
+                return
+            except sqlite3.Error:
+                time.sleep(self.poll_interval)
+            except Exception as e:
+                # The audio could not be written (e.g. the disk is full)
+                write, args = self.store.fail, (str(e),)
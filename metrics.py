@@ -0,0 +1,373 @@
+"""
+Prometheus-style metrics shared by all worker processes.
+Each process keeps its counters, gauges and histograms in memory and writes
+them to <TTS_METRICS_DIR>/<pid>.json about once a second. The /metrics
+endpoint sums the files of all processes, so any gunicorn worker reports the
+totals of every worker. Gauges of processes that have exited are dropped;
+their counters and histograms are kept so totals never go backwards.
+"""
+
+import os
+import json
+import time
+import math
+import tempfile
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; files of exited processes are then never compacted
+    fcntl = None
+
+# Histogram buckets in seconds, from fast text processing to long syntheses
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Seconds between writes of this process's values (TTS_METRICS_FLUSH_SECONDS)
+DEFAULT_FLUSH_SECONDS = 1.0
+
+# Values of exited processes are merged into this file
+ARCHIVE_FILE = 'archived.json'
+
+
+def default_directory():
+    """Return TTS_METRICS_DIR, or a directory private to this process tree."""
+    return os.environ.get('TTS_METRICS_DIR') or os.path.join(
+        tempfile.gettempdir(), f'tts_metrics_{os.getpid()}')
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _sort_key(item):
+    # Group histogram samples by label set: buckets in numeric order, then _sum and _count
+    (family, sample, labels), _ = item
+    le = dict(labels).get('le')
+    base = tuple(label for label in labels if label[0] != 'le')
+    order = 0 if le is not None else (1 if sample.endswith('_sum') else 2)
+    return family, base, order, float(le) if le is not None else 0.0
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    """A metric family; values are kept by the registry keyed by sample name and labels."""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1.0, **labels):
+        self.registry._add(self.name, self.name, self._labels(labels), amount)
+
+    def set_total(self, value, **labels):
+        """Set the process total directly (for mirroring counters kept elsewhere)."""
+        self.registry._set(self.name, self.name, self._labels(labels), value)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; summed over live processes only."""
+
+    kind = 'gauge'
+
+    def inc(self, amount=1.0, **labels):
+        self.registry._add(self.name, self.name, self._labels(labels), amount)
+
+    def dec(self, amount=1.0, **labels):
+        self.registry._add(self.name, self.name, self._labels(labels), -amount)
+
+    def set(self, value, **labels):
+        self.registry._set(self.name, self.name, self._labels(labels), value)
+
+    @contextlib.contextmanager
+    def track(self, **labels):
+        """Count the duration of the block as one in progress."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        updates = [(self.name + '_bucket', labels + (('le', _format_value(bound)),), 1.0)
+                   for bound in self.buckets if value <= bound]
+        updates.append((self.name + '_sum', labels, value))
+        updates.append((self.name + '_count', labels, 1.0))
+        self.registry._add_many(self.name, updates)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, func, **labels):
+        """Wrap func so that every call's duration is observed."""
+        def wrapper(*args, **kwargs):
+            with self.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class Registry:
+    """
+    Metric families of this code base and this process's values.
+    """
+
+    def __init__(self, directory=None, flush_interval=DEFAULT_FLUSH_SECONDS):
+        """
+        Args:
+            directory (str): Directory shared by all worker processes.
+            flush_interval (float): Seconds between writes of this process's values.
+        """
+        self.directory = directory or default_directory()
+        self.flush_interval = flush_interval
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._families = {}
+        self._collectors = []
+        self._ratios = []
+        self._lock = threading.Lock()
+        self._values = {}
+        self._dirty = False
+        self._pid = None
+        self._flusher = None
+
+    @classmethod
+    def from_env(cls):
+        """Create a registry configured from TTS_METRICS_DIR and TTS_METRICS_FLUSH_SECONDS."""
+        return cls(flush_interval=float(os.environ.get('TTS_METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Call collector() before every flush, e.g. to mirror counters kept by another object."""
+        self._collectors.append(collector)
+
+    def add_ratio(self, name, documentation, hits, misses):
+        """Expose hits / (hits + misses) over all processes as a gauge (e.g. a cache hit ratio)."""
+        self._ratios.append((name, documentation, hits, misses))
+
+    def _register(self, metric):
+        self._families[metric.name] = metric
+        return metric
+
+    def _add(self, family, sample, labels, amount):
+        self._add_many(family, [(sample, labels, amount)])
+
+    def _add_many(self, family, updates):
+        self._ensure_flusher()
+        with self._lock:
+            for sample, labels, amount in updates:
+                key = (family, sample, labels)
+                self._values[key] = self._values.get(key, 0.0) + amount
+            self._dirty = True
+
+    def _set(self, family, sample, labels, value):
+        self._ensure_flusher()
+        with self._lock:
+            self._values[(family, sample, labels)] = value
+            self._dirty = True
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork, so start one per process
+        if self._flusher is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is None or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    # Values inherited through fork belong to the parent
+                    self._values = {}
+                    self._pid = os.getpid()
+                self._flusher = threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True)
+                self._flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                # A full or read-only disk must not break request handling
+                pass
+
+    def flush(self):
+        """Write this process's values to its file."""
+        for collector in self._collectors:
+            collector()
+
+        with self._lock:
+            if not self._dirty:
+                return
+            samples = [[family, sample, [list(label) for label in labels], value]
+                       for (family, sample, labels), value in self._values.items()]
+            self._dirty = False
+
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'samples': samples}, f)
+        os.replace(temp_path, path)
+
+    def _read_files(self):
+        """Return (pid, samples) of every process file and the archive."""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Being replaced or removed concurrently
+                continue
+            files.append((name, data.get('pid'), data.get('samples', [])))
+        return files
+
+    def _compact(self):
+        """Merge the counters and histograms of exited processes into the archive file."""
+        if fcntl is None:
+            return
+        lock_path = os.path.join(self.directory, '.lock')
+        with open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            files = self._read_files()
+            dead = [(name, samples) for name, pid, samples in files
+                    if pid is not None and not _process_alive(pid)]
+            if not dead:
+                return
+
+            totals = {}
+            for name, pid, samples in files:
+                if name == ARCHIVE_FILE:
+                    for family, sample, labels, value in samples:
+                        key = (family, sample, tuple(tuple(label) for label in labels))
+                        totals[key] = totals.get(key, 0.0) + value
+            for name, samples in dead:
+                for family, sample, labels, value in samples:
+                    metric = self._families.get(family)
+                    if metric is None or metric.kind == 'gauge':
+                        continue
+                    key = (family, sample, tuple(tuple(label) for label in labels))
+                    totals[key] = totals.get(key, 0.0) + value
+
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            with open(archive_path + '.tmp', 'w') as f:
+                json.dump({'pid': None, 'samples': [[family, sample, [list(label) for label in labels], value]
+                                                    for (family, sample, labels), value in totals.items()]}, f)
+            os.replace(archive_path + '.tmp', archive_path)
+            for name, _ in dead:
+                os.remove(os.path.join(self.directory, name))
+
+    def collect(self):
+        """
+        Return the values of all processes summed per sample.
+
+        Returns:
+            dict: {(family, sample, labels): value}
+        """
+        self.flush()
+        self._compact()
+
+        totals = {}
+        for name, pid, samples in self._read_files():
+            alive = pid is None or _process_alive(pid)
+            for family, sample, labels, value in samples:
+                metric = self._families.get(family)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                key = (family, sample, tuple(tuple(label) for label in labels))
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        totals = self.collect()
+        by_family = {}
+        for (family, sample, labels), value in sorted(totals.items(), key=_sort_key):
+            by_family.setdefault(family, []).append((sample, labels, value))
+
+        lines = []
+        for name, metric in self._families.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample, labels, value in by_family.get(name, []):
+                lines.append(f'{sample}{_format_labels(labels)} {_format_value(value)}')
+
+        for name, documentation, hits, misses in self._ratios:
+            hit_total = sum(value for (family, _, _), value in totals.items() if family == hits)
+            miss_total = sum(value for (family, _, _), value in totals.items() if family == misses)
+            lookups = hit_total + miss_total
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_format_value(hit_total / lookups if lookups else 0.0)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def reset_directory(directory):
+    """Remove the files of a previous run (call once before the workers start)."""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.json') or name.endswith('.tmp'):
+            os.remove(os.path.join(directory, name))
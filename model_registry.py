@@ -0,0 +1,196 @@
+"""
+Registry of loaded Coqui TTS synthesizers.
+Synthesizers are keyed by (model, vocoder) and kept resident within a memory
+budget. The least recently used ones are evicted first, and concurrent
+requests for a model that is still loading wait for that single load.
+Coqui models keep decoder state on the module between steps, so every
+synthesizer comes with a lock that inference holds while it uses the model.
+"""
+
+import gc
+import os
+import time
+import weakref
+import threading
+from collections import OrderedDict
+
+# Default memory budget for resident models (override with TTS_MODEL_MEMORY_MB)
+DEFAULT_MEMORY_MB = 2048
+
+
+def estimate_synthesizer_bytes(synthesizer):
+    """
+    Estimate the memory held by a synthesizer's TTS and vocoder weights.
+
+    Returns:
+        int: Bytes of parameters and buffers.
+    """
+    total = 0
+    for attribute in ('tts_model', 'vocoder_model'):
+        model = getattr(synthesizer, attribute, None)
+        if model is None or not hasattr(model, 'parameters'):
+            continue
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class _PendingLoad:
+    """A load in progress that other requests for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.synthesizer = None
+        self.error = None
+
+
+class ModelRegistry:
+    """
+    LRU registry of synthesizers with load-in-progress deduplication.
+    """
+
+    def __init__(self, loader, memory_bytes=DEFAULT_MEMORY_MB * 1024 * 1024,
+                 size_func=estimate_synthesizer_bytes):
+        """
+        Args:
+            loader (callable): loader(model_name, vocoder_name) returning a synthesizer or None.
+            memory_bytes (int): Budget for all resident synthesizers.
+            size_func (callable): Returns the memory held by a synthesizer.
+        """
+        self.loader = loader
+        self.memory_bytes = memory_bytes
+        self.size_func = size_func
+
+        self._lock = threading.Lock()
+        self._resident = OrderedDict()
+        self._pending = {}
+        # Kept for as long as the synthesizer lives, so requests still using an evicted one share its lock
+        self._inference_locks = weakref.WeakKeyDictionary()
+        self._stats = {'hits': 0, 'loads': 0, 'load_failures': 0, 'evictions': 0, 'deduplicated_loads': 0}
+
+    @classmethod
+    def from_env(cls, loader):
+        """Create a registry whose budget comes from TTS_MODEL_MEMORY_MB."""
+        memory_mb = float(os.environ.get('TTS_MODEL_MEMORY_MB', DEFAULT_MEMORY_MB))
+        return cls(loader, memory_bytes=int(memory_mb * 1024 * 1024))
+
+    def get(self, model_name, vocoder_name=None):
+        """
+        Return the synthesizer for (model, vocoder), loading it if needed.
+
+        Returns:
+            Synthesizer: The loaded synthesizer, or None if loading failed.
+        """
+        key = (model_name, vocoder_name)
+
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is not None:
+                self._resident.move_to_end(key)
+                entry['last_used'] = time.time()
+                entry['requests'] += 1
+                self._stats['hits'] += 1
+                return entry['synthesizer']
+
+            pending = self._pending.get(key)
+            is_loader = pending is None
+            if is_loader:
+                pending = self._pending[key] = _PendingLoad()
+            else:
+                self._stats['deduplicated_loads'] += 1
+
+        if not is_loader:
+            # Another request is already loading this model
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.synthesizer
+
+        try:
+            started = time.time()
+            synthesizer = self.loader(model_name, vocoder_name)
+            pending.synthesizer = synthesizer
+            if synthesizer is not None:
+                size = self.size_func(synthesizer)
+                self._add(key, synthesizer, size, time.time() - started)
+            else:
+                with self._lock:
+                    self._stats['load_failures'] += 1
+            return synthesizer
+        except Exception as e:
+            pending.error = e
+            with self._lock:
+                self._stats['load_failures'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def inference_lock(self, synthesizer):
+        """
+        Return the lock to hold while running inference on a synthesizer.
+
+        Returns:
+            threading.Lock: The same lock for every caller of one synthesizer.
+        """
+        with self._lock:
+            lock = self._inference_locks.get(synthesizer)
+            if lock is None:
+                lock = self._inference_locks[synthesizer] = threading.Lock()
+            return lock
+
+    def residency(self):
+        """Return the resident models, memory usage and counters."""
+        with self._lock:
+            models = [
+                {
+                    'model': key[0],
+                    'vocoder': key[1],
+                    'bytes': entry['bytes'],
+                    'load_seconds': round(entry['load_seconds'], 3),
+                    'loaded_at': entry['loaded_at'],
+                    'last_used': entry['last_used'],
+                    'requests': entry['requests'],
+                }
+                # Most recently used first
+                for key, entry in reversed(self._resident.items())
+            ]
+            loading = [{'model': key[0], 'vocoder': key[1]} for key in self._pending]
+            stats = dict(self._stats)
+
+        return {
+            'models': models,
+            'loading': loading,
+            'memory_budget_bytes': self.memory_bytes,
+            'memory_used_bytes': sum(model['bytes'] for model in models),
+            'stats': stats,
+        }
+
+    def _add(self, key, synthesizer, size, load_seconds):
+        now = time.time()
+        evicted = []
+        with self._lock:
+            self._resident[key] = {
+                'synthesizer': synthesizer,
+                'bytes': size,
+                'load_seconds': load_seconds,
+                'loaded_at': now,
+                'last_used': now,
+                'requests': 1,
+            }
+            self._stats['loads'] += 1
+
+            # Evict least recently used models, but always keep the one just loaded
+            used = sum(entry['bytes'] for entry in self._resident.values())
+            while used > self.memory_bytes and len(self._resident) > 1:
+                _, entry = self._resident.popitem(last=False)
+                used -= entry['bytes']
+                evicted.append(entry)
+                self._stats['evictions'] += 1
+
+        if evicted:
+            # Requests still using an evicted synthesizer keep their reference;
+            # the weights are freed once they finish
+            del evicted
+            gc.collect()
@@ -0,0 +1,267 @@
+"""
+Per-client rate limiting with token buckets shared by all worker processes.
+Every client (an API key listed in TTS_API_KEYS, otherwise the client IP) has
+a bucket of TTS_RATE_LIMIT_BURST tokens that refills at
+TTS_RATE_LIMIT_PER_MINUTE. Each request takes a token (a batch one per item);
+a client with an empty bucket gets 429 with Retry-After until it has refilled.
+A request costing more than the whole bucket is refused with 413, and a 304
+revalidation gives its token back. Buckets live in a small SQLite database
+(in /dev/shm where available), so all gunicorn workers on a machine enforce
+one limit per client.
+"""
+
+import os
+import math
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import functools
+
+from flask import request, jsonify, make_response
+
+# Defaults (override with TTS_RATE_LIMIT_PER_MINUTE / TTS_RATE_LIMIT_BURST / TTS_RATE_LIMIT_DIR).
+# Off unless a rate is set: behind a proxy every client has the proxy's address
+# until TTS_TRUSTED_PROXIES is configured
+DEFAULT_PER_MINUTE = 0.0
+DEFAULT_BURST = 20
+
+# Number of reverse proxies in front of the server that append to X-Forwarded-For (TTS_TRUSTED_PROXIES)
+DEFAULT_TRUSTED_PROXIES = 0
+
+# Full buckets are deleted every this many requests
+PURGE_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    client TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def default_directory():
+    """Return a RAM-backed directory when the system has one, otherwise the temp directory."""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm/tts_rate_limit'
+    return os.path.join(tempfile.gettempdir(), 'tts_rate_limit')
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets per client, stored in SQLite so that processes share them.
+    """
+
+    def __init__(self, directory=None, per_minute=DEFAULT_PER_MINUTE, burst=DEFAULT_BURST,
+                 api_keys=(), trusted_proxies=DEFAULT_TRUSTED_PROXIES):
+        """
+        Args:
+            directory (str): Directory of the bucket database (shared by the workers).
+            per_minute (float): Tokens added to each bucket per minute (0 disables rate limiting).
+            burst (int): Bucket size, i.e. requests a client may send at once.
+            api_keys (iterable): API keys that get their own bucket when sent as X-API-Key.
+            trusted_proxies (int): Proxies whose X-Forwarded-For entries identify the client.
+        """
+        self.rate = max(0.0, float(per_minute)) / 60.0
+        self.burst = max(1, int(burst))
+        self.api_keys = frozenset(api_keys)
+        self.trusted_proxies = max(0, int(trusted_proxies))
+
+        self.directory = directory or default_directory()
+        self.path = os.path.join(self.directory, 'buckets.sqlite3')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._stats = {'allowed': 0, 'limited': 0, 'store_errors': 0}
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._connect().executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        """Create a limiter configured from the TTS_RATE_LIMIT_* variables, TTS_API_KEYS and TTS_TRUSTED_PROXIES."""
+        return cls(
+            directory=os.environ.get('TTS_RATE_LIMIT_DIR') or None,
+            per_minute=float(os.environ.get('TTS_RATE_LIMIT_PER_MINUTE', DEFAULT_PER_MINUTE)),
+            burst=int(os.environ.get('TTS_RATE_LIMIT_BURST', DEFAULT_BURST)),
+            api_keys=[key.strip() for key in os.environ.get('TTS_API_KEYS', '').split(',') if key.strip()],
+            trusted_proxies=int(os.environ.get('TTS_TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES))
+        )
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _connect(self):
+        # One connection per thread (and per process, after fork)
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            # Autocommit mode; _update() manages its own transaction
+            db = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            # Bucket state does not need to survive a power loss
+            db.execute("PRAGMA synchronous=OFF")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def client_key(self, headers, remote_addr):
+        """
+        Identify the client of a request.
+
+        A known API key in X-API-Key identifies the client; otherwise its IP
+        address does. Behind proxies, the address the nearest trusted proxy
+        saw is taken from X-Forwarded-For (entries further left can be forged).
+
+        Args:
+            headers: The request headers (any case-insensitive mapping, Flask or Starlette).
+            remote_addr (str): Address of the connection's peer.
+        """
+        api_key = headers.get('X-API-Key')
+        if api_key and api_key in self.api_keys:
+            return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+
+        if self.trusted_proxies:
+            forwarded = [address.strip() for address in headers.get('X-Forwarded-For', '').split(',')
+                         if address.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return 'ip:' + forwarded[-self.trusted_proxies]
+        return 'ip:' + (remote_addr or 'unknown')
+
+    def take(self, client, cost=1):
+        """
+        Take cost tokens from the client's bucket if it holds enough.
+
+        Returns:
+            dict: allowed (bool), remaining (int) tokens, retry_after (int)
+            seconds until the request would be allowed, reset (int) seconds
+            until the bucket is full again.
+        """
+        now = time.time()
+        try:
+            tokens = self._update(client, now, lambda tokens: tokens - cost if tokens >= cost else tokens)
+        except sqlite3.Error:
+            # A broken or locked store must not take the API down; let the request through
+            with self._lock:
+                self._stats['store_errors'] += 1
+            return {'allowed': True, 'remaining': self.burst, 'retry_after': 0, 'reset': 0}
+        allowed = tokens[0] >= cost
+
+        with self._lock:
+            self._stats['allowed' if allowed else 'limited'] += 1
+            self._calls += 1
+            purge = self._calls % PURGE_EVERY == 0
+        if purge:
+            self._purge(now)
+
+        return self._decision(allowed, tokens[1], cost)
+
+    def refund(self, client, cost=1):
+        """
+        Give back tokens taken for a request that turned out to cost nothing (e.g. a 304 revalidation).
+
+        Returns:
+            dict: The client's bucket as a decision of take(), or None if the store failed.
+        """
+        try:
+            tokens = self._update(client, time.time(), lambda tokens: min(self.burst, tokens + cost))
+        except sqlite3.Error:
+            with self._lock:
+                self._stats['store_errors'] += 1
+            return None
+        return self._decision(True, tokens[1], cost)
+
+    def _update(self, client, now, change):
+        # Refill the bucket up to now and store change(tokens); returns the tokens before and after the change
+        db = self._connect()
+        # BEGIN IMMEDIATE takes the write lock, so concurrent workers cannot spend the same tokens
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE client = ?", (client,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            changed = change(tokens)
+            db.execute("INSERT OR REPLACE INTO buckets (client, tokens, updated) VALUES (?, ?, ?)",
+                       (client, changed, now))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return tokens, changed
+
+    def _decision(self, allowed, tokens, cost):
+        return {
+            'allowed': allowed,
+            'remaining': int(tokens),
+            'retry_after': 0 if allowed else math.ceil((cost - tokens) / self.rate),
+            'reset': math.ceil((self.burst - tokens) / self.rate),
+        }
+
+    def _purge(self, now):
+        # Buckets untouched for longer than a full refill are full; dropping them changes nothing
+        try:
+            self._connect().execute("DELETE FROM buckets WHERE updated < ?", (now - self.burst / self.rate,))
+        except sqlite3.Error:
+            pass
+
+    def headers(self, decision):
+        """Return the X-RateLimit headers for a decision of take()."""
+        headers = {
+            'X-RateLimit-Limit': str(self.burst),
+            'X-RateLimit-Remaining': str(decision['remaining']),
+            'X-RateLimit-Reset': str(decision['reset']),
+        }
+        if not decision['allowed']:
+            headers['Retry-After'] = str(max(1, decision['retry_after']))
+        return headers
+
+    def limit(self, cost=None):
+        """
+        Decorator for views: take tokens before the view runs and add the X-RateLimit headers.
+
+        Requests costing more than the bucket size are refused with 413, and the
+        tokens of a 304 response are given back.
+
+        Args:
+            cost (callable): Returns the tokens the current request takes (1 if not given),
+                e.g. the number of items in a batch.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+
+                tokens = max(1, cost()) if cost else 1
+                if tokens > self.burst:
+                    # Could never be allowed, however long the client waits
+                    with self._lock:
+                        self._stats['limited'] += 1
+                    return jsonify({
+                        'error': f'Request needs {tokens} rate limit tokens but at most {self.burst} can be '
+                                 f'spent at once; split it into requests of at most {self.burst} items'
+                    }), 413, {'X-RateLimit-Limit': str(self.burst)}
+
+                client = self.client_key(request.headers, request.remote_addr)
+                decision = self.take(client, tokens)
+                if not decision['allowed']:
+                    return jsonify({'error': 'Rate limit exceeded, please retry later'}), 429, self.headers(decision)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 304:
+                    # Revalidations send no audio, so they do not count against the limit
+                    decision = self.refund(client, tokens) or decision
+                response.headers.update(self.headers(decision))
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Return allowed and limited request counters of this process and the configuration."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['per_minute'] = self.rate * 60.0
+        stats['burst'] = self.burst
+        return stats
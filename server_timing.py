@@ -0,0 +1,120 @@
+"""
+Server-Timing header for synthesis requests.
+Stages of a request (text enhancement, cache lookup, synthesis, encoding) are
+timed into the request context and sent as a Server-Timing header, so browser
+devtools and frontend telemetry can see where the time went. Stages run
+outside a request (background jobs, batch items) are not recorded. Servers
+without a Flask request context keep a RequestTimings per request instead.
+"""
+
+import os
+import time
+import threading
+import contextlib
+from collections import OrderedDict
+
+from flask import g, has_request_context
+
+# Set TTS_SERVER_TIMING=0 to send no timing information
+SERVER_TIMING = os.environ.get('TTS_SERVER_TIMING', '1') != '0'
+
+# Stage names in the order they are reported
+STAGES = ('enhance', 'cache', 'queue', 'synth', 'encode')
+
+
+class RequestTimings:
+    """Accumulated stage durations of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Add the duration of the block to the named stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def durations_ms(self):
+        """Return milliseconds per stage, in STAGES order, plus "total"."""
+        with self.lock:
+            durations = dict(self.durations)
+        ordered = [name for name in STAGES if name in durations] + \
+                  [name for name in durations if name not in STAGES]
+        result = OrderedDict((name, round(durations[name] * 1000.0, 3)) for name in ordered)
+        result['total'] = round((time.perf_counter() - self.started) * 1000.0, 3)
+        return result
+
+    def header(self):
+        """Return the Server-Timing header value."""
+        return ', '.join(f'{name};dur={ms}' for name, ms in self.durations_ms().items())
+
+
+def _current():
+    if not SERVER_TIMING or not has_request_context():
+        return None
+    timings = g.get('_server_timing')
+    if timings is None:
+        timings = g._server_timing = RequestTimings()
+    return timings
+
+
+def start():
+    """Start timing the current request (the total is measured from here)."""
+    _current()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Add the duration of the block to the named stage of the current request."""
+    timings = _current()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def timed(func, name):
+    """Wrap func so that every call is added to the named stage."""
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def durations_ms():
+    """
+    Return the stage durations of the current request so far.
+
+    Returns:
+        dict: Milliseconds per stage plus "total", or None when timing is off.
+    """
+    timings = _current()
+    if timings is None:
+        return None
+    return timings.durations_ms()
+
+
+def add_header(response):
+    """
+    Set the Server-Timing header of a response from the current request's stages.
+
+    Streamed responses are sent before synthesis finishes, so their header only
+    covers the work done before the first chunk.
+    """
+    timings = _current()
+    if timings is None:
+        return response
+    response.headers['Server-Timing'] = timings.header()
+    # Lets cross-origin pages read the timings through the Resource Timing API
+    response.headers['Timing-Allow-Origin'] = '*'
+    return response
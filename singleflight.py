@@ -0,0 +1,154 @@
+"""
+Single-flight coalescing of identical synthesis requests.
+Concurrent calls with the same key share one execution: the first caller runs
+it and the others wait for its result. Optionally, a lock file per key extends
+this across processes (e.g. gunicorn workers): a worker that finds the key
+locked waits for the lock and then re-checks the shared audio cache instead of
+synthesizing the same audio again.
+"""
+
+import os
+import errno
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; coalescing stays within the process
+    fcntl = None
+
+
+class _Call:
+    """An execution in progress that other callers with the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one execution per key at a time and shares its result.
+    """
+
+    def __init__(self, lock_dir=None):
+        """
+        Args:
+            lock_dir (str): Directory for cross-process lock files (None keeps
+                coalescing within the process).
+        """
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'executions': 0, 'coalesced': 0, 'cross_process_waits': 0, 'cross_process_hits': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Create a single-flight group; TTS_SINGLEFLIGHT_DIR enables cross-process locking."""
+        return cls(lock_dir=os.environ.get('TTS_SINGLEFLIGHT_DIR') or None)
+
+    def do(self, key, func, recheck=None):
+        """
+        Run func() for key unless an identical call is already running, and return its result.
+
+        Args:
+            key (str): Identifies identical work (e.g. an audio cache key).
+            func (callable): Produces the result.
+            recheck (callable): With cross-process locking, called after the
+                lock is acquired; a non-None return value is used instead of
+                running func() (e.g. audio another worker just cached).
+
+        Raises:
+            Exception: Whatever func() raised, in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, func, recheck)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Return execution and coalescing counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        stats['cross_process'] = self.lock_dir is not None
+        return stats
+
+    def _run(self, key, func, recheck):
+        if self.lock_dir is None:
+            return self._execute(func)
+
+        with self._file_lock(key):
+            # Another worker may have produced the result while we waited
+            if recheck is not None:
+                result = recheck()
+                if result is not None:
+                    with self._lock:
+                        self._stats['cross_process_hits'] += 1
+                    return result
+            return self._execute(func)
+
+    def _execute(self, func):
+        with self._lock:
+            self._stats['executions'] += 1
+        return func()
+
+    @contextlib.contextmanager
+    def _file_lock(self, key):
+        path = os.path.join(self.lock_dir, key + '.lock')
+        while True:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    os.close(fd)
+                    raise
+                with self._lock:
+                    self._stats['cross_process_waits'] += 1
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+            # The previous holder removes the file before unlocking; if it did,
+            # our lock is on an orphaned file and we have to start over
+            try:
+                current = os.stat(path).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                break
+            os.close(fd)
+
+        try:
+            yield
+        finally:
+            # Remove the file while still holding the lock so lock files do not accumulate
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            os.close(fd)
@@ -0,0 +1,152 @@
+"""
+Text enhancement engine shared by the TTS servers.
+All rules are compiled once at import time, and rule tables that used to run
+as one re.sub pass per rule are combined into a single alternation pass. The
+output is identical to the original per-request add_natural_pauses/apply_emotion.
+"""
+
+import re
+
+# Comma before conjunctions that don't have one yet. Equivalent to
+# r'([^\s,])(\s+)(and|...)(\s+)', but anchored on the whitespace so the scan
+# fails fast on ordinary characters; the preceding character is checked by lookbehind.
+CONJUNCTION_RE = re.compile(r'(\s)(?<=[^\s,]\s)(\s*)(and|but|or|because|however|therefore)(\s+)')
+
+# Sentence split that keeps the punctuation as separate items
+SENTENCE_SPLIT_RE = re.compile(r'([.!?])')
+
+# Sentences longer than this get a pause in the middle
+LONG_SENTENCE_CHARS = 100
+
+# Friendly emotion
+FRIENDLY_GREETINGS = ["Hi there! ", "Hello! ", "Great to meet you! "]
+FRIENDLY_ENDINGS = [" That's all for now!", " Thanks for listening!", " Hope that helps!"]
+GREETING_RE = re.compile(r'(hi|hello|hey|greetings)')
+GREETING_PREFIX_CHARS = len('greetings')
+ENDING_WORDS = ('thanks', 'thank you', 'cheers', 'goodbye', 'bye')
+ENDING_SUFFIX_CHARS = len('thank you')
+POSITIVE_RE = re.compile(r'\b(great|good|excellent|amazing|wonderful|fantastic)\b', re.IGNORECASE)
+
+# Professional emotion: (pattern, replacement) applied as one alternation
+PROFESSIONAL_RULES = [
+    ('kind of', 'somewhat'),
+    ('a lot', 'significantly'),
+    ('get', 'obtain'),
+    ('use', 'utilize'),
+    ('start', 'commence'),
+    ('end', 'conclude'),
+    ('find out', 'determine'),
+    ('look at', 'examine'),
+    ('talk about', 'discuss')
+]
+
+# Enthusiastic emotion
+ENTHUSIASTIC_RULES = [
+    ('good|great', 'fantastic'),
+    ('like|enjoy', 'love'),
+    ('interesting', 'fascinating'),
+    ('important', 'crucial')
+]
+ENTHUSIASTIC_INTERJECTIONS = ["Wow! ", "Amazing! ", "Incredible! ", "Excellent! "]
+
+
+def _compile_rules(rules):
+    """
+    Combine word rules into one case-insensitive pattern.
+
+    Each rule gets its own capturing group so the replacement is picked by
+    group index, which matches exactly what the rule's own pattern matched.
+    None of the rules overlap or produce text another rule matches, so one
+    pass gives the same result as applying the rules one after another.
+    """
+    pattern = re.compile(
+        r'\b(?:' + '|'.join(f'({words})' for words, _ in rules) + r')\b',
+        re.IGNORECASE
+    )
+    replacements = [replacement for _, replacement in rules]
+    return pattern, lambda match: replacements[match.lastindex - 1]
+
+
+PROFESSIONAL_RE, _professional_replacement = _compile_rules(PROFESSIONAL_RULES)
+ENTHUSIASTIC_RE, _enthusiastic_replacement = _compile_rules(ENTHUSIASTIC_RULES)
+
+
+def _split_long_sentence(sentence):
+    words = sentence.split()
+    mid = len(words) // 2
+    return f"{' '.join(words[:mid])}, {' '.join(words[mid:])}"
+
+
+def add_natural_pauses(text):
+    """
+    Enhance text with natural pauses to make speech sound more human-like.
+    """
+    # Add slight pauses after punctuation
+    text = text.replace('.', '. ').replace('!', '! ').replace('?', '? ')
+
+    # Add commas before conjunctions if there aren't enough already (roughly one per 50 chars)
+    if text.count(',') < len(text) / 50:
+        text = CONJUNCTION_RE.sub(r',\1\2\3\4', text)
+
+    # Split into (sentence, punctuation) pairs plus a trailing remainder
+    parts = SENTENCE_SPLIT_RE.split(text)
+    enhanced_sentences = [
+        _split_long_sentence(sentence) if len(sentence) > LONG_SENTENCE_CHARS else sentence
+        for sentence in map(str.__add__, parts[0::2], parts[1::2])
+    ]
+    if parts[-1].strip():
+        enhanced_sentences.append(parts[-1])
+
+    return ' '.join(enhanced_sentences)
+
+
+def _has_friendly_ending(text):
+    # Skip trailing whitespace and sentence punctuation, then check the last word(s)
+    end = len(text)
+    while end and (text[end - 1] in '.!?' or text[end - 1].isspace()):
+        end -= 1
+    return text[max(0, end - ENDING_SUFFIX_CHARS):end].lower().endswith(ENDING_WORDS)
+
+
+def apply_emotion(text, emotion):
+    """
+    Modify text to convey different emotions through speech patterns.
+    """
+    if emotion == 'friendly':
+        # Add a greeting if the text doesn't already have one
+        if not GREETING_RE.match(text[:GREETING_PREFIX_CHARS].lower()):
+            text = FRIENDLY_GREETINGS[len(text) % len(FRIENDLY_GREETINGS)] + text
+
+        # Add an ending if the text doesn't already have one
+        if not _has_friendly_ending(text):
+            text = text + FRIENDLY_ENDINGS[len(text) % len(FRIENDLY_ENDINGS)]
+
+        # Add emphasis on positive words
+        return POSITIVE_RE.sub(r'really \1', text)
+
+    elif emotion == 'professional':
+        # Replace casual phrases with more formal ones
+        return PROFESSIONAL_RE.sub(_professional_replacement, text)
+
+    elif emotion == 'enthusiastic':
+        # Add exclamation points to sentences that don't have them
+        text = text.replace('. ', '! ')
+
+        # Add emphasis words
+        text = ENTHUSIASTIC_RE.sub(_enthusiastic_replacement, text)
+
+        # Add enthusiastic interjections
+        if len(text) > 100 and '!' not in text[:50]:
+            text = ENTHUSIASTIC_INTERJECTIONS[len(text) % len(ENTHUSIASTIC_INTERJECTIONS)] + text
+
+        return text
+
+    # Neutral and unknown emotions leave the text unchanged
+    return text
+
+
+def enhance_text(text, emotion='neutral'):
+    """
+    Add natural pauses and apply an emotion in one call.
+    """
+    return apply_emotion(add_natural_pauses(text), emotion)
@@ -0,0 +1,106 @@
+"""
+Batched synthesis for Coqui TTS synthesizers.
+Synthesizer.tts() runs one text through the acoustic model and the vocoder.
+The acoustic model still runs sentence by sentence (Tacotron's decoder
+decides per sentence when to stop), but the vocoder is a convolutional
+network over the mel spectrogram. So the mels of all sentences of a batch
+are padded to the same length and vocoded in one forward pass, and each
+sentence's waveform is cut back to its own length.
+
+Models this does not apply to (Griffin-Lim without a vocoder, multi-speaker
+or multi-language models, XTTS, other vocoder architectures, a vocoder with
+another sample rate) run synthesizer.tts() once per text instead.
+"""
+
+import numpy as np
+import torch
+from TTS.tts.utils.synthesis import synthesis, trim_silence
+
+# Vocoder generators without recurrent or attention layers, where padding one item does not change another
+BATCHED_GENERATORS = {'HifiganGenerator', 'MelganGenerator', 'MultibandMelganGenerator', 'FullbandMelganGenerator'}
+
+# Silence Synthesizer.tts() appends after every sentence, in samples
+SENTENCE_GAP = 10000
+
+
+def can_batch(synthesizer):
+    """Return whether the synthesizer's vocoder can run several sentences in one pass."""
+    tts_model = synthesizer.tts_model
+    vocoder_model = synthesizer.vocoder_model
+    if vocoder_model is None or hasattr(tts_model, 'synthesize'):
+        return False
+    # Speakers and languages are chosen per request, which a batch of plain texts does not carry
+    if synthesizer.tts_speakers_file or getattr(tts_model, 'speaker_manager', None) is not None:
+        return False
+    if synthesizer.tts_languages_file or getattr(tts_model, 'language_manager', None) is not None:
+        return False
+    if synthesizer.vocoder_config['audio']['sample_rate'] != tts_model.ap.sample_rate:
+        return False
+    return type(getattr(vocoder_model, 'model_g', None)).__name__ in BATCHED_GENERATORS
+
+
+def synthesize_texts(synthesizer, texts):
+    """
+    Synthesize several texts, vocoding all their sentences in one pass.
+
+    Args:
+        synthesizer (Synthesizer): Coqui synthesizer the texts were submitted for.
+        texts (list): Texts to synthesize.
+
+    Returns:
+        list: One waveform per text, as synthesizer.tts() returns it.
+    """
+    if len(texts) < 2 or not can_batch(synthesizer):
+        return [synthesizer.tts(text) for text in texts]
+
+    sentences = [synthesizer.split_into_sentences(text) for text in texts]
+    mels = [sentence_mel(synthesizer, sentence) for text_sentences in sentences for sentence in text_sentences]
+    waveforms = iter(vocode(synthesizer, mels))
+
+    audio_config = synthesizer.tts_config.audio
+    do_trim_silence = "do_trim_silence" in audio_config and audio_config["do_trim_silence"]
+    results = []
+    for text_sentences in sentences:
+        wav = []
+        for _ in text_sentences:
+            waveform = next(waveforms)
+            if do_trim_silence:
+                waveform = trim_silence(waveform, synthesizer.tts_model.ap)
+            wav += list(waveform)
+            wav += [0] * SENTENCE_GAP
+        results.append(wav)
+    return results
+
+
+def sentence_mel(synthesizer, sentence):
+    """Run the acoustic model on one sentence and return its mel spectrogram normalized for the vocoder."""
+    outputs = synthesis(model=synthesizer.tts_model, text=sentence, CONFIG=synthesizer.tts_config,
+                        use_cuda=synthesizer.use_cuda, use_griffin_lim=False)
+    mel = outputs["outputs"]["model_outputs"][0].detach().cpu().numpy()
+    # Denormalize with the TTS model's audio config and renormalize with the vocoder's, as tts() does
+    mel = synthesizer.tts_model.ap.denormalize(mel.T).T
+    return synthesizer.vocoder_ap.normalize(mel.T)
+
+
+def vocode(synthesizer, mels):
+    """
+    Vocode mel spectrograms of different lengths in one forward pass.
+
+    Args:
+        mels (list): [channels, frames] arrays.
+
+    Returns:
+        list: One waveform (numpy array) per mel spectrogram.
+    """
+    frames = max(mel.shape[1] for mel in mels)
+    # Repeating the last frame continues each sentence the way the generators pad their input themselves;
+    # only the samples made from that padding (after the sentence's last frame) differ from a pass of its own
+    batch = np.stack([np.pad(mel, ((0, 0), (0, frames - mel.shape[1])), mode='edge') for mel in mels])
+    device = next(synthesizer.vocoder_model.parameters()).device
+    output = synthesizer.vocoder_model.inference(torch.from_numpy(batch).float().to(device))
+    output = output.cpu().numpy().reshape(len(mels), -1)
+
+    # Generators that pad their input add the same number of samples to every item
+    hop_length = synthesizer.vocoder_ap.hop_length
+    extra = output.shape[1] - frames * hop_length
+    return [output[index, :mel.shape[1] * hop_length + extra] for index, mel in enumerate(mels)]
@@ -0,0 +1,93 @@
+"""
+16-bit PCM WAV encoding of synthesized waveforms.
+Coqui TTS returns float samples in [-1, 1] (as a list); they are converted to
+little-endian int16 in one vectorized NumPy pass and written after a fixed
+44-byte header, so the body can be streamed in chunks without further copies.
+"""
+
+import struct
+
+import numpy as np
+
+# Size of the body chunks yielded by iter_wav()
+DEFAULT_CHUNK_BYTES = 64 * 1024
+
+# RIFF/data size used when the length is not known yet (streaming)
+UNKNOWN_SIZE = 0xFFFFFFFF
+
+SAMPLE_WIDTH = 2
+
+
+def to_pcm16(waveform):
+    """
+    Convert float samples to clipped little-endian int16 PCM.
+
+    Args:
+        waveform (list or numpy.ndarray): Samples in [-1, 1].
+
+    Returns:
+        numpy.ndarray: The int16 samples.
+    """
+    # One float32 working copy (the caller's array is never modified), scaled
+    # and clipped in place, then a single cast to int16
+    samples = np.array(waveform, dtype=np.float32, copy=True).reshape(-1)
+    np.multiply(samples, 32767.0, out=samples)
+    np.clip(samples, -32768.0, 32767.0, out=samples)
+    return samples.astype('<i2')
+
+
+def wav_header(sample_rate, num_samples=None, channels=1):
+    """
+    Build the 44-byte header of a 16-bit PCM WAV file.
+
+    Args:
+        sample_rate (int): Samples per second.
+        num_samples (int): Samples per channel, or None when streaming audio
+            of unknown length (sizes are then set to 0xFFFFFFFF).
+        channels (int): Number of interleaved channels.
+
+    Returns:
+        bytes: The RIFF, fmt and data chunk headers.
+    """
+    block_align = channels * SAMPLE_WIDTH
+    if num_samples is None:
+        data_size = riff_size = UNKNOWN_SIZE
+    else:
+        data_size = num_samples * block_align
+        riff_size = 36 + data_size
+
+    return (
+        b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate,
+                                sample_rate * block_align, block_align, SAMPLE_WIDTH * 8)
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+
+def encode_wav(waveform, sample_rate):
+    """
+    Encode a waveform as a complete 16-bit PCM WAV file.
+
+    Returns:
+        bytes: The WAV file.
+    """
+    pcm = to_pcm16(waveform)
+    return wav_header(sample_rate, len(pcm)) + pcm.tobytes()
+
+
+def iter_wav(waveform, sample_rate, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Encode a waveform as 16-bit PCM WAV and yield it in fixed-size chunks.
+
+    The header is yielded first, then the sample data is copied out of the
+    PCM buffer one chunk at a time.
+
+    Yields:
+        bytes: The header, then the sample data.
+    """
+    pcm = to_pcm16(waveform)
+    yield wav_header(sample_rate, len(pcm))
+
+    body = memoryview(pcm).cast('B')
+    for start in range(0, len(body), chunk_bytes):
+        yield body[start:start + chunk_bytes].tobytes()
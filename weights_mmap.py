@@ -0,0 +1,152 @@
+"""
+Memory-mapped model weights shared by all processes on a host.
+Coqui's Synthesizer reads every checkpoint into private memory, so each
+worker that loads a model holds its own copy of the same weights. With
+TTS_WEIGHTS_MMAP=1, each checkpoint is rewritten once as a plain tensor file
+(torch's uncompressed zip format). Models are then built with their
+checkpoint loaded from that file with torch.load(mmap=True) and the mapped
+tensors kept as the model's parameters, so the checkpoint is never read into
+private memory and every process maps the same page cache pages.
+
+The first load of a checkpoint still reads it privately once to convert it.
+Needs torch 2.1 or newer (torch.load(mmap=True), load_state_dict(assign=True)).
+
+Convert the preloaded models ahead of time (e.g. in the build step) with:
+    python weights_mmap.py [model[|vocoder] ...]
+"""
+
+import gc
+import os
+import sys
+import ctypes
+import hashlib
+import threading
+import contextlib
+
+import torch
+
+# Directory of the converted files (TTS_WEIGHTS_MMAP_DIR); next to each checkpoint when not set
+MMAP_DIR = os.environ.get('TTS_WEIGHTS_MMAP_DIR') or None
+
+# Mapped loads patch torch.load and load_state_dict, so they run one at a time
+_loading_lock = threading.Lock()
+
+
+def converted_path(checkpoint_path, directory=MMAP_DIR):
+    """
+    Return the path of the converted copy of a checkpoint.
+
+    The name includes the checkpoint's size and modification time and the
+    torch version, so a new download or upgrade is converted again.
+    """
+    stat = os.stat(checkpoint_path)
+    fingerprint = '|'.join([os.path.abspath(checkpoint_path), str(stat.st_size), str(stat.st_mtime_ns),
+                            torch.__version__])
+    digest = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(checkpoint_path))[0]
+    return os.path.join(directory or os.path.dirname(checkpoint_path), f'{name}.{digest}.mmap.pt')
+
+
+def convert(checkpoint_path, path):
+    """
+    Rewrite a checkpoint in torch's zip format, atomically (concurrent workers may convert at the same time).
+
+    Reads the whole checkpoint into private memory once; it is freed again before returning.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        # Coqui checkpoints hold their config and training state next to the weights
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+        torch.save(checkpoint, temporary)
+        del checkpoint
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    release_freed_memory()
+
+
+def _file_path(f):
+    # torch.load takes a path or a file object (Coqui opens checkpoints through fsspec)
+    path = f if isinstance(f, (str, os.PathLike)) else getattr(f, 'path', None) or getattr(f, 'name', None)
+    return os.path.realpath(path) if isinstance(path, (str, os.PathLike)) else None
+
+
+@contextlib.contextmanager
+def mapped_checkpoints(checkpoint_paths, directory=MMAP_DIR):
+    """
+    Load the given checkpoints memory-mapped while models are built in this block.
+
+    Within the block, torch.load of one of the checkpoints (by path or open
+    file) in this thread reads its converted copy with mmap=True instead, and
+    load_state_dict() keeps the mapped tensors instead of copying them into
+    the module's own. Missing converted copies are created first.
+
+    Yields:
+        dict: 'bytes' of weights mapped so far, updated while the block runs.
+    """
+    redirects = {}
+    for checkpoint_path in checkpoint_paths:
+        if checkpoint_path:
+            path = converted_path(checkpoint_path, directory)
+            if not os.path.exists(path):
+                convert(checkpoint_path, path)
+            redirects[os.path.realpath(checkpoint_path)] = path
+
+    owner = threading.get_ident()
+    mapped = {'bytes': 0}
+    load = torch.load
+    load_state_dict = torch.nn.Module.load_state_dict
+
+    def mapped_load(f, *args, **kwargs):
+        path = redirects.get(_file_path(f)) if threading.get_ident() == owner else None
+        if path is None:
+            return load(f, *args, **kwargs)
+        kwargs.update(map_location='cpu', mmap=True)
+        return load(path, *args, **kwargs)
+
+    def assigning_load_state_dict(module, state_dict, *args, **kwargs):
+        if threading.get_ident() == owner:
+            # assign=True keeps the mapped tensors instead of copying them into private ones
+            kwargs['assign'] = True
+            mapped['bytes'] += sum(tensor.numel() * tensor.element_size() for tensor in state_dict.values()
+                                   if isinstance(tensor, torch.Tensor))
+        return load_state_dict(module, state_dict, *args, **kwargs)
+
+    with _loading_lock:
+        torch.load = mapped_load
+        torch.nn.Module.load_state_dict = assigning_load_state_dict
+        try:
+            yield mapped
+        finally:
+            torch.load = load
+            torch.nn.Module.load_state_dict = load_state_dict
+    # The parameters the model was created with have been replaced
+    release_freed_memory()
+
+
+def release_freed_memory():
+    """Collect the replaced private tensors and return their memory to the OS."""
+    gc.collect()
+    # glibc keeps freed heap memory for reuse; hand it back so RSS actually drops
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def main():
+    """Load the given models (default TTS_PRELOAD_MODELS) once so that their checkpoints are converted."""
+    os.environ['TTS_WEIGHTS_MMAP'] = '1'
+    os.environ['TTS_BACKEND'] = 'coqui'
+    import coqui_tts_fallback as tts
+
+    models = [tuple(entry.split('|', 1)) if '|' in entry else (entry, None) for entry in sys.argv[1:]]
+    for model_name, vocoder_name in models or tts.PRELOAD_MODELS:
+        synthesizer = tts.load_tts_model(model_name, vocoder_name)
+        print(f"{model_name} {vocoder_name or ''}: {'converted' if synthesizer is not None else 'failed'}")
+
+
+if __name__ == '__main__':
+    main()